@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+import calendar
+import datetime
+import logging
+import time
+
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+
+from rest_framework import authentication, exceptions
+
+from .caches import MISSING, FallbackCache, LRUCache
+from .models import RevokedToken
+
+
+logger = logging.getLogger(__name__)
+
+
+def _get_jwt_setting(name, default):
+    return getattr(settings, 'V5_JWT_{}'.format(name), default)
+
+
+def _get_timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return calendar.timegm(value.utctimetuple())
+    return value
+
+
+def get_token_expire_time(claims):
+    """
+    Returns the timestamp from which the token of the claims is rejected as expired.
+    """
+    return int(_get_timestamp(claims['exp'])) + _get_jwt_setting('LEEWAY', 0)
+
+
+# ---------- Revocation ---------------------------------------------------------------------------
+
+
+# NOTE: Revocations are stored in the database (see ``RevokedToken``), which is the durable record,
+# and in the shared ``token_state_cache``, which ``JWTAuthentication`` reads instead of the
+# database:
+#
+# - ``jti:<jti>``: whether the token is revoked.
+# - ``user:<pk>``: the ``TokenUser.state_attributes`` of the user (``None`` if deleted), and the
+#   time until which all the tokens of the user are revoked (``revoked_before``).
+#
+# A missing key (never loaded, expired or evicted) is loaded from the database, so a token costs a
+# query once per ``V5_JWT_STATE_TIMEOUT`` seconds (60 by default) rather than once per request. The
+# revocations and the saves of users update or delete the keys, so they apply at once to all the
+# worker processes. Changes which send no signal (e.g. a queryset ``update()`` of users) apply
+# after the timeout.
+
+token_state_cache = FallbackCache('jwt-state', timeout=_get_jwt_setting('STATE_TIMEOUT', 60))
+
+
+def _make_token_key(jti):
+    return 'jti:{}'.format(jti)
+
+
+def _make_user_key(user_pk):
+    return 'user:{}'.format(user_pk)
+
+
+def revoke_token(claims):
+    """
+    Revokes a token, given its verified claims. A token without ``jti`` claim cannot be revoked
+    alone, so all the tokens issued to its user so far are revoked instead.
+    """
+    user_pk = claims[_get_jwt_setting('USER_ID_CLAIM', 'user_id')]
+    if not claims.get('jti'):
+        revoke_user_tokens(user_pk)
+        return
+    now = int(time.time())
+    _purge_revoked_tokens(now)
+    # The revocation only needs to outlive the token itself.
+    expire_time = get_token_expire_time(claims)
+    RevokedToken.objects.create(user_id=user_pk, jti=claims['jti'], revoke_time=now, expire_time=expire_time)
+    token_key = _make_token_key(claims['jti'])
+    transaction.on_commit(lambda: token_state_cache.set(token_key, True, timeout=max(expire_time - now, 1)))
+
+
+def revoke_user_tokens(user_pk):
+    """
+    Revokes all the tokens issued to a user so far, e.g. when the user is deactivated, loses
+    permissions or changes password.
+    """
+    now = int(time.time())
+    _purge_revoked_tokens(now)
+    RevokedToken.objects.create(
+        user_id=user_pk,
+        jti='',
+        revoke_time=now,
+        expire_time=now + _get_jwt_setting('MAX_TOKEN_AGE', 30 * 24 * 60 * 60),
+    )
+    invalidate_token_user_state(user_pk)
+
+
+def invalidate_token_user_state(user_pk):
+    """
+    Deletes the cached state of a user, now and once the current transaction is committed (so that
+    it is not reloaded from data which is not committed yet).
+    """
+    user_key = _make_user_key(user_pk)
+    token_state_cache.delete(user_key)
+    transaction.on_commit(lambda: token_state_cache.delete(user_key))
+
+
+def _purge_revoked_tokens(now):
+    RevokedToken.objects.filter(expire_time__lt=now).delete()
+
+
+def get_token_user_state(claims, user_pk):
+    """
+    Returns a tuple of the state of the user of a token (a dict of the
+    ``TokenUser.state_attributes`` and ``revoked_before``, or ``None`` if the user does not exist),
+    and whether the token is revoked. They are read from ``token_state_cache``, or else by a single
+    query on the primary database (so that revocations are seen as soon as they are made).
+    """
+    user_key = _make_user_key(user_pk)
+    token_key = _make_token_key(claims['jti']) if claims.get('jti') else None
+    keys = [user_key] + ([token_key] if token_key else [])
+    found = token_state_cache.get_many(keys)
+    if all(key in found for key in keys):
+        return found[user_key], found.get(token_key, False)
+
+    user_revocations = RevokedToken.objects.filter(user=OuterRef('pk'), jti='').order_by('-revoke_time')
+    annotations = {'revoked_before': Subquery(user_revocations.values('revoke_time')[:1])}
+    if token_key:
+        annotations['is_revoked'] = Exists(RevokedToken.objects.filter(user=OuterRef('pk'), jti=claims['jti']))
+    user_model = get_user_model()
+    state = (
+        user_model._default_manager
+        .using(DEFAULT_DB_ALIAS)
+        .filter(pk=user_pk)
+        .annotate(**annotations)
+        .values(*TokenUser.state_attributes, *annotations)
+        .first()
+    )
+    is_revoked = bool(state and state.pop('is_revoked', False))
+    if state is not None:
+        state['revoked_before'] = state['revoked_before'] or 0
+    token_state_cache.set_many({user_key: state, **({token_key: is_revoked} if token_key else {})})
+    return state, is_revoked
+
+
+# NOTE: Deactivated users are rejected by ``JWTAuthentication``. Their tokens are also revoked, so
+# that they are not valid again if the user is reactivated. Likewise for users who lose the staff or
+# superuser status, whose tokens were issued for more permissions, and for users whose password
+# changes (e.g. after it was stolen).
+
+_REVOKING_FIELD_NAMES = ('is_active', 'is_staff', 'is_superuser', 'password')
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='drfutils_revoke_tokens_on_user_change')
+def revoke_tokens_on_user_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not set(_REVOKING_FIELD_NAMES) & set(update_fields):
+        return
+    try:
+        previous = sender._default_manager.values(*_REVOKING_FIELD_NAMES).get(pk=instance.pk)
+    except sender.DoesNotExist:
+        return
+    is_demoted = any(previous[name] and not getattr(instance, name) for name in _REVOKING_FIELD_NAMES[:3])
+    if is_demoted or previous['password'] != instance.password:
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='drfutils_invalidate_token_user_on_save')
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid='drfutils_invalidate_token_user_on_delete')
+def invalidate_token_user_on_change(sender, instance, update_fields=None, **kwargs):
+    # Skip partial updates which do not affect the state, e.g. ``last_login`` on each login.
+    if update_fields is not None and not set(TokenUser.state_attributes) & set(update_fields):
+        return
+    invalidate_token_user_state(instance.pk)
+
+
+# ---------- Token user ---------------------------------------------------------------------------
+
+
+class TokenUser(SimpleLazyObject):
+    """
+    A lazy user built from a verified token and the state of the user (see
+    ``get_token_user_state()``). It answers the primary key, authentication flags, and the
+    attributes listed in ``state_attributes`` (e.g. ``is_staff``) without another query. Any other
+    attribute loads the full user.
+
+    It also passes for an instance of the user model (``isinstance()``), so that it can be used as a
+    query value (e.g. ``filter(receiver=request.user)``) without being loaded.
+    """
+    state_attributes = ('username', 'is_active', 'is_staff', 'is_superuser')
+
+    def __init__(self, user_pk, state):
+        self.__dict__['_user_pk'] = user_pk
+        self.__dict__['_user_state'] = state
+        super().__init__(lambda: get_user_model()._default_manager.get(pk=user_pk))
+
+    @property
+    def __class__(self):
+        return get_user_model()
+
+    def __getattr__(self, name):
+        if name in ('pk', get_user_model()._meta.pk.attname):
+            return self.__dict__['_user_pk']
+        if name == '_meta':
+            return get_user_model()._meta
+        if name == 'is_authenticated':
+            return True
+        if name == 'is_anonymous':
+            return False
+        if name in self.state_attributes and name in self.__dict__['_user_state']:
+            return self.__dict__['_user_state'][name]
+        if not name.startswith('_') and not self._is_user_attribute(name):
+            # Feature checks, e.g. ``hasattr(value, 'resolve_expression')`` by the ORM, do not need
+            # the full user either.
+            raise AttributeError(name)
+        return super().__getattr__(name)
+
+    def _is_user_attribute(self, name):
+        user_model = get_user_model()
+        return hasattr(user_model, name) or any(
+            name in (field.name, field.attname) for field in user_model._meta.concrete_fields
+        )
+
+    def has_perms(self, perm_list, obj=None):
+        # NOTE: [DRF] ``DjangoModelPermissions`` checks an empty list of permissions for safe
+        # methods, which does not need the full user.
+        if not perm_list:
+            return True
+        return super().__getattr__('has_perms')(perm_list, obj)
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        if hasattr(other, '_meta') and other._meta.concrete_model is get_user_model()._meta.concrete_model:
+            return other.pk == self.pk
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __repr__(self):
+        return '<TokenUser: {}>'.format(self.pk)
+
+
+# ---------- Authentication -----------------------------------------------------------------------
+
+
+class JWTAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticates requests by a JSON Web Token in the ``Authorization: Bearer <token>`` header, as
+    issued by ``generate_jwt_token()``. ``request.user`` is a ``TokenUser`` and ``request.auth`` is
+    the dict of claims.
+
+    Verified claims are kept in a bounded LRU cache keyed by the token, so that the signature is
+    verified once per token. The expiry is checked on each request, and so are the user (which must
+    be active) and the revocation of the token (see ``revoke_token()``), from the shared
+    ``token_state_cache`` rather than the database. The permission flags of the user are read from
+    the same state rather than trusted from the claims.
+
+    Settings (all optional):
+
+    - ``V5_JWT_SECRET_KEY``: the signing key (``SECRET_KEY`` by default).
+    - ``V5_JWT_ALGORITHM``: the signing algorithm (``'HS256'`` by default).
+    - ``V5_JWT_AUTH_HEADER_PREFIX``: the authorization scheme (``'Bearer'`` by default).
+    - ``V5_JWT_USER_ID_CLAIM``: the claim of the user primary key (``'user_id'`` by default).
+    - ``V5_JWT_LEEWAY``: the tolerated clock skew in seconds (0 by default).
+    - ``V5_JWT_CACHE_SIZE``: the maximum number of verified tokens in the cache (1024 by default).
+    - ``V5_JWT_STATE_TIMEOUT``: the lifetime in seconds of the cached states of users and tokens (60
+      by default).
+    - ``V5_JWT_MAX_TOKEN_AGE``: the maximum lifetime in seconds of issued tokens (30 days by
+      default).
+    """
+    www_authenticate_realm = 'api'
+
+    # Verified claims by token, shared by all instances (DRF creates an instance per request).
+    _verified_claims = LRUCache(maxsize=_get_jwt_setting('CACHE_SIZE', 1024))
+
+    def authenticate(self, request):
+        token = self._get_token(request)
+        if token is None:
+            return None
+        claims = self._verified_claims.get(token)
+        if claims is MISSING:
+            claims = self._decode_token(token)
+            self._verified_claims.set(token, claims)
+        # The signature of cached claims has been verified, but they may have expired since.
+        now = time.time()
+        if get_token_expire_time(claims) <= now:
+            self._verified_claims.delete(token)
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        user_pk = claims[_get_jwt_setting('USER_ID_CLAIM', 'user_id')]
+        state, is_revoked = get_token_user_state(claims, user_pk)
+        if state is None or not state['is_active']:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        # Tokens issued in the same second as the revocation of all the tokens are revoked too.
+        if is_revoked or _get_timestamp(claims.get('iat', 0)) <= state['revoked_before']:
+            raise exceptions.AuthenticationFailed('Token has been revoked.')
+        return TokenUser(user_pk, state), claims
+
+    def authenticate_header(self, request):
+        return '{} realm="{}"'.format(_get_jwt_setting('AUTH_HEADER_PREFIX', 'Bearer'), self.www_authenticate_realm)
+
+    def _get_token(self, request):
+        parts = authentication.get_authorization_header(request).split()
+        prefix = _get_jwt_setting('AUTH_HEADER_PREFIX', 'Bearer')
+        if not parts or parts[0].lower() != prefix.lower().encode('ascii'):
+            return None
+        if len(parts) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            return parts[1].decode('ascii')
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+    def _decode_token(self, token):
+        try:
+            claims = jwt.decode(
+                token,
+                _get_jwt_setting('SECRET_KEY', settings.SECRET_KEY),
+                algorithms=[_get_jwt_setting('ALGORITHM', 'HS256')],
+                leeway=_get_jwt_setting('LEEWAY', 0),
+            )
+        except jwt.ExpiredSignatureError:
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        except jwt.InvalidTokenError:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        # Tokens without expiry or user would never be revoked by expiry.
+        if 'exp' not in claims or _get_jwt_setting('USER_ID_CLAIM', 'user_id') not in claims:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        return claims
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+logger = logging.getLogger(__name__)
+
+
+# A marker for cache misses, so that None and False can be cached as values.
+MISSING = object()
+
+# A marker for Django cache backend calls which cannot be made or have failed.
+_FAILED = object()
+
+
+class LRUCache(object):
+    """
+    A bounded, thread-safe, in-process cache which evicts the least recently used key. Values may
+    also expire after a timeout in seconds (``None`` for no expiry).
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        # Values by key, as ``(expiry time, value)`` tuples.
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            expiry_time, value = self._data[key]
+            if expiry_time is not None and expiry_time <= time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, timeout=None):
+        expiry_time = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            self._data[key] = (expiry_time, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def is_shared_cache(backend):
+    """
+    Whether a Django cache backend is shared by the worker processes, i.e. it is not the
+    in-process ``LocMemCache`` (the backend of the ``'default'`` alias if ``CACHES`` is not set).
+    """
+    return not isinstance(backend, LocMemCache)
+
+
+class BackendUnreachable(Exception):
+    """
+    Raised when a Django cache backend does not answer, but does not raise either (e.g. the
+    ``python-memcached`` client returns defaults when the server is down).
+    """
+
+
+class FallbackCache(object):
+    """
+    A named cache which stores values in a shared Django cache backend, and falls back to an
+    in-process ``LRUCache`` if the backend is not configured, is not shared (see
+    ``is_shared_cache()``) or fails. Hits and misses are counted, and all named caches can be
+    inspected by ``get_cache_stats()``.
+
+    The Django cache alias is read from the ``V5_RESTIFIED_CACHE_ALIAS`` setting (``'restified'``
+    by default). The in-process fallback does not see the invalidations made by other worker
+    processes, so its values expire after ``V5_RESTIFIED_LOCAL_CACHE_TIMEOUT`` seconds (5 by
+    default) at most, rather than after ``timeout``.
+
+    Some clients (e.g. ``python-memcached``) do not raise when the server is down, but return
+    defaults, which look like misses. Such a failure is only detected by ``incr()``, when the key
+    can neither be added nor incremented. Once the backend has failed, all the calls of the process
+    use the fallback for ``V5_RESTIFIED_CACHE_RETRY_INTERVAL`` seconds (5 by default), so that
+    counters are read from where they were incremented. When the backend is used again, the
+    counters incremented meanwhile are incremented in the backend too, so that the invalidations
+    made during the failure are not lost.
+    """
+
+    def __init__(self, name, timeout=300, maxsize=1024):
+        self.name = name
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._local_cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        # The time until which the backend is not used after a failure, and the keys incremented
+        # locally meanwhile.
+        self._retry_time = None
+        self._pending_increments = set()
+        _registry[name] = self
+
+    @property
+    def backend(self):
+        """
+        The Django cache backend, or ``None`` if it is not configured, is not shared, or has failed
+        less than ``V5_RESTIFIED_CACHE_RETRY_INTERVAL`` seconds ago.
+        """
+        alias = getattr(settings, 'V5_RESTIFIED_CACHE_ALIAS', 'restified')
+        if alias not in settings.CACHES:
+            return None
+        backend = caches[alias]
+        if not is_shared_cache(backend):
+            return None
+        with self._lock:
+            if self._retry_time is not None:
+                if time.monotonic() < self._retry_time:
+                    return None
+                self._retry_time = None
+            pending_increments, self._pending_increments = self._pending_increments, set()
+        for key in pending_increments:
+            try:
+                self._backend_incr(backend, key)
+            except Exception as exc:
+                with self._lock:
+                    self._pending_increments.update(pending_increments)
+                self._log_backend_error('incr', exc)
+                return None
+        return backend
+
+    @property
+    def local_timeout(self):
+        return min(self.timeout, getattr(settings, 'V5_RESTIFIED_LOCAL_CACHE_TIMEOUT', 5))
+
+    def make_key(self, key):
+        return 'restified:{}:{}'.format(self.name, key)
+
+    def get(self, key, default=MISSING):
+        value = self._backend_call('get', self.make_key(key), MISSING)
+        if value is _FAILED:
+            value = self._local_cache.get(key)
+        if value is MISSING:
+            self._count(misses=1)
+            return default
+        self._count(hits=1)
+        return value
+
+    def get_many(self, keys):
+        """
+        Returns a dict mapping the found keys to their values.
+        """
+        found = self._backend_call('get_many', [self.make_key(key) for key in keys])
+        if found is _FAILED:
+            found = {}
+            for key in keys:
+                value = self._local_cache.get(key)
+                if value is not MISSING:
+                    found[key] = value
+        else:
+            found = {key: found[self.make_key(key)] for key in keys if self.make_key(key) in found}
+        self._count(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        if self._backend_call('set', self.make_key(key), value, timeout) is _FAILED:
+            self._local_cache.set(key, value, min(timeout, self.local_timeout))
+
+    def set_many(self, data, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        backend_data = {self.make_key(key): value for key, value in data.items()}
+        if self._backend_call('set_many', backend_data, timeout) is _FAILED:
+            for key, value in data.items():
+                self._local_cache.set(key, value, min(timeout, self.local_timeout))
+
+    def delete(self, key):
+        # Always delete from the local cache as well, in case the backend failed when setting it.
+        self._local_cache.delete(key)
+        self._backend_call('delete', self.make_key(key))
+
+    def incr(self, key):
+        """
+        Increments the integer value of the key, setting it to 1 if it does not exist. Returns the
+        new value.
+        """
+        backend = self.backend
+        if backend is not None:
+            try:
+                return self._backend_incr(backend, key)
+            except Exception as exc:
+                self._log_backend_error('incr', exc)
+        # NOTE: Local counters (e.g. generation numbers) do not expire, so that they never go back
+        # to a value which is still part of cached keys.
+        with self._lock:
+            value = self._local_cache.get(key, 0) + 1
+            self._local_cache.set(key, value)
+            if self._retry_time is not None:
+                # The backend has failed: increment it too once it is used again.
+                self._pending_increments.add(key)
+        return value
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'local_size': len(self._local_cache),
+            }
+
+    def _count(self, hits=0, misses=0, errors=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.errors += errors
+
+    def _backend_incr(self, backend, key):
+        backend_key = self.make_key(key)
+        for __ in range(2):
+            if backend.add(backend_key, 1, None):
+                return 1
+            try:
+                return backend.incr(backend_key)
+            except ValueError:
+                # The key does not exist (any more), although it could not be added: it has just
+                # expired, or the backend is unreachable, which a second attempt tells.
+                pass
+        raise BackendUnreachable('The key {} can neither be added nor incremented.'.format(backend_key))
+
+    def _backend_call(self, method_name, *args):
+        """
+        Calls a method of the Django cache backend, and returns its result. Returns ``_FAILED`` if
+        the backend is not configured, is not shared or fails.
+        """
+        backend = self.backend
+        if backend is None:
+            return _FAILED
+        try:
+            return getattr(backend, method_name)(*args)
+        except Exception as exc:
+            self._log_backend_error(method_name, exc)
+            return _FAILED
+
+    def _log_backend_error(self, method_name, exc):
+        retry_interval = getattr(settings, 'V5_RESTIFIED_CACHE_RETRY_INTERVAL', 5)
+        with self._lock:
+            self.errors += 1
+            self._retry_time = time.monotonic() + retry_interval
+        logger.warning('Cache %s: backend %s() failed, using local cache: %s', self.name, method_name, exc)
+
+
+class GenerationCache(FallbackCache):
+    """
+    A ``FallbackCache`` with a generation number, which is bumped by ``invalidate_all()``
+    (typically from model signals) on every change of the data it covers. The generation number
+    alone can validate the data, e.g. in ETags (see ``ConditionalGetMixin``).
+    """
+
+    def get_generation(self):
+        return self.get('generation', 0)
+
+    def invalidate_all(self):
+        self.incr('generation')
+
+
+class RepresentationCache(GenerationCache):
+    """
+    A cache for the serialized representations of model instances (see
+    ``CachedRepresentationMixin``). Representations are keyed by the primary key and the version
+    of the instance, and by a generation number of the whole cache.
+
+    The version is read from ``version_field`` (e.g. a ``update_date`` field with ``auto_now``), so
+    updating an instance invalidates its representation implicitly. Changes which are not reflected
+    by the version, such as changes of related objects, should call ``invalidate_all()`` (typically
+    from model signals) to bump the generation number.
+    """
+
+    def __init__(self, name, version_field=None, timeout=60 * 60, maxsize=1024):
+        super().__init__(name, timeout=timeout, maxsize=maxsize)
+        self.version_field = version_field
+
+    def make_instance_key(self, instance, prefix):
+        version = getattr(instance, self.version_field) if self.version_field else None
+        return '{}:{}:{}'.format(prefix, instance.pk, version.isoformat() if version else version)
+
+
+# All named caches, by name.
+_registry = {}
+
+
+def get_cache_stats():
+    """
+    Returns a dict mapping the name of each ``FallbackCache`` to its stats.
+    """
+    return {name: cache.get_stats() for name, cache in sorted(_registry.items())}
+
+
+def clear_local_caches():
+    """
+    Clears the in-process fallbacks of all ``FallbackCache`` instances (e.g. between tests). The
+    Django cache backends should be cleared separately.
+    """
+    for cache in _registry.values():
+        cache._local_cache.clear()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import logging
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_replica_aliases():
+    """
+    Returns the aliases of the read replicas of the default database (``V5_DATABASE_REPLICAS``).
+    """
+    return list(getattr(settings, 'V5_DATABASE_REPLICAS', []))
+
+
+# ---------- Routing state ------------------------------------------------------------------------
+
+
+# The replica used by the reads of the current thread (i.e. request), if any, and whether writes
+# have been routed since the start of the request.
+_routing_state = threading.local()
+
+
+def get_read_replica():
+    return getattr(_routing_state, 'replica', None)
+
+
+def set_read_replica(replica):
+    """
+    Routes the reads of the current thread to ``replica``, or to the primary if it is ``None``.
+    """
+    _routing_state.replica = replica
+
+
+def has_routed_writes():
+    """
+    Whether writes of the current thread have been routed to the primary (see ``ReplicaRouter``)
+    since ``clear_routed_writes()``.
+    """
+    return getattr(_routing_state, 'routed_writes', False)
+
+
+def clear_routed_writes():
+    _routing_state.routed_writes = False
+
+
+def choose_read_replica():
+    replicas = get_replica_aliases()
+    return random.choice(replicas) if replicas else None
+
+
+@contextlib.contextmanager
+def read_from_replica(replica=None):
+    """
+    A context manager which routes the reads of the current thread to a replica (a random one of
+    ``V5_DATABASE_REPLICAS`` by default) within its block. A single replica is used for the whole
+    block, so that its reads are consistent with each other.
+    """
+    if replica is None:
+        replica = choose_read_replica()
+    previous_replica = get_read_replica()
+    set_read_replica(replica)
+    try:
+        yield replica
+    finally:
+        set_read_replica(previous_replica)
+
+
+# ---------- Router -------------------------------------------------------------------------------
+
+
+class ReplicaRouter(object):
+    """
+    A database router which sends reads to the replica chosen for the current thread (see
+    ``read_from_replica()`` and ``ReplicaRoutingMiddleware``), and everything else to the default
+    (primary) database. Routed writes are recorded for the current thread (see
+    ``has_routed_writes()``).
+
+    Reads within a transaction of the primary stay on the primary, so that they see its uncommitted
+    writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = get_read_replica()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # NOTE: Without a router decision, Django would write an instance to the database it was
+        # read from, i.e. a replica.
+        _routing_state.routed_writes = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas have the same data as the primary.
+        databases = set([DEFAULT_DB_ALIAS] + get_replica_aliases())
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
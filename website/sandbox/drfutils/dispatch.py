@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import functools
+import logging
+from urllib.parse import urlsplit
+
+from django.http import QueryDict
+from django.urls import Resolver404, resolve
+
+from rest_framework.response import Response
+from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+
+
+logger = logging.getLogger(__name__)
+
+
+NOT_DISPATCHABLE_DATA = {'detail': 'This URL cannot be dispatched as a sub-request.'}
+
+
+def is_streaming_view(view_func):
+    """
+    Whether a view streams its response, as marked by a ``streaming`` attribute of its view set
+    (or view) class, or by a ``streaming`` kwarg of its ``@action``.
+    """
+    initkwargs = getattr(view_func, 'initkwargs', {})
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    return bool(initkwargs.get('streaming', getattr(view_class, 'streaming', False)))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_unthrottled_view(view_func):
+    """
+    Returns a view function like ``view_func`` (a DRF view), without throttles.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return view_func
+    initkwargs = dict(getattr(view_func, 'initkwargs', {}), throttle_classes=[])
+    actions = getattr(view_func, 'actions', None)
+    if actions is not None:
+        return view_class.as_view(actions, **initkwargs)
+    return view_class.as_view(**initkwargs)
+
+
+def dispatch_get(request, url, urlconf, mount_prefix, user=None, auth=None):
+    """
+    Dispatches a GET sub-request to ``url`` in-process, and returns a tuple of the status code and
+    the (unrendered) response data.
+
+    The sub-request is a copy of ``request`` (a Django ``HttpRequest``), so it reuses the user and
+    the session which have already been loaded by the middleware. If ``user`` is given (with its
+    ``auth``, e.g. the token), the sub-request is authenticated as such rather than by the
+    authentication classes of its view, and it is not throttled: the original request has been
+    authenticated and throttled already. The URL is resolved against
+    ``urlconf``, which is mounted at ``mount_prefix`` (a path prefix without trailing slash, such as
+    ``'/restified'``) in the root URLconf. URLs outside of ``mount_prefix`` are not found.
+
+    Only DRF views with a non-streaming response can be dispatched: streaming views (see
+    ``is_streaming_view()``) are not called, since they may hold resources (e.g. a subscription)
+    until their response is consumed, and other responses are answered ``400`` as well.
+    """
+    split_url = urlsplit(url)
+    script_name = request.META.get('SCRIPT_NAME', '')
+    path_info = split_url.path[len(script_name):] if split_url.path.startswith(script_name) else ''
+    if not path_info.startswith(mount_prefix + '/'):
+        return HTTP_404_NOT_FOUND, {'detail': 'Not found.'}
+    try:
+        match = resolve(path_info[len(mount_prefix):], urlconf=urlconf)
+    except Resolver404:
+        return HTTP_404_NOT_FOUND, {'detail': 'Not found.'}
+
+    if is_streaming_view(match.func):
+        return HTTP_400_BAD_REQUEST, NOT_DISPATCHABLE_DATA
+
+    sub_request = copy.copy(request)
+    sub_request.method = 'GET'
+    sub_request.path = split_url.path
+    sub_request.path_info = path_info
+    sub_request.resolver_match = match
+    sub_request.GET = QueryDict(split_url.query)
+    sub_request.META = {
+        key: value for key, value in request.META.items()
+        # Conditional headers apply to the original request only.
+        if not key.startswith('HTTP_IF_') and key not in ('CONTENT_TYPE', 'CONTENT_LENGTH')
+    }
+    sub_request.META.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path_info,
+        'QUERY_STRING': split_url.query,
+        'HTTP_ACCEPT': 'application/json',
+    })
+
+    view_func = match.func
+    if user is not None:
+        # NOTE: [DRF] ``Request`` authenticates a Django request with these attributes (set by
+        # ``force_authenticate()`` in tests) by ``ForcedAuthentication``.
+        sub_request._force_auth_user = user
+        sub_request._force_auth_token = auth
+        view_func = _get_unthrottled_view(view_func)
+
+    response = view_func(sub_request, *match.args, **match.kwargs)
+    if not isinstance(response, Response) or response.streaming:
+        # NOTE: ``response.close()`` would send ``request_finished``, which closes the database
+        # connections in the middle of the original request.
+        logger.warning('Fail to dispatch %s: not a DRF response.', url)
+        return HTTP_400_BAD_REQUEST, NOT_DISPATCHABLE_DATA
+    # Skip rendering and parsing.
+    return response.status_code, response.data
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_related_lookups(serializer):
+    """
+    Walks the fields of a (model) serializer and returns a tuple of two sorted lists: lookups that
+    should be passed to ``select_related()``, and lookups that should be passed to
+    ``prefetch_related()`` on a queryset of the serializer's model.
+
+    Relations are discovered from nested serializers and from dotted ``source`` paths (such as
+    ``source='profile.display_name'``). Relations that cannot be discovered by introspection, for
+    example those traversed in a ``SerializerMethodField``, can be declared on the serializer's
+    ``Meta`` class as ``select_related`` and ``prefetch_related`` lists.
+    """
+    select_lookups = set()
+    prefetch_lookups = set()
+    model = _get_serializer_model(serializer)
+    if model is not None:
+        _walk_serializer(serializer, model, '', False, select_lookups, prefetch_lookups)
+    # Drop the select lookups that are implied by a longer one (e.g. ``creator`` by
+    # ``creator__profile``).
+    select_lookups = [
+        lookup for lookup in select_lookups
+        if not any(other.startswith(lookup + '__') for other in select_lookups)
+    ]
+    return sorted(select_lookups), sorted(prefetch_lookups)
+
+
+def _get_serializer_model(serializer):
+    meta = getattr(serializer, 'Meta', None)
+    return getattr(meta, 'model', None)
+
+
+def _walk_serializer(serializer, model, prefix, is_prefetched, select_lookups, prefetch_lookups):
+    # Relations declared explicitly on the serializer's ``Meta`` class.
+    meta = getattr(serializer, 'Meta', None)
+    for lookup in getattr(meta, 'select_related', ()):
+        lookups = prefetch_lookups if is_prefetched else select_lookups
+        lookups.add(prefix + lookup)
+    for lookup in getattr(meta, 'prefetch_related', ()):
+        prefetch_lookups.add(prefix + lookup)
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        # Find out the nested serializer (if any), and the part of the source path which goes
+        # through model relations.
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+            relation_attrs = field.source_attrs
+        elif isinstance(field, serializers.BaseSerializer):
+            child = field
+            relation_attrs = field.source_attrs
+        elif isinstance(field, serializers.ManyRelatedField):
+            child = None
+            relation_attrs = field.source_attrs
+        elif isinstance(field, serializers.RelatedField) and not field.use_pk_only_optimization():
+            # For example, a ``SlugRelatedField`` reads an attribute of the related object.
+            child = None
+            relation_attrs = field.source_attrs
+        else:
+            child = None
+            relation_attrs = field.source_attrs[:-1]
+
+        if not relation_attrs:
+            # Fields with ``source='*'`` are bound to the object itself.
+            if child is not None and field.source == '*':
+                _walk_serializer(child, model, prefix, is_prefetched, select_lookups, prefetch_lookups)
+            continue
+
+        related_model = model
+        lookup = prefix
+        path_is_prefetched = is_prefetched
+        for attr in relation_attrs:
+            relation = _get_relation(related_model, attr)
+            if relation is None:
+                logger.debug('Cannot eager load %s%s on %s.', lookup, attr, model.__name__)
+                related_model = None
+                break
+            related_model, is_multiple = relation
+            lookup += attr
+            path_is_prefetched = path_is_prefetched or is_multiple
+            if path_is_prefetched:
+                prefetch_lookups.add(lookup)
+            else:
+                select_lookups.add(lookup)
+            if related_model is None:
+                # A generic foreign key: we can prefetch it, but not follow it any further.
+                break
+            lookup += '__'
+
+        if child is not None and related_model is not None and related_model is _get_serializer_model(child):
+            _walk_serializer(child, related_model, lookup, path_is_prefetched, select_lookups, prefetch_lookups)
+
+
+def _get_relation(model, attr):
+    """
+    Returns a tuple of the related model and whether the relation is multiple-valued, if ``attr``
+    is a relation of ``model``. Otherwise returns None.
+    """
+    opts = model._meta
+    try:
+        field = opts.get_field(attr)
+    except FieldDoesNotExist:
+        # Reverse relations are accessed by their accessor name (e.g. ``badge_set``), which may
+        # differ from their field name (e.g. ``badge``).
+        field = next((
+            f for f in opts.get_fields()
+            if f.auto_created and not f.concrete and f.get_accessor_name() == attr
+        ), None)
+    if field is None or not field.is_relation:
+        return None
+    is_multiple = bool(field.one_to_many or field.many_to_many)
+    if field.related_model is None:
+        # A ``GenericForeignKey`` can only be prefetched.
+        is_multiple = True
+    return field.related_model, is_multiple
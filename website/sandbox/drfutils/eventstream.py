@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from rest_framework.renderers import BaseRenderer
+
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event, data, event_id=None):
+    """
+    Formats an event of the ``text/event-stream`` format (Server-Sent Events), with JSON data.
+    """
+    lines = []
+    if event_id is not None:
+        lines.append('id: {}'.format(event_id))
+    lines.append('event: {}'.format(event))
+    # The JSON is on a single line, so it does not need to be split into several data lines.
+    lines.append('data: {}'.format(json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))))
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_events(subscription, initial_events=(), heartbeat_interval=15, max_duration=300):
+    """
+    A generator of an event stream: yields ``initial_events``, then the messages (formatted events)
+    of the ``subscription`` as they are published, until ``max_duration`` seconds have elapsed.
+    A comment line is sent after ``heartbeat_interval`` seconds of silence, so that proxies keep the
+    connection open and disconnected clients are detected.
+
+    The subscription is closed when the generator is closed, i.e. when the response is closed.
+    Clients reconnect automatically after ``max_duration``, which bounds the lifetime of workers.
+    """
+    try:
+        yield 'retry: 3000\n\n'
+        for event in initial_events:
+            yield event
+        deadline = time.monotonic() + max_duration
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = subscription.get(timeout=min(heartbeat_interval, remaining))
+            yield message if message is not None else ': heartbeat\n\n'
+    finally:
+        subscription.close()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    A renderer which allows content negotiation of ``text/event-stream``. Views should return a
+    ``StreamingHttpResponse`` of ``stream_events()``: this renderer only renders error responses, as
+    a single ``error`` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event('error', data).encode(self.charset)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_generic_relations(instances, field_name, load=False):
+    """
+    Resolves the generic foreign key ``field_name`` of model ``instances`` in bulk, with one query
+    per content type. Returns a dict mapping the ``(content type ID, object PK)`` pair of each
+    existing related object, as stored on the instances, to:
+
+    - the related object, if ``load`` is true. The object is also cached on the instances, so that
+      accessing the generic foreign key does not query the database.
+    - the primary key of the related object otherwise. The object is not loaded.
+
+    Content types are looked up by ``ContentType.objects.get_for_id()``, which is cached for the
+    lifetime of the process.
+    """
+    if not instances:
+        return {}
+    model_opts = instances[0]._meta
+    using = instances[0]._state.db
+    field = model_opts.get_field(field_name)
+    ct_attname = model_opts.get_field(field.ct_field).get_attname()
+
+    fk_values_by_ct_id = defaultdict(set)
+    for instance in instances:
+        ct_id = getattr(instance, ct_attname)
+        fk_value = getattr(instance, field.fk_field)
+        if ct_id is not None and fk_value not in (None, ''):
+            fk_values_by_ct_id[ct_id].add(fk_value)
+
+    resolved = {}
+    for ct_id, fk_values in fk_values_by_ct_id.items():
+        related_model = ContentType.objects.db_manager(using).get_for_id(ct_id).model_class()
+        if related_model is None:
+            # The model of a stale content type has been removed.
+            continue
+        # Map the primary keys to the raw values stored on the instances (e.g. text).
+        fk_values_by_pk = {}
+        for fk_value in fk_values:
+            try:
+                fk_values_by_pk[related_model._meta.pk.to_python(fk_value)] = fk_value
+            except ValidationError:
+                logger.debug('Invalid %s PK in %s: %r', related_model.__name__, field_name, fk_value)
+        if not fk_values_by_pk:
+            continue
+        # NOTE: Use the base manager, like the generic foreign key itself.
+        queryset = related_model._base_manager.using(using)
+        if load:
+            found = queryset.in_bulk(list(fk_values_by_pk))
+        else:
+            found = {pk: pk for pk in queryset.filter(pk__in=list(fk_values_by_pk)).values_list('pk', flat=True)}
+        for pk, value in found.items():
+            resolved[(ct_id, fk_values_by_pk[pk])] = value
+
+    if load:
+        for instance in instances:
+            related_object = resolved.get((getattr(instance, ct_attname), getattr(instance, field.fk_field)))
+            if related_object is not None:
+                field.set_cached_value(instance, related_object)
+    return resolved
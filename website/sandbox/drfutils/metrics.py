@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import bisect
+import contextlib
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+
+from rest_framework.renderers import BaseRenderer
+
+from .caches import get_cache_stats
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+METRIC_PREFIX = 'v5_'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# The histograms recorded for each ``(view, action)``: name, help and buckets.
+HISTOGRAMS = OrderedDict([
+    ('request_duration_seconds', ('Wall time of the requests.', DURATION_BUCKETS)),
+    ('request_db_queries', ('Number of database queries of the requests.', QUERY_COUNT_BUCKETS)),
+    ('request_db_duration_seconds', ('Time spent in database queries.', DURATION_BUCKETS)),
+    ('request_serializer_duration_seconds', (
+        'Time spent in serializers, including the queries that they run.', DURATION_BUCKETS,
+    )),
+    ('response_size_bytes', ('Size of the (non-streaming) response bodies.', SIZE_BUCKETS)),
+])
+
+
+def is_metrics_enabled():
+    return getattr(settings, 'V5_METRICS_ENABLED', False)
+
+
+# ---------- Recording ----------------------------------------------------------------------------
+
+
+class Histogram(object):
+    """
+    A histogram of observed values, with a count per bucket (values lower than or equal to its
+    upper bound, and greater than the previous one) and an overflow count.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry(object):
+    """
+    The histograms of the current worker process, by ``(histogram name, view, action)``.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, action, values):
+        """
+        Observes the values of a request, as a dict mapping histogram names to values.
+        """
+        with self._lock:
+            for name, value in values.items():
+                key = (name, view, action)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(HISTOGRAMS[name][1])
+                histogram.observe(value)
+
+    def get_snapshot(self):
+        """
+        Returns a JSON-serializable snapshot of the histograms, and of the stats of the caches (see
+        ``get_cache_stats()``).
+        """
+        with self._lock:
+            histograms = [
+                [name, view, action, list(histogram.counts), histogram.sum, histogram.count]
+                for (name, view, action), histogram in self._histograms.items()
+            ]
+        return {'histograms': histograms, 'caches': get_cache_stats()}
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+metrics_registry = MetricsRegistry()
+
+
+class RequestMetrics(object):
+    """
+    The measures of the current request. It is also a database execute wrapper (see
+    ``connection.execute_wrapper()``), which counts and times the queries.
+    """
+
+    def __init__(self):
+        self.view = None
+        self.action = None
+        self.query_count = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.query_count += 1
+
+    def time_serializer(self, to_representation):
+        """
+        Wraps the ``to_representation()`` method of a serializer, to add its time to the request.
+        """
+        @functools.wraps(to_representation)
+        def timed_to_representation(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return to_representation(*args, **kwargs)
+            finally:
+                self.serializer_time += time.perf_counter() - start
+        return timed_to_representation
+
+
+_local = threading.local()
+
+
+def get_request_metrics():
+    """
+    Returns the ``RequestMetrics`` of the current request, or ``None`` if metrics are disabled.
+    """
+    return getattr(_local, 'request_metrics', None)
+
+
+def set_request_metrics(request_metrics):
+    _local.request_metrics = request_metrics
+
+
+# ---------- Aggregation --------------------------------------------------------------------------
+
+
+def get_metrics_directory():
+    return getattr(settings, 'V5_METRICS_DIR', None)
+
+
+# The stats of the caches which are gauges rather than counters. They are only meaningful for live
+# processes, so they are not kept for exited workers.
+GAUGE_CACHE_STATS = ('local_size',)
+
+# The file of the merged snapshots of exited workers, in ``V5_METRICS_DIR``.
+RETIRED_FILE_NAME = 'retired.json'
+
+# The maximum number of retired processes remembered in the retired snapshot (see
+# ``_retire_snapshot()``).
+MAX_RETIRED_PROCESSES = 1024
+
+_process = {}
+
+
+def _get_process_id():
+    """
+    Returns an identifier of the current process, which differs from the identifiers of previous
+    processes with the same PID.
+    """
+    pid = os.getpid()
+    # NOTE: A forked worker inherits the identifier of its parent, which is replaced on first use.
+    if _process.get('pid') != pid:
+        _process.update(pid=pid, id='{}-{}'.format(pid, uuid.uuid4().hex))
+    return _process['id']
+
+
+@contextlib.contextmanager
+def _lock_directory(directory):
+    """
+    Locks the snapshots of ``directory`` across processes, so that a snapshot is retired once.
+    """
+    with open(os.path.join(directory, '.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _is_process_alive(pid):
+    if os.name != 'posix':
+        # NOTE: ``os.kill()`` would terminate the process on Windows.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # It runs as another user.
+        return True
+    return True
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, encoding='utf-8') as snapshot_file:
+            return json.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning('Fail to read metrics snapshot %s: %s', path, exc)
+        return None
+
+
+def _write_snapshot(directory, file_name, snapshot):
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as temp_file:
+            json.dump(snapshot, temp_file)
+        os.replace(temp_path, os.path.join(directory, file_name))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _retire_snapshot(directory, file_name, snapshot):
+    """
+    Merges the snapshot of an exited process into the retired snapshot, without its gauges, and
+    deletes its file. The processes already merged are remembered, so that a snapshot is not merged
+    twice if its file could not be deleted.
+    """
+    retired = _read_snapshot(os.path.join(directory, RETIRED_FILE_NAME)) or {'histograms': [], 'caches': {}}
+    retired_processes = retired.get('processes', [])
+    process_id = snapshot.get('process')
+    if process_id is None or process_id not in retired_processes:
+        caches = OrderedDict(
+            (cache_name, OrderedDict((key, value) for key, value in stats.items() if key not in GAUGE_CACHE_STATS))
+            for cache_name, stats in snapshot['caches'].items()
+        )
+        retired = merge_snapshots([retired, {'histograms': snapshot['histograms'], 'caches': caches}])
+        if process_id is not None:
+            retired_processes = (retired_processes + [process_id])[-MAX_RETIRED_PROCESSES:]
+        retired['processes'] = retired_processes
+        _write_snapshot(directory, RETIRED_FILE_NAME, retired)
+    os.unlink(os.path.join(directory, file_name))
+
+
+def flush_metrics():
+    """
+    Writes the snapshot of the current worker process to ``V5_METRICS_DIR``, where the metrics
+    endpoint aggregates the snapshots of all the workers. Does nothing if it is not set.
+
+    The snapshot of a previous process with the same PID is retired first (see
+    ``get_aggregated_snapshot()``), so that its counters are not overwritten.
+    """
+    directory = get_metrics_directory()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    file_name = '{}.json'.format(os.getpid())
+    snapshot = metrics_registry.get_snapshot()
+    snapshot['process'] = _get_process_id()
+    with _lock_directory(directory):
+        previous = _read_snapshot(os.path.join(directory, file_name))
+        if previous is not None and previous.get('process') != snapshot['process']:
+            _retire_snapshot(directory, file_name, previous)
+        _write_snapshot(directory, file_name, snapshot)
+
+
+_atexit_lock = threading.Lock()
+_is_atexit_registered = False
+
+
+def register_flush_at_exit():
+    global _is_atexit_registered
+    with _atexit_lock:
+        if not _is_atexit_registered and get_metrics_directory():
+            atexit.register(flush_metrics)
+            _is_atexit_registered = True
+
+
+def get_aggregated_snapshot():
+    """
+    Returns the sum of the snapshots of all the worker processes: the live one of the current
+    process, the latest flushed ones of the others, and the retired snapshot.
+
+    The snapshots of exited workers (whose PID is not running) are merged into the retired
+    snapshot, without their gauges, so that the counters neither decrease nor accumulate files
+    until ``V5_METRICS_DIR`` is cleared (e.g. on deployment).
+    """
+    snapshots = [metrics_registry.get_snapshot()]
+    directory = get_metrics_directory()
+    if directory and os.path.isdir(directory):
+        own_file_name = '{}.json'.format(os.getpid())
+        with _lock_directory(directory):
+            for file_name in sorted(os.listdir(directory)):
+                pid = file_name[:-len('.json')]
+                if not file_name.endswith('.json') or not pid.isdigit() or file_name == own_file_name:
+                    continue
+                snapshot = _read_snapshot(os.path.join(directory, file_name))
+                if snapshot is None:
+                    continue
+                if _is_process_alive(int(pid)):
+                    snapshots.append(snapshot)
+                else:
+                    _retire_snapshot(directory, file_name, snapshot)
+            retired = _read_snapshot(os.path.join(directory, RETIRED_FILE_NAME))
+        if retired is not None:
+            snapshots.append(retired)
+    return merge_snapshots(snapshots)
+
+
+def merge_snapshots(snapshots):
+    histograms = OrderedDict()
+    caches = OrderedDict()
+    for snapshot in snapshots:
+        for name, view, action, counts, total, count in snapshot['histograms']:
+            if name not in HISTOGRAMS or len(counts) != len(HISTOGRAMS[name][1]) + 1:
+                continue  # Written by another version of the code.
+            merged = histograms.setdefault((name, view, action), [[0] * len(counts), 0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+        for cache_name, stats in snapshot['caches'].items():
+            merged_stats = caches.setdefault(cache_name, OrderedDict())
+            for key, value in stats.items():
+                merged_stats[key] = merged_stats.get(key, 0) + value
+    return {
+        'histograms': [[name, view, action] + merged for (name, view, action), merged in histograms.items()],
+        'caches': caches,
+    }
+
+
+# ---------- Exposition ---------------------------------------------------------------------------
+
+
+def _format_labels(labels):
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join('{}="{}"'.format(key, value) for key, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshot):
+    """
+    Renders a snapshot in the Prometheus text exposition format (version 0.0.4).
+    """
+    lines = []
+    histograms = sorted(snapshot['histograms'], key=lambda item: (list(HISTOGRAMS).index(item[0]), item[1:3]))
+    current_name = None
+    for name, view, action, counts, total, count in histograms:
+        full_name = METRIC_PREFIX + name
+        if name != current_name:
+            help_text, buckets = HISTOGRAMS[name]
+            lines.append('# HELP {} {}'.format(full_name, help_text))
+            lines.append('# TYPE {} histogram'.format(full_name))
+            current_name = name
+        labels = [('view', view), ('action', action)]
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+            cumulative_count += bucket_count
+            bucket_labels = _format_labels(labels + [('le', upper_bound)])
+            lines.append('{}_bucket{} {}'.format(full_name, bucket_labels, cumulative_count))
+        lines.append('{}_sum{} {}'.format(full_name, _format_labels(labels), _format_value(total)))
+        lines.append('{}_count{} {}'.format(full_name, _format_labels(labels), count))
+
+    cache_metrics = [
+        ('hits', 'counter', 'cache_hits_total', 'Hits of the restified caches.'),
+        ('misses', 'counter', 'cache_misses_total', 'Misses of the restified caches.'),
+        ('errors', 'counter', 'cache_errors_total', 'Backend errors of the restified caches.'),
+        ('local_size', 'gauge', 'cache_local_size', 'Number of keys in the in-process fallbacks.'),
+    ]
+    for key, metric_type, name, help_text in cache_metrics:
+        full_name = METRIC_PREFIX + name
+        lines.append('# HELP {} {}'.format(full_name, help_text))
+        lines.append('# TYPE {} {}'.format(full_name, metric_type))
+        for cache_name, stats in snapshot['caches'].items():
+            if key in stats:
+                lines.append('{}{} {}'.format(full_name, _format_labels([('cache', cache_name)]), stats[key]))
+    return '\n'.join(lines) + '\n'
+
+
+class PrometheusRenderer(BaseRenderer):
+    """
+    A renderer of the Prometheus text format. Views should return the rendered text as data: other
+    data (e.g. of error responses) is rendered as a comment.
+    """
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, str):
+            data = '# {}\n'.format(json.dumps(data))
+        return data.encode(self.charset)
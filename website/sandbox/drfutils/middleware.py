@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.views import APIView
+
+from .dbrouters import (
+    choose_read_replica, clear_routed_writes, get_replica_aliases, has_routed_writes, set_read_replica,
+)
+from .metrics import (
+    RequestMetrics, flush_metrics, get_request_metrics, is_metrics_enabled, metrics_registry,
+    register_flush_at_exit, set_request_metrics,
+)
+from .profiling import (
+    RequestProfile, get_profile_store, is_profiling_enabled, is_profiling_requested, is_staff_request,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaRoutingMiddleware(object):
+    """
+    Routes the reads of safe-method requests to DRF views to a replica (see ``ReplicaRouter``).
+
+    To read its own writes despite the replication lag, a client sticks to the primary database for
+    ``V5_REPLICA_STICKY_SECONDS`` seconds (10 by default) after a request which wrote to it, by a
+    cookie. Requests which do not write (e.g. a failed form, or a batch of reads which is posted)
+    do not set it. Other views (e.g. the admin site) always read from the primary.
+
+    This middleware is disabled if ``V5_DATABASE_REPLICAS`` is empty.
+    """
+    sticky_cookie_name = 'v5_read_primary'
+
+    def __init__(self, get_response):
+        if not get_replica_aliases():
+            raise MiddlewareNotUsed('No database replica configured.')
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'V5_REPLICA_STICKY_SECONDS', 10)
+
+    def __call__(self, request):
+        clear_routed_writes()
+        try:
+            response = self.get_response(request)
+        finally:
+            # NOTE: A streaming response is consumed after this point, so it reads from the primary.
+            set_read_replica(None)
+        if has_routed_writes():
+            response.set_cookie(
+                self.sticky_cookie_name, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None or not issubclass(view_class, APIView):
+            return None
+        if request.method in SAFE_METHODS and self.sticky_cookie_name not in request.COOKIES:
+            set_read_replica(choose_read_replica())
+        return None
+
+
+class MetricsMiddleware(object):
+    """
+    Records the metrics of each request to a view (see ``sandbox.drfutils.metrics``), by view name
+    and action: the wall time, the number and the time of the database queries, the time spent in
+    serializers (of view sets with ``MetricsMixin``), and the size of the response.
+
+    The metrics of the worker process are flushed to ``V5_METRICS_DIR`` at most every
+    ``V5_METRICS_FLUSH_INTERVAL`` seconds (15 by default), and on exit.
+
+    This middleware is disabled unless ``V5_METRICS_ENABLED`` is ``True``, so that the requests do
+    not pay for it otherwise.
+    """
+
+    def __init__(self, get_response):
+        if not is_metrics_enabled():
+            raise MiddlewareNotUsed('Metrics are disabled.')
+        self.get_response = get_response
+        self.flush_interval = getattr(settings, 'V5_METRICS_FLUSH_INTERVAL', 15)
+        self._next_flush_time = time.monotonic() + self.flush_interval
+        register_flush_at_exit()
+
+    def __call__(self, request):
+        request_metrics = RequestMetrics()
+        set_request_metrics(request_metrics)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(request_metrics))
+                response = self.get_response(request)
+        finally:
+            set_request_metrics(None)
+        duration = time.perf_counter() - start
+
+        if request_metrics.view is not None:
+            values = {
+                'request_duration_seconds': duration,
+                'request_db_queries': request_metrics.query_count,
+                'request_db_duration_seconds': request_metrics.query_time,
+                'request_serializer_duration_seconds': request_metrics.serializer_time,
+            }
+            if not response.streaming:
+                values['response_size_bytes'] = len(response.content)
+            metrics_registry.observe(request_metrics.view, request_metrics.action, values)
+            self._flush_if_due()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request_metrics = get_request_metrics()
+        if request_metrics is None:
+            return None
+        # NOTE: [DRF] ``as_view()`` of a view set sets the mapping of methods to actions on the view
+        # function, and ``as_view()`` of a class-based view sets the class.
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        request_metrics.view = view_class.__name__ if view_class is not None else view_func.__name__
+        method = request.method.lower()
+        actions = getattr(view_func, 'actions', None) or {}
+        if method == 'head' and 'head' not in actions:
+            method = 'get'
+        request_metrics.action = actions.get(method, method)
+        return None
+
+    def _flush_if_due(self):
+        now = time.monotonic()
+        if now < self._next_flush_time:
+            return
+        self._next_flush_time = now + self.flush_interval
+        try:
+            flush_metrics()
+        except OSError as exc:
+            logger.warning('Fail to flush metrics: %s', exc)
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles the requests of staff users which ask for it, by an ``X-Profile`` header or a
+    ``_profile`` query parameter: the rest of the middleware chain and the view run under
+    ``cProfile``, and their database queries are recorded. The profile is saved to the ring buffer
+    of ``V5_PROFILING_DIR`` (see ``ProfileStore``), which keeps the last
+    ``V5_PROFILING_MAX_PROFILES`` profiles (50 by default), and its ID is returned in the
+    ``X-Profile-Id`` response header. See ``/restified/v3/_meta/profiles/``.
+
+    It must come after ``AuthenticationMiddleware``. Other requests only pay for a header check.
+
+    NOTE: The content of a streaming response is generated after the profiler is stopped, so it is
+    not profiled.
+
+    This middleware is disabled unless ``V5_PROFILING_ENABLED`` is ``True``.
+    """
+
+    def __init__(self, get_response):
+        if not is_profiling_enabled():
+            raise MiddlewareNotUsed('Profiling is disabled.')
+        self.get_response = get_response
+        self.store = get_profile_store()
+        if self.store is None:
+            raise MiddlewareNotUsed('No profile directory configured.')
+        self.max_queries = getattr(settings, 'V5_PROFILING_MAX_QUERIES', 1000)
+
+    def __call__(self, request):
+        if not is_profiling_requested(request) or not is_staff_request(request):
+            return self.get_response(request)
+
+        request_profile = RequestProfile(self.max_queries)
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(request_profile.get_query_recorder(connection.alias)))
+            try:
+                request_profile.profiler.enable()
+            except ValueError as exc:
+                # Another profiler is already active in this thread.
+                logger.warning('Fail to profile %s: %s', request.path, exc)
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                request_profile.profiler.disable()
+        request_profile.duration = time.perf_counter() - start
+
+        user = getattr(request, 'user', None)
+        metadata = {
+            'date': datetime.datetime.now().isoformat(),
+            'method': request.method,
+            # The query string is not recorded, as it may contain secrets (e.g. tokens).
+            'path': request.path,
+            'status': response.status_code,
+            'user': user.username if user is not None and user.is_authenticated else None,
+        }
+        try:
+            response['X-Profile-Id'] = self.store.save(request_profile, metadata)
+        except OSError as exc:
+            logger.warning('Fail to save the profile of %s: %s', request.path, exc)
+        return response
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+from django.conf import settings
+from django.db import models
+
+
+class RevokedToken(models.Model):
+    """
+    A revocation of JSON Web Tokens (see ``JWTAuthentication``): of a single token by its ``jti``
+    claim, or, if ``jti`` is empty, of all the tokens issued to the user until ``revoke_time``.
+
+    Times are UNIX timestamps, like the ``iat`` and ``exp`` claims. A revocation is deleted once
+    the tokens it revokes have expired (``expire_time``).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    jti = models.CharField(max_length=255, blank=True)
+    revoke_time = models.BigIntegerField()
+    expire_time = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return '{} {}'.format(self.user_id, self.jti or '*')
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import binascii
+import json
+import logging
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import F, Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+logger = logging.getLogger(__name__)
+
+
+class KeysetPagination(BasePagination):
+    """
+    A forward-only keyset (a.k.a. cursor) pagination on a unique ordering, such as
+    ``('-scheduled_date', '-pk')``. The cursor encodes the ordering values of the last object of the
+    current page, and the next page is fetched by a range filter on those values. So unlike
+    ``PageNumberPagination``, it neither runs a ``COUNT(*)`` nor scans the skipped rows with an
+    ``OFFSET``: every page costs the same, given an index on the ordering fields.
+
+    The keyset mode is opt-in: it is used only if the client requests it by ``?pagination=cursor``.
+    Otherwise, pagination is delegated to ``fallback_class``, so that existing clients are not
+    affected.
+
+    NOTE: The last field of ``ordering`` must be unique (typically the primary key), otherwise
+    objects sharing the same ordering values may be skipped between pages. The ordering may vary by
+    request by overriding ``get_ordering()``, and may include annotations of the queryset.
+
+    Ordering fields may be nullable (annotations are assumed to be). ``NULL`` sorts before any value,
+    as on SQLite: first in ascending order, last in descending order, whatever the database.
+    """
+    ordering = None
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    mode_query_value = 'cursor'
+    fallback_class = PageNumberPagination
+
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if request.query_params.get(self.mode_query_param) != self.mode_query_value:
+            self.fallback = self.fallback_class()
+            page = self.fallback.paginate_queryset(queryset, request, view=view)
+            self.display_page_controls = self.fallback.display_page_controls
+            return page
+        self.fallback = None
+
+        # The ordering of this request, used by the other methods.
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.nullable_fields = self._get_nullable_fields(queryset)
+        queryset = queryset.order_by(*self._get_order_by(connections[queryset.db]))
+        encoded = request.query_params.get(self.cursor_query_param)
+        try:
+            if encoded:
+                queryset = queryset.filter(self._build_keyset_filter(self._decode_cursor(encoded)))
+            # Fetch one extra object to find out whether there is a next page.
+            page = list(queryset[:self.page_size + 1])
+        except (TypeError, ValueError, ValidationError):
+            # The cursor values do not match the types of the ordering fields.
+            raise NotFound(self.invalid_cursor_message)
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_values = self._get_ordering_values(page[-1]) if self.has_next else None
+        return page
+
+    def get_ordering(self, request, queryset, view):
+        assert self.ordering, (
+            'Class `{}` should include an `ordering` attribute.'
+        ).format(self.__class__.__name__)
+        return self.ordering
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, self._encode_cursor(self.next_values))
+
+    def to_html(self):
+        return self.fallback.to_html() if self.fallback is not None else ''
+
+    def get_schema_fields(self, view):
+        return self.fallback_class().get_schema_fields(view)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = self.fallback_class().get_schema_operation_parameters(view)
+        return parameters + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to `{}` to paginate by cursor.'.format(self.mode_query_value),
+                'schema': {'type': 'string', 'enum': [self.mode_query_value]},
+            },
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+        ]
+
+    def _get_ordering_values(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def _get_nullable_fields(self, queryset):
+        nullable_fields = set()
+        for field in self.ordering:
+            field_name = field.lstrip('-')
+            try:
+                if queryset.model._meta.get_field(field_name).null:
+                    nullable_fields.add(field_name)
+            except FieldDoesNotExist:
+                # An annotation (or a lookup through a relation), which may be NULL.
+                nullable_fields.add(field_name)
+        return nullable_fields
+
+    def _get_order_by(self, connection):
+        # NOTE: SQLite and MySQL sort ``NULL`` first already. Django emulates ``NULLS FIRST`` on them
+        # by repeating the expression, without repeating its parameters (e.g. of ``RawSQL``).
+        if connection.vendor in ('sqlite', 'mysql'):
+            return self.ordering
+        order_by = []
+        for field in self.ordering:
+            field_name = field.lstrip('-')
+            if field_name not in self.nullable_fields:
+                order_by.append(field)
+            elif field.startswith('-'):
+                order_by.append(F(field_name).desc(nulls_last=True))
+            else:
+                order_by.append(F(field_name).asc(nulls_first=True))
+        return order_by
+
+    def _build_keyset_filter(self, values):
+        """
+        Builds a filter selecting the objects which come after ``values`` in the ordering. For an
+        ordering ``(-a, -b)`` and values ``(x, y)``, this is: ``a < x OR (a = x AND b < y)``.
+        """
+        keyset_filter = Q()
+        for index, field in enumerate(self.ordering):
+            clause = self._build_after_filter(field, values[index])
+            for previous_field, previous_value in zip(self.ordering[:index], values[:index]):
+                clause &= self._build_equal_filter(previous_field, previous_value)
+            keyset_filter |= clause
+        return keyset_filter
+
+    def _build_after_filter(self, field, value):
+        field_name = field.lstrip('-')
+        descending = field.startswith('-')
+        if value is None:
+            # ``NULL`` is last in descending order, and first in ascending order.
+            return Q(pk__in=[]) if descending else Q(**{'{}__isnull'.format(field_name): False})
+        after_filter = Q(**{'{}__{}'.format(field_name, 'lt' if descending else 'gt'): value})
+        if descending and field_name in self.nullable_fields:
+            after_filter |= Q(**{'{}__isnull'.format(field_name): True})
+        return after_filter
+
+    def _build_equal_filter(self, field, value):
+        field_name = field.lstrip('-')
+        if value is None:
+            return Q(**{'{}__isnull'.format(field_name): True})
+        return Q(**{field_name: value})
+
+    def _encode_cursor(self, values):
+        # NOTE: Unlike ``DjangoJSONEncoder``, we keep the microseconds of datetime values, so that
+        # the keyset filter does not skip objects created within the same millisecond.
+        data = json.dumps(values, default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def _decode_cursor(self, encoded):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
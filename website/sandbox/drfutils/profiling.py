@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+import cProfile
+import datetime
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import JWTAuthentication
+
+
+logger = logging.getLogger(__name__)
+
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+PROFILE_QUERY_PARAM = '_profile'
+
+# Profile IDs sort by time (to the microsecond), e.g. ``20240131T235959123456-1a2b3c4d``.
+PROFILE_ID_PATTERN = r'[0-9]{8}T[0-9]{12}-[0-9a-f]{8}'
+
+# The functions listed in the summary of a profile, by cumulative time.
+SUMMARY_SIZE = 40
+
+
+def is_profiling_enabled():
+    return getattr(settings, 'V5_PROFILING_ENABLED', False)
+
+
+def get_profiles_directory():
+    return getattr(settings, 'V5_PROFILING_DIR', None)
+
+
+def is_profiling_requested(request):
+    """
+    Whether the request asks to be profiled, by an ``X-Profile`` header or a ``_profile`` query
+    parameter (with any value but ``0``).
+    """
+    value = request.META.get(PROFILE_HEADER)
+    if value is None:
+        value = request.GET.get(PROFILE_QUERY_PARAM)
+    return value is not None and value not in ('0', 'false')
+
+
+def is_staff_request(request):
+    """
+    Whether the request is made by a staff user, either logged in by the session, or authenticated
+    by a JWT. This runs before DRF authenticates the request, so other DRF authentication schemes
+    (e.g. Basic) are not supported.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return bool(user.is_staff)
+    try:
+        user_auth = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return user_auth is not None and bool(user_auth[0].is_staff)
+
+
+# ---------- Recording ----------------------------------------------------------------------------
+
+
+class QueryRecorder(object):
+    """
+    A database execute wrapper (see ``connection.execute_wrapper()``), which records the SQL (with
+    its placeholders) and the time of the queries of a database alias to a ``RequestProfile``. The
+    parameters are not recorded, since they may be secrets (e.g. password hashes or session keys)
+    and profiles are kept on disk.
+    """
+
+    def __init__(self, alias, request_profile):
+        self.alias = alias
+        self.request_profile = request_profile
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.request_profile.add_query({
+                'alias': self.alias,
+                'sql': sql,
+                'many': many,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+class RequestProfile(object):
+    """
+    The deterministic profile (by ``cProfile``) and the database queries of a request.
+    """
+
+    def __init__(self, max_queries):
+        self.profile_id = '{}-{}'.format(datetime.datetime.now().strftime('%Y%m%dT%H%M%S%f'), uuid.uuid4().hex[:8])
+        self.profiler = cProfile.Profile()
+        self.queries = []
+        self.max_queries = max_queries
+        self.query_count = 0
+        self.duration = None
+
+    def get_query_recorder(self, alias):
+        return QueryRecorder(alias, self)
+
+    def add_query(self, query):
+        # Only the first queries are kept, but all of them are counted.
+        self.query_count += 1
+        if len(self.queries) < self.max_queries:
+            self.queries.append(query)
+
+    def get_summary(self):
+        """
+        Returns the ``pstats`` listing of the functions with the highest cumulative time.
+        """
+        output = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=output)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(SUMMARY_SIZE)
+        return output.getvalue()
+
+
+# ---------- Storage ------------------------------------------------------------------------------
+
+
+class ProfileStore(object):
+    """
+    A bounded ring buffer of request profiles in a directory, shared by all worker processes. Each
+    profile is a ``<profile ID>.prof`` file (the ``pstats`` dump, e.g. for ``snakeviz``) and a
+    ``<profile ID>.json`` file (the request, the queries and a summary). The oldest profiles are
+    deleted beyond ``max_profiles``.
+    """
+
+    def __init__(self, directory, max_profiles):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, request_profile, metadata):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = request_profile.profile_id
+        request_profile.profiler.dump_stats(self.get_stats_path(profile_id))
+        data = dict(
+            metadata,
+            id=profile_id,
+            duration_ms=round(request_profile.duration * 1000, 3),
+            query_count=request_profile.query_count,
+            queries=request_profile.queries,
+            summary=request_profile.get_summary(),
+        )
+        # The JSON file is written last, and atomically: a profile is listed once it is complete.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as temp_file:
+                json.dump(data, temp_file)
+            os.replace(temp_path, self.get_data_path(profile_id))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+        return profile_id
+
+    def evict(self):
+        for profile_id in self.get_profile_ids()[self.max_profiles:]:
+            for path in (self.get_data_path(profile_id), self.get_stats_path(profile_id)):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    # Deleted by another worker process.
+                    pass
+
+    def get_profile_ids(self):
+        """
+        Returns the IDs of the stored profiles, the latest first.
+        """
+        try:
+            filenames = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        pattern = re.compile(r'^({})\.json$'.format(PROFILE_ID_PATTERN))
+        matches = (pattern.match(filename) for filename in filenames)
+        return sorted((match.group(1) for match in matches if match), reverse=True)
+
+    def get_data(self, profile_id):
+        """
+        Returns the data of a profile, or ``None`` if it does not exist (any more).
+        """
+        try:
+            with open(self.get_data_path(profile_id)) as data_file:
+                return json.load(data_file)
+        except FileNotFoundError:
+            return None
+
+    def get_data_path(self, profile_id):
+        return os.path.join(self.directory, '{}.json'.format(profile_id))
+
+    def get_stats_path(self, profile_id):
+        return os.path.join(self.directory, '{}.prof'.format(profile_id))
+
+
+def get_profile_store():
+    directory = get_profiles_directory()
+    if not directory:
+        return None
+    return ProfileStore(directory, getattr(settings, 'V5_PROFILING_MAX_PROFILES', 50))
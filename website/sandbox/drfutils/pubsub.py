@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from .caches import FallbackCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription(object):
+    """
+    A subscription to a channel of ``LocalPubSub``. Messages are buffered in a bounded queue: if a
+    subscriber does not keep up, new messages are dropped and counted in ``dropped``.
+
+    A subscription should be closed when it is no longer used, for example by using it as a context
+    manager.
+    """
+
+    def __init__(self, pubsub, channel, maxsize):
+        self.pubsub = pubsub
+        self.channel = channel
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, timeout=None):
+        """
+        Returns the next message, waiting up to ``timeout`` seconds. Returns None on timeout.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.pubsub.unsubscribe(self)
+
+
+class LocalPubSub(object):
+    """
+    An in-process publish/subscribe hub. Messages published to a channel are delivered to the
+    subscriptions of the channel in the same process only, so this is suitable for a single worker
+    process (or for tests). Messages should be immutable, as they are shared by subscribers.
+    """
+    subscription_class = Subscription
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscriptions = defaultdict(set)
+        self._num_subscriptions = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, max_subscriptions=None):
+        """
+        Returns a new subscription to the channel, or ``None`` if the process already has
+        ``max_subscriptions`` subscriptions (to any channel).
+        """
+        subscription = self.subscription_class(self, channel, self.maxsize)
+        with self._lock:
+            if max_subscriptions is not None and self._num_subscriptions >= max_subscriptions:
+                return None
+            self._subscriptions[channel].add(subscription)
+            self._num_subscriptions += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._num_subscriptions -= 1
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    @property
+    def num_subscriptions(self):
+        """
+        The number of subscriptions of the current process.
+        """
+        return self._num_subscriptions
+
+    def has_subscribers(self, channel):
+        """
+        Returns whether the channel has subscribers. Publishers may check this before building an
+        expensive message.
+        """
+        return channel in self._subscriptions
+
+    def publish(self, channel, message):
+        """
+        Publishes the message to the subscriptions of the channel, and returns the number of
+        subscriptions which received it.
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+        return len(subscriptions)
+
+
+class CacheSubscription(Subscription):
+    """
+    A subscription to a channel of ``CachePubSub``, which polls the cache for the new messages of
+    the channel while it waits for a message.
+    """
+
+    def __init__(self, pubsub, channel, maxsize):
+        super().__init__(pubsub, channel, maxsize)
+        # Messages are received from the current sequence number of the channel.
+        self._sequence = pubsub.get_sequence(channel)
+        self._next_poll_time = time.monotonic() + pubsub.poll_interval
+        self._next_refresh_time = 0
+        # The time until which a missing message is waited for (see ``_poll()``).
+        self._missing_deadline = None
+        self._refresh()
+
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._poll()
+            try:
+                return self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return None
+            wait = max(self._next_poll_time - now, 0)
+            time.sleep(wait if deadline is None else min(wait, deadline - now))
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now >= self._next_refresh_time:
+            self.pubsub.cache.set(self.pubsub.get_subscribers_key(self.channel), True, self.pubsub.subscriber_timeout)
+            self._next_refresh_time = now + self.pubsub.subscriber_timeout / 2
+
+    def _poll(self):
+        now = time.monotonic()
+        if now < self._next_poll_time:
+            return
+        self._next_poll_time = now + self.pubsub.poll_interval
+        self._refresh()
+        sequence = self.pubsub.get_sequence(self.channel)
+        if sequence < self._sequence:
+            # The sequence number has been reset (e.g. evicted from the cache).
+            self._sequence = 0
+        if sequence == self._sequence:
+            return
+        first = max(self._sequence + 1, sequence - self._queue.maxsize + 1)
+        self.dropped += first - self._sequence - 1
+        numbers = range(first, sequence + 1)
+        messages = self.pubsub.cache.get_many([self.pubsub.get_message_key(self.channel, number) for number in numbers])
+        for number in numbers:
+            key = self.pubsub.get_message_key(self.channel, number)
+            if key in messages:
+                self.put(messages[key])
+            elif self._missing_deadline is None or now < self._missing_deadline:
+                # The message may be published but not stored yet: wait for it a little.
+                if self._missing_deadline is None:
+                    self._missing_deadline = now + 2 * self.pubsub.poll_interval
+                break
+            else:
+                # The message is lost (e.g. evicted, or its publisher has failed).
+                self.dropped += 1
+            self._missing_deadline = None
+            self._sequence = number
+
+
+class CachePubSub(LocalPubSub):
+    """
+    A publish/subscribe hub shared by the worker processes through a ``FallbackCache``. Each
+    message of a channel increments the sequence number of the channel, and is kept in the cache
+    under this number for ``message_timeout`` seconds. Subscriptions poll the sequence number every
+    ``poll_interval`` seconds, and fetch the new messages, so messages are delivered with a delay
+    of up to ``poll_interval`` seconds.
+
+    Subscriptions mark their channel as subscribed in the cache for ``subscriber_timeout``
+    seconds, and refresh the mark while they poll, so that publishers of any process can tell
+    whether a channel has subscribers.
+
+    NOTE: Without a shared cache, the messages are only kept in the process (for a few seconds, see
+    ``FallbackCache``), which makes this a ``LocalPubSub`` with polling. Messages published while
+    the shared cache fails may be lost: subscribers should be able to catch up (e.g. event streams
+    are resumed from their last event ID).
+    """
+    subscription_class = CacheSubscription
+
+    def __init__(self, name='pubsub', maxsize=100, poll_interval=1, message_timeout=60, subscriber_timeout=60):
+        super().__init__(maxsize)
+        self.poll_interval = poll_interval
+        self.subscriber_timeout = subscriber_timeout
+        self.cache = FallbackCache(name, timeout=message_timeout)
+
+    def get_sequence_key(self, channel):
+        return 'sequence:{}'.format(channel)
+
+    def get_message_key(self, channel, number):
+        return 'message:{}:{}'.format(channel, number)
+
+    def get_subscribers_key(self, channel):
+        return 'subscribers:{}'.format(channel)
+
+    def get_sequence(self, channel):
+        return self.cache.get(self.get_sequence_key(channel), 0)
+
+    def has_subscribers(self, channel):
+        return super().has_subscribers(channel) or self.cache.get(self.get_subscribers_key(channel), False)
+
+    def publish(self, channel, message):
+        """
+        Publishes the message to the subscriptions of the channel in all processes. The number of
+        subscriptions is not known, so this returns ``None``.
+        """
+        number = self.cache.incr(self.get_sequence_key(channel))
+        self.cache.set(self.get_message_key(channel, number), message)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import django
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.generic import View
+
+import rest_framework
+from rest_framework.schemas.openapi import SchemaGenerator
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_source_digest(package_names):
+    """
+    Returns a digest of the Python source files of the packages (which are skipped if they cannot
+    be found), and of the versions of Django and DRF.
+    """
+    digest = hashlib.sha1('{}:{}'.format(django.__version__, rest_framework.__version__).encode('utf-8'))
+    for package_name in package_names:
+        spec = importlib.util.find_spec(package_name)
+        if spec is None or not spec.submodule_search_locations:
+            continue
+        for package_path in sorted(spec.submodule_search_locations):
+            for dirpath, dirnames, filenames in os.walk(package_path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if not filename.endswith('.py'):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    digest.update(os.path.relpath(path, package_path).encode('utf-8'))
+                    with open(path, 'rb') as source_file:
+                        digest.update(source_file.read())
+    return digest.hexdigest()
+
+
+class CachedSchema(object):
+    """
+    An OpenAPI schema which is generated once per code version, rather than on each request, and
+    kept in memory and in a JSON file (if ``path`` is set). The file is written by the
+    ``generate_openapi_schema`` command (typically on deployment), or by the first request after
+    the code version changed.
+
+    The code version is ``V5_CODE_VERSION`` if set (e.g. the commit hash, set by the deployment),
+    or else a digest of the source of ``source_packages`` (see ``get_source_digest()``).
+
+    NOTE: [DRF] The schema is generated without a request, so it lists all endpoints, whatever
+    the permissions of the user who reads it (like the ``generateschema`` command).
+    """
+
+    def __init__(self, title, version, path=None, source_packages=(), urlconf=None):
+        self.title = title
+        self.version = version
+        self.path = path
+        self.source_packages = source_packages
+        self.urlconf = urlconf
+        self._code_version = None
+        # The rendered schema and its ETag, for the code version.
+        self._content = None
+        self._etag = None
+        self._lock = threading.Lock()
+
+    def get_code_version(self):
+        if self._code_version is None:
+            self._code_version = (
+                getattr(settings, 'V5_CODE_VERSION', None) or get_source_digest(self.source_packages)
+            )
+        return self._code_version
+
+    def generate(self):
+        generator = SchemaGenerator(title=self.title, version=self.version, urlconf=self.urlconf)
+        return generator.get_schema(request=None, public=True)
+
+    def write(self):
+        """
+        Generates the schema, and writes it to the file along with the code version. Returns the
+        rendered schema.
+        """
+        content = self._render(self.generate())
+        self._write_file(content)
+        return content
+
+    def get_content(self):
+        """
+        Returns the rendered schema and its ETag, from memory, from the file if it was written for
+        the current code version, or else newly generated.
+        """
+        if self._content is None:
+            with self._lock:
+                if self._content is None:
+                    content = self._read()
+                    if content is None:
+                        content = self._generate_and_write()
+                    self._etag = quote_etag(hashlib.md5(content).hexdigest())
+                    self._content = content
+        return self._content, self._etag
+
+    def _read(self):
+        if not self.path:
+            return None
+        try:
+            with open(self.path, encoding='utf-8') as schema_file:
+                data = json.load(schema_file)
+        except FileNotFoundError:
+            return None
+        except ValueError as exc:
+            logger.warning('Ignore the invalid schema file %s: %s', self.path, exc)
+            return None
+        if data.get('code_version') != self.get_code_version():
+            logger.info('The schema file %s is out of date.', self.path)
+            return None
+        return self._render(data['schema'])
+
+    def _generate_and_write(self):
+        content = self._render(self.generate())
+        try:
+            self._write_file(content)
+        except OSError as exc:
+            # The schema is still served from memory.
+            logger.warning('Fail to write the schema file %s: %s', self.path, exc)
+        return content
+
+    def _write_file(self, content):
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as temp_file:
+                json.dump({'code_version': self.get_code_version(), 'schema': json.loads(content)}, temp_file)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _render(self, schema):
+        return json.dumps(schema, indent=2).encode('utf-8')
+
+
+class CachedSchemaView(View):
+    """
+    Serves a ``CachedSchema`` as JSON, with an ETag, so that clients (e.g. the Swagger page) can
+    revalidate it with a ``304 Not Modified``.
+    """
+    schema = None
+    content_type = 'application/vnd.oai.openapi+json'
+
+    def get(self, request, *args, **kwargs):
+        content, etag = self.schema.get_content()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=self.content_type)
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachedRepresentationMixin(object):
+    """
+    A mixin for ``ModelSerializer`` which caches the representations of instances in the
+    ``representation_cache`` (a ``RepresentationCache``). To cache the representations of a list of
+    instances in bulk, the serializer should also declare ``CachedListSerializer`` as
+    ``Meta.list_serializer_class``.
+
+    The cache key includes the serializer class and the host of the current request (which is part
+    of absolute URLs), so the representation must not depend on anything else, such as the current
+    user.
+    """
+    representation_cache = None
+
+    def to_representation(self, instance):
+        if self.representation_cache is None or instance.pk is None:
+            return super().to_representation(instance)
+        return self.to_cached_representations([instance])[0]
+
+    def to_cached_representations(self, instances):
+        cache = self.representation_cache
+        prefix = self._get_representation_key_prefix()
+        keys = [cache.make_instance_key(instance, prefix) for instance in instances]
+        found = cache.get_many(keys)
+        representations = []
+        missing = {}
+        for key, instance in zip(keys, instances):
+            if key in found:
+                representation = found[key]
+            else:
+                representation = super().to_representation(instance)
+                missing[key] = representation
+            representations.append(representation)
+        if missing:
+            cache.set_many(missing)
+        return representations
+
+    def _get_representation_key_prefix(self):
+        # The generation is read once per request: the context is shared by nested serializers.
+        generations = self.context.setdefault('representation_cache_generations', {})
+        cache = self.representation_cache
+        if cache.name not in generations:
+            generations[cache.name] = cache.get_generation()
+        request = self.context.get('request')
+        variant = [
+            self.__class__.__module__, self.__class__.__name__,
+            request.build_absolute_uri('/') if request is not None else '',
+            # The fields may vary by request (see ``DynamicFieldsMixin``).
+            [(name, field.__class__.__name__) for name, field in self.fields.items()],
+        ]
+        variant_hash = hashlib.md5(repr(variant).encode('utf-8')).hexdigest()
+        return '{}:{}'.format(generations[cache.name], variant_hash)
+
+
+class CachedListSerializer(serializers.ListSerializer):
+    """
+    A list serializer which gets and sets the cached representations of its child (a
+    ``CachedRepresentationMixin`` serializer) in bulk.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        if self.child.representation_cache is None:
+            return super().to_representation(iterable)
+        return self.child.to_cached_representations(list(iterable))
+
+
+class DynamicFieldsMixin(object):
+    """
+    A mixin for ``ModelSerializer`` which supports sparse fieldsets and opt-in collapsing of nested
+    serializers, through the query parameters of ``GET`` requests:
+
+    - ``?fields=pk,title,creator`` limits the representation to the given fields.
+    - ``?collapse=group,creator`` collapses the given nested serializers.
+
+    Collapsible fields are declared on the ``Meta`` class as ``collapsible_fields``, which maps a
+    field name to the attribute its related object collapses to (``'pk'`` or a slug field) if
+    requested, for example::
+
+        collapsible_fields = {'group': 'slug', 'creator': 'username'}
+
+    By default, nested serializers are not collapsed, so that the representation is unchanged for
+    clients which do not ask for it.
+
+    Only the root serializer of the view (or its list serializer) is affected, and unknown field
+    names are ignored. The model columns which are not needed by the sparse representation are
+    returned by ``get_deferred_fields()``, to be deferred by ``EagerLoadingMixin``.
+    """
+    fields_query_param = 'fields'
+    collapse_query_param = 'collapse'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        self._deferred_fields = []
+        request = self._get_dynamic_fields_request()
+        if request is None:
+            return fields
+        requested = self._get_query_param_names(request, self.fields_query_param)
+        collapsed = self._get_query_param_names(request, self.collapse_query_param) or set()
+        if requested is not None:
+            excluded = OrderedDict((name, field) for name, field in fields.items() if name not in requested)
+            fields = OrderedDict((name, field) for name, field in fields.items() if name in requested)
+            self._deferred_fields.extend(self._get_excluded_columns(excluded, fields))
+        for name, collapsed_to in getattr(self.Meta, 'collapsible_fields', {}).items():
+            if name in fields and name in collapsed:
+                fields[name] = self._collapse_field(fields[name], collapsed_to)
+                self._deferred_fields.extend(self._get_collapsed_columns(fields[name], name, collapsed_to))
+        return fields
+
+    def get_deferred_fields(self):
+        """
+        Returns the lookups of the model columns which can be deferred when loading the instances
+        to serialize.
+        """
+        self.fields  # The deferred fields are computed along with the fields.
+        return list(self._deferred_fields)
+
+    def _get_dynamic_fields_request(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        request = self.context.get('request')
+        if parent is not None or request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        return request
+
+    def _get_query_param_names(self, request, param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        return set(name.strip() for name in value.split(',') if name.strip())
+
+    def _collapse_field(self, field, collapsed_to):
+        many = isinstance(field, serializers.ListSerializer)
+        kwargs = {'many': many, 'read_only': True}
+        if field.source is not None:
+            kwargs['source'] = field.source
+        if collapsed_to == 'pk':
+            return serializers.PrimaryKeyRelatedField(**kwargs)
+        return serializers.SlugRelatedField(slug_field=collapsed_to, **kwargs)
+
+    def _get_excluded_columns(self, excluded, fields):
+        """
+        Returns the names of the model columns backing the excluded fields. Columns used by the
+        remaining fields, the version field of the representation cache, and relations are kept.
+        """
+        used_attrs = set((field.source or name).split('.')[0] for name, field in fields.items())
+        representation_cache = getattr(self, 'representation_cache', None)
+        if representation_cache is not None and representation_cache.version_field:
+            used_attrs.add(representation_cache.version_field)
+        columns = []
+        for name, field in excluded.items():
+            attr = field.source or name
+            model_field = self._get_model_column(self.Meta.model, attr)
+            if model_field is not None and attr not in used_attrs:
+                columns.append(attr)
+        return columns
+
+    def _get_collapsed_columns(self, field, name, collapsed_to):
+        """
+        Returns the lookups of the columns of a collapsed forward relation, except the primary key
+        and the slug field.
+        """
+        source = field.source or name
+        relation = self._get_model_relation(self.Meta.model, source)
+        if relation is None or isinstance(field, serializers.ManyRelatedField) or collapsed_to == 'pk':
+            # Collapsing to the primary key does not load the related object at all.
+            return []
+        return [
+            '{}__{}'.format(source, related_field.attname)
+            for related_field in relation.related_model._meta.concrete_fields
+            if not related_field.primary_key and not related_field.is_relation
+            and related_field.name != collapsed_to
+        ]
+
+    def _get_model_column(self, model, attr):
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.primary_key or model_field.is_relation:
+            return None
+        return model_field
+
+    def _get_model_relation(self, model, attr):
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+            return None
+        return model_field
@@ -1,15 +1,206 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
 import logging
 
+from django.db.models import Count, Max
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
 from rest_framework import permissions, mixins, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from .eagerloading import get_related_lookups
+from .metrics import get_request_metrics
+
 
 logger = logging.getLogger(__name__)
 
 
+class EagerLoadingMixin(object):
+    """
+    A mixin for ``GenericViewSet`` which eager loads the relations traversed by the serializer, so
+    that serializing a page of objects runs in a constant number of queries.
+
+    The ``select_related`` and ``prefetch_related`` lookups are derived from the serializer fields
+    (see ``get_related_lookups()``). They are applied in ``filter_queryset()``, so that view sets
+    overriding ``get_queryset()`` are covered as well, and only if the serializer is bound to the
+    same model as the queryset. Columns not needed by a sparse representation (see
+    ``DynamicFieldsMixin``) are deferred, unless the queryset is ordered by them.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer = self.get_serializer()
+        serializer_model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        if serializer_model is not queryset.model:
+            return queryset
+        select_lookups, prefetch_lookups = get_related_lookups(serializer)
+        if select_lookups:
+            queryset = queryset.select_related(*select_lookups)
+        if prefetch_lookups:
+            queryset = queryset.prefetch_related(*prefetch_lookups)
+        if hasattr(serializer, 'get_deferred_fields'):
+            # Keep the ordering columns, which are read by keyset pagination.
+            ordering = list(queryset.query.order_by) + list(getattr(self.paginator, 'ordering', None) or ())
+            ordering_fields = set(name.lstrip('-') for name in ordering if isinstance(name, str))
+            deferred_fields = [name for name in serializer.get_deferred_fields() if name not in ordering_fields]
+            if deferred_fields:
+                queryset = queryset.defer(*deferred_fields)
+        return queryset
+
+
+class NestedViewSetMixin(object):
+    """
+    A mixin for view sets routed under a parent resource, such as
+    ``activities/(?P<activity_pk>\\d+)/subscribers``. Parent objects are declared in
+    ``parent_lookups``, which maps a parent name to a tuple of ``(URL kwarg, queryset, lookup
+    field)``, for example::
+
+        parent_lookups = {
+            'activity': ('activity_pk', Activity.objects.select_related('creator'), 'pk'),
+        }
+
+    A parent object is resolved once per request by ``get_parent_object(name)``, and cached on the
+    view instance (DRF creates a new view instance for each request). If the parent object does
+    not exist, a 404 response is returned.
+    """
+    parent_lookups = {}
+
+    def get_parent_object(self, name):
+        parent_objects = self.__dict__.setdefault('_parent_objects', {})
+        if name not in parent_objects:
+            url_kwarg, queryset, lookup_field = self.parent_lookups[name]
+            filter_kwargs = {lookup_field: self.kwargs.get(url_kwarg)}
+            parent_objects[name] = get_object_or_404(queryset, **filter_kwargs)
+        return parent_objects[name]
+
+
+class ConditionalGetMixin(object):
+    """
+    A mixin for ``GenericViewSet`` which answers ``304 Not Modified`` to conditional ``list`` and
+    ``retrieve`` requests (``If-None-Match`` and ``If-Modified-Since``).
+
+    If validators are declared, they are computed before any serialization:
+
+    - ``last_modified_field``: the object itself for ``retrieve``, and a single aggregate query
+      (``MAX`` of the field and of the primary key, and ``COUNT``) on the filtered queryset for
+      ``list``. This alone is only correct if every change of the representation updates the field.
+    - ``validator_caches``: ``GenerationCache`` instances (e.g. the ``RepresentationCache`` of the
+      serializer) whose generation numbers are bumped on every change of the representation which
+      the field does not reflect, such as changes of embedded related objects. Without
+      ``last_modified_field``, the aggregate query of ``list`` only reads the primary keys.
+
+    The ETag is weak, because the rendering (e.g. the whitespace) may differ between equivalent
+    responses. ``Last-Modified`` is only sent if ``last_modified_field`` is the only validator.
+
+    Otherwise, the ETag is computed from the rendered content of successful ``GET`` responses. This
+    saves bandwidth, but not the query and the serialization.
+    """
+    last_modified_field = None
+    validator_caches = ()
+
+    def list(self, request, *args, **kwargs):
+        if not self._has_validators():
+            return super().list(request, *args, **kwargs)
+        # The generations are read first, so that a change made meanwhile at worst changes the
+        # ETag of the next response, rather than being missed by it.
+        generations = self._get_generations()
+        queryset = self.filter_queryset(self.get_queryset())
+        aggregate_kwargs = {'count': Count('pk'), 'last_pk': Max('pk')}
+        if self.last_modified_field is not None:
+            aggregate_kwargs['last_modified'] = Max(self.last_modified_field)
+        aggregates = queryset.aggregate(**aggregate_kwargs)
+        last_modified = aggregates.get('last_modified')
+        return self._get_conditional_response(
+            request,
+            [request.get_full_path(), last_modified, aggregates['count'], aggregates['last_pk']] + generations,
+            last_modified,
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self._has_validators():
+            return super().retrieve(request, *args, **kwargs)
+        generations = self._get_generations()
+        instance = self.get_object()
+        last_modified = None
+        if self.last_modified_field is not None:
+            last_modified = getattr(instance, self.last_modified_field)
+        return self._get_conditional_response(
+            request,
+            # The query string may select the fields of the representation.
+            [request.get_full_path(), instance.pk, last_modified] + generations,
+            last_modified,
+            lambda: Response(self.get_serializer(instance).data)
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        is_content_etag_required = (
+            not self._has_validators()
+            and self.action in ('list', 'retrieve')
+            and request.method in ('GET', 'HEAD')
+            and response.status_code == 200
+            and not response.has_header('ETag')
+        )
+        if is_content_etag_required:
+            response.render()
+            response['ETag'] = quote_etag(hashlib.md5(response.content).hexdigest())
+            patch_cache_control(response, no_cache=True)
+            response = get_conditional_response(request, etag=response['ETag'], response=response)
+        return response
+
+    def _get_conditional_response(self, request, etag_parts, last_modified, get_response):
+        # The representation also depends on the serializer, the renderer and the host (which is
+        # part of absolute URLs).
+        etag_parts = [
+            self.get_serializer_class().__name__, request.accepted_renderer.format, request.get_host(),
+        ] + etag_parts
+        etag = 'W/' + quote_etag(hashlib.md5(repr(etag_parts).encode('utf-8')).hexdigest())
+        if last_modified is None or self.validator_caches:
+            # ``If-Modified-Since`` would miss the changes tracked by the generations.
+            last_modified = None
+        else:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = get_response()
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Ask clients to revalidate every time, rather than to guess a freshness lifetime from
+        # ``Last-Modified``.
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def _has_validators(self):
+        return self.last_modified_field is not None or bool(self.validator_caches)
+
+    def _get_generations(self):
+        return [cache.get_generation() for cache in self.validator_caches]
+
+
+class MetricsMixin(object):
+    """
+    A mixin for view sets which adds the time spent in their serializers to the metrics of the
+    request (see ``MetricsMiddleware``). It does nothing if metrics are disabled.
+
+    NOTE: [DRF] Serializers are lazy: ``to_representation()`` runs when ``data`` is accessed, so it
+    is timed rather than ``get_serializer()``. Only the top-level serializer is timed (for a list,
+    the ``ListSerializer``), so that nested serializers are not counted twice.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        request_metrics = get_request_metrics()
+        if request_metrics is not None:
+            serializer.to_representation = request_metrics.time_serializer(serializer.to_representation)
+        return serializer
+
+
 class NonModelViewSet(viewsets.ViewSet):
     """
     A generic view set which is not bound to a Django model. It provides serializer-related methods
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+
+from rest_framework.status import HTTP_200_OK
+
+from sandbox.drfutils.dispatch import dispatch_get
+from sandbox.restified.accounts.serializers import CurrentUserSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+RESTIFIED_URLCONF = 'sandbox.restified.urls'
+
+
+def get_restified_mount_prefix():
+    return getattr(settings, 'V5_RESTIFIED_URL_PREFIX', '/restified').rstrip('/')
+
+
+def build_api_url(path, query=None):
+    """
+    Returns the URL of a restified API path (relative to ``/restified/v3/``), with an optional
+    query string, as the key of its data in the bootstrap payload.
+
+    NOTE: The frontend looks up bootstrapped data by URL (see ``common/bootstrap.js``), so the query
+    string is built like ``rest.get()`` does: values are encoded like ``encodeURIComponent()`` and
+    empty values are omitted. Parameters are sorted on both sides, so their order does not matter.
+    """
+    url = '{}/v3/{}'.format(get_restified_mount_prefix(), path)
+    if query:
+        safe = "-_.!~*'()"
+        parts = sorted(
+            '{}={}'.format(quote(str(key), safe=safe), quote(str(value), safe=safe))
+            for key, value in query.items() if value
+        )
+        if parts:
+            url += '?' + '&'.join(parts)
+    return url
+
+
+# ---------- Apps ---------------------------------------------------------------------------------
+
+
+ACTIVITY_LIST_ROUTE_REGEX = re.compile(
+    r'^(?:activity/list/(?P<scheduled>upcoming|past)|activity/tag/(?P<tag>[^/]+))?/?$'
+)
+
+
+def get_activities_bootstrap_urls(route):
+    """
+    Returns the URLs of the first page of the activity list of a route of the activities app (see
+    ``activities/paths.js``). The home page redirects to the upcoming activities.
+    """
+    match = ACTIVITY_LIST_ROUTE_REGEX.match(route)
+    if match is None:
+        return []
+    if match.group('tag'):
+        query = {'tag': match.group('tag')}
+    else:
+        query = {'scheduled': match.group('scheduled') or 'upcoming'}
+    # See ``listActivities()`` in ``activities/backend.js``.
+    query['pagination'] = 'cursor'
+    return [build_api_url('activities/activities/', query)]
+
+
+# The functions which return the API URLs to prefetch for a route (the path after the app name), by
+# app name. Apps without a function only get the current user.
+BOOTSTRAP_URLS = {
+    'activities': get_activities_bootstrap_urls,
+}
+
+
+# ---------- Payload ------------------------------------------------------------------------------
+
+
+def get_bootstrap_data(request, app_name, route):
+    """
+    Returns the initial data of a React app, to be embedded in its page so that the app can render
+    without fetching it:
+
+    - ``current_user``: the current user, as serialized by ``CurrentUserSerializer``.
+    - ``responses``: the data of the successful GET responses of the API URLs prefetched for the
+      route, by URL. They are dispatched in-process, and subject to their own permissions.
+    """
+    current_user = CurrentUserSerializer(request.user, context={'request': request}).data
+    responses = {}
+    get_urls = BOOTSTRAP_URLS.get(app_name)
+    if get_urls is not None:
+        mount_prefix = get_restified_mount_prefix()
+        for url in get_urls(route):
+            status_code, data = dispatch_get(request, url, RESTIFIED_URLCONF, mount_prefix)
+            if status_code == HTTP_200_OK:
+                responses[url] = data
+            else:
+                # The app fetches it again, and handles the error.
+                logger.debug('Skip bootstrapping %s: status %s', url, status_code)
+    return {'current_user': current_user, 'responses': responses}
@@ -1,3 +1,4 @@
+import bootstrap from '../common/bootstrap';
 import rest from '../common/rest';
 
 const URL_PREFIX = '/restified/v3/accounts/';
@@ -33,7 +34,26 @@ export default {
    * Retrieves the current authenticated user from server.
    */
   retrieveMyProfile() {
+    const currentUser = bootstrap.takeCurrentUser();
+    if (currentUser !== undefined) {
+      // Embedded in the page by the server. Like the API, resolves to null if not authenticated.
+      return Promise.resolve(currentUser.is_authenticated ? currentUser.profile : null);
+    }
     const url = `${URL_PREFIX}profiles/my/`;
     return rest.get(url);
   },
+
+  /**
+   * Opens a stream of notification events of the current authenticated user. The handlers are
+   * called with the parsed data of `notification` and `unread_count` events. The browser
+   * reconnects automatically, and resumes from the last received notification.
+   * Returns the `EventSource`, which should be closed when no longer needed.
+   */
+  openNotificationStream(onNotification, onUnreadCount) {
+    const url = `${URL_PREFIX}notifications/stream/`;
+    const eventSource = new EventSource(url, { withCredentials: true });
+    eventSource.addEventListener('notification', event => onNotification(JSON.parse(event.data)));
+    eventSource.addEventListener('unread_count', event => onUnreadCount(JSON.parse(event.data)));
+    return eventSource;
+  },
 };
@@ -62,11 +62,7 @@ export default class ActivityDetail extends React.Component {
   }
 
   _loadData() {
-    const promises = [
-      activitiesBackend.retrieveActivity(this.activityPk),
-      activitiesBackend.retrieveMySubscriber(this.activityPk),
-    ];
-    Promise.all(promises)
+    activitiesBackend.retrieveActivityAndMySubscriber(this.activityPk)
       .then(([activity, mySubscriber]) => {
         this.setState({
           status: 'loaded',
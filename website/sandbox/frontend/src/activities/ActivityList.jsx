@@ -15,8 +15,8 @@ export default class ActivityList extends React.Component {
     this.onLoadPage = this.onLoadPage.bind(this);
   }
 
-  onLoadPage(pageNumber) {
-    return activitiesBackend.listActivities({ scheduled: this.scheduled, page: pageNumber });
+  onLoadPage(cursor) {
+    return activitiesBackend.listActivities({ scheduled: this.scheduled, pagination: 'cursor', cursor });
   }
 
   get scheduled() {
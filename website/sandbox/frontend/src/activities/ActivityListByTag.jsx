@@ -12,11 +12,35 @@ import ActivityPagination from './ActivityPagination';
 export default class ActivityListByTag extends React.Component {
   constructor(props) {
     super(props);
+    this.state = {
+      facet: null,
+    };
     this.onLoadPage = this.onLoadPage.bind(this);
   }
 
-  onLoadPage(pageNumber) {
-    return activitiesBackend.listActivities({ tag: this.tag, page: pageNumber });
+  componentDidMount() {
+    this._loadFacet();
+  }
+
+  componentDidUpdate(prevProps) {
+    if (prevProps.match.params.tag !== this.tag) {
+      this._loadFacet();
+    }
+  }
+
+  _loadFacet() {
+    const { tag } = this;
+    activitiesBackend.listActivityTagFacets({ tag })
+      .then((facets) => {
+        if (tag === this.tag) {
+          this.setState({ facet: facets.length > 0 ? facets[0] : null });
+        }
+      })
+      .catch(() => this.setState({ facet: null }));
+  }
+
+  onLoadPage(cursor) {
+    return activitiesBackend.listActivities({ tag: this.tag, pagination: 'cursor', cursor });
   }
 
   get tag() {
@@ -38,10 +62,16 @@ export default class ActivityListByTag extends React.Component {
   }
 
   render() {
+    const { facet } = this.state;
     return (
       <div>
         {this.renderBreadcrumb()}
         <h1 className="section">Search by tag: {this.tag || 'N/A'}</h1>
+        {facet && (
+          <p className="text-muted">
+            {facet.num_upcoming} upcoming / {facet.num_published} published activities
+          </p>
+        )}
         <ActivityPagination key={this.tag} onLoadPage={this.onLoadPage} />
       </div>
     );
@@ -12,7 +12,7 @@ import { activityDetailPath, activityListByTagPath } from './paths';
 
 export default function ActivityPagination({ onLoadPage }) {
   return (
-    <Pagination onLoadPage={onLoadPage}>
+    <Pagination initialPageNumber={null} onLoadPage={onLoadPage}>
       {(results) => {
         const $activities = results.map(activity => (
           <section key={activity.pk} className="underlined">
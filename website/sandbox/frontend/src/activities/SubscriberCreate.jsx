@@ -66,11 +66,7 @@ export default class SubscriberCreate extends React.Component {
 
   _loadData() {
     const { formKey } = this.state;
-    const promises = [
-      activitiesBackend.retrieveActivity(this.activityPk),
-      activitiesBackend.retrieveMySubscriber(this.activityPk),
-    ];
-    Promise.all(promises)
+    activitiesBackend.retrieveActivityAndMySubscriber(this.activityPk)
       .then(([activity, mySubscriber]) => {
         if (mySubscriber !== null) {
           const path = subscriberDetailPath(mySubscriber);
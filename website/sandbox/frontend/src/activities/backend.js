@@ -29,12 +29,29 @@ export default {
     return rest.get(url, query);
   },
 
+  listActivityTagFacets(query) {
+    const url = `${URL_PREFIX}activities/facets/`;
+    return rest.get(url, query);
+  },
+
   updateActivityTags(activity, action, tag) {
     const url = `${URL_PREFIX}activities/${activity.pk}/tags/`;
     const payload = { action, tag };
     return rest.post(url, payload);
   },
 
+  updateActivityTagsInBatch(activity, addTags, removeTags) {
+    const url = `${URL_PREFIX}activities/${activity.pk}/tags/`;
+    const payload = { add_tags: addTags, remove_tags: removeTags };
+    return rest.post(url, payload);
+  },
+
+  replaceActivityTags(activity, tags) {
+    const url = `${URL_PREFIX}activities/${activity.pk}/tags/`;
+    const payload = { replace_tags: tags };
+    return rest.post(url, payload);
+  },
+
   createSubscriber(activity, subscriber) {
     const url = `${URL_PREFIX}activities/${activity.pk}/subscribers/`;
     return rest.post(url, subscriber);
@@ -64,4 +81,13 @@ export default {
     const url = `${URL_PREFIX}activities/${activityPk}/subscribers/current-user/`;
     return rest.get(url);
   },
+
+  // Resolves to an array of `[activity, mySubscriber]`, fetched in a single batch request.
+  retrieveActivityAndMySubscriber(activityPk) {
+    const urls = [
+      `${URL_PREFIX}activities/${activityPk}/`,
+      `${URL_PREFIX}activities/${activityPk}/subscribers/current-user/`,
+    ];
+    return rest.batch(urls);
+  },
 };
@@ -0,0 +1,43 @@
+// The initial data embedded in the page by the server (see `sandbox/frontend/bootstrap.py`). It
+// describes the state at page load, so each entry is consumed once, and all of them are discarded
+// as soon as the app writes anything.
+const element = document.getElementById('bootstrap-data');
+let bootstrapData = element ? JSON.parse(element.textContent) : null;
+
+
+// Sorts the parameters of the query string, as the server does for the URLs it prefetched.
+function normalizeUrl(url) {
+  const [path, query] = url.split('?');
+  return query ? `${path}?${query.split('&').sort().join('&')}` : path;
+}
+
+
+export default {
+
+  // Returns the current user (with `is_authenticated` and `profile`), or undefined if not
+  // embedded or already consumed.
+  takeCurrentUser() {
+    if (!bootstrapData || bootstrapData.current_user === undefined) {
+      return undefined;
+    }
+    const currentUser = bootstrapData.current_user;
+    delete bootstrapData.current_user;
+    return currentUser;
+  },
+
+  // Returns the data of the GET response of the URL, or undefined if not embedded or already
+  // consumed.
+  takeResponse(url) {
+    if (!bootstrapData) {
+      return undefined;
+    }
+    const key = normalizeUrl(url);
+    const data = bootstrapData.responses[key];
+    delete bootstrapData.responses[key];
+    return data;
+  },
+
+  discard() {
+    bootstrapData = null;
+  },
+};
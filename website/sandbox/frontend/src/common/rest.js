@@ -1,5 +1,7 @@
 import Cookies from 'js-cookie';
 
+import bootstrap from './bootstrap';
+
 
 function toQueryString(obj) {
   const parts = Object.keys(obj).reduce((accumulator, key) => {
@@ -44,6 +46,43 @@ function makePostFormOptions(formData) {
 }
 
 
+// Validators and data of the latest GET responses, by URL. The validators are sent back as
+// conditional request headers, so that the server can answer `304 Not Modified`.
+const MAX_CONDITIONAL_ENTRIES = 100;
+const conditionalEntries = new Map();
+
+
+function addConditionalHeaders(options, entry) {
+  if (entry) {
+    if (entry.etag) {
+      options.headers['If-None-Match'] = entry.etag;
+    }
+    if (entry.lastModified) {
+      options.headers['If-Modified-Since'] = entry.lastModified;
+    }
+  }
+  return options;
+}
+
+
+function rememberConditionalEntry(url, response, data) {
+  conditionalEntries.delete(url);
+  const etag = response.headers.get('ETag');
+  const lastModified = response.headers.get('Last-Modified');
+  if (etag || lastModified) {
+    conditionalEntries.set(url, { etag, lastModified, data });
+    if (conditionalEntries.size > MAX_CONDITIONAL_ENTRIES) {
+      // Maps iterate in insertion order, so the first key is the oldest entry.
+      conditionalEntries.delete(conditionalEntries.keys().next().value);
+    }
+  }
+  return data;
+}
+
+
+const BATCH_URL = '/restified/v3/_meta/batch/';
+
+
 function createServerError(response, data) {
   const error = new Error(`${response.url} - ${response.status}`);
   error.url = response.url;
@@ -81,37 +120,71 @@ export default {
 
   get(url, query) {
     const completeUrl = (query ? `${url}?${toQueryString(query)}` : url);
+    const bootstrapped = bootstrap.takeResponse(completeUrl);
+    if (bootstrapped !== undefined) {
+      // Embedded in the page by the server: no request needed.
+      return Promise.resolve(bootstrapped);
+    }
     console.log(`GET ${completeUrl}`);
-    return fetch(completeUrl, makeJSONOptions('GET'))
-      .then(response => handleJSONResponse(response));
+    const entry = conditionalEntries.get(completeUrl);
+    return fetch(completeUrl, addConditionalHeaders(makeJSONOptions('GET'), entry))
+      .then((response) => {
+        if (response.status === 304 && entry) {
+          // 304 - Not modified: reuse the data of the previous response.
+          return entry.data;
+        }
+        return Promise.resolve(handleJSONResponse(response))
+          .then(data => rememberConditionalEntry(completeUrl, response, data));
+      });
   },
 
   post(url, payload) {
     console.log(`POST ${url}`);
+    bootstrap.discard();
     return fetch(url, makeJSONOptions('POST', payload))
       .then(response => handleJSONResponse(response));
   },
 
   postForm(url, formData) {
     console.log(`POST (form) ${url}`);
+    bootstrap.discard();
     return fetch(url, makePostFormOptions(formData))
       .then(response => handleJSONResponse(response));
   },
 
   put(url, payload) {
     console.log(`PUT ${url}`);
+    bootstrap.discard();
     return fetch(url, makeJSONOptions('PUT', payload))
       .then(response => handleJSONResponse(response));
   },
 
   patch(url, payload) {
     console.log(`PATCH ${url}`);
+    bootstrap.discard();
     return fetch(url, makeJSONOptions('PATCH', payload))
       .then(response => handleJSONResponse(response));
   },
 
+  // Fetches several GET URLs (with optional query strings) in a single request. Resolves to an
+  // array of data in the same order as the URLs. If any sub-request failed, rejects with the error
+  // of the first failed one. A sub-request without content resolves to null.
+  batch(urls) {
+    console.log(`BATCH ${urls.join(', ')}`);
+    return fetch(BATCH_URL, makeJSONOptions('POST', { requests: urls }))
+      .then(response => handleJSONResponse(response))
+      .then((data) => {
+        const failed = data.responses.find(item => item.status >= 400);
+        if (failed) {
+          throw createServerError({ url: failed.url, status: failed.status }, failed.data);
+        }
+        return data.responses.map(item => item.data);
+      });
+  },
+
   delete(url, payload) {
     console.log(`DELETE ${url}`);
+    bootstrap.discard();
     return fetch(url, makeJSONOptions('DELETE', payload))
       .then(response => handleJSONResponse(response));
   },
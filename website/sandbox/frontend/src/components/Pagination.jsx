@@ -5,8 +5,8 @@ import queryString from 'query-string';
 
 
 /**
- * Parses and extracts the `page` query param from the URL string. We cannot use `URL` class
- * because it is not supported by IE.
+ * Parses and extracts the `cursor` or `page` query param from the URL string. We cannot use `URL`
+ * class because it is not supported by IE.
  */
 function parsePageQueryParam(urlString) {
   if (!urlString) {
@@ -18,13 +18,16 @@ function parsePageQueryParam(urlString) {
   }
   const search = match[1];
   const query = queryString.parse(search);
-  return query.page || null;
+  return query.cursor || query.page || null;
 }
 
 
 /**
  * A fully uncontrolled component to load and render paginated results.
  *
+ * Pages are identified by page numbers, or by opaque cursors if the server paginates by cursor
+ * (`?pagination=cursor`). In the latter case, `initialPageNumber` should be null.
+ *
  * The component uses the `status` state to control how the pager will be rendered:
  *
  * - null: The initial page has not yet been loaded.
@@ -134,7 +137,7 @@ export default class Pagination extends React.Component {
 
 
 Pagination.propTypes = {
-  initialPageNumber: PropTypes.number,
+  initialPageNumber: PropTypes.oneOfType([PropTypes.number, PropTypes.string]),
   onLoadPage: PropTypes.func.isRequired,
   children: PropTypes.func.isRequired,
 };
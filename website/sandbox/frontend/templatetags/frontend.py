@@ -1,20 +1,80 @@
 # -*- coding: utf-8 -*-
 
+import json
+import logging
+import os
+import threading
+
 from django import template
 from django.conf import settings
+from django.contrib.staticfiles import finders
 from django.templatetags.static import static
 
 
+logger = logging.getLogger(__name__)
+
 register = template.Library()
 
 
+DIST_DIRECTORY = 'frontend/dist'
+
+MANIFEST_PATH = '{}/manifest.json'.format(DIST_DIRECTORY)
+
+
+class BundleManifest(object):
+    """
+    The manifest of the webpack build, which maps chunk names (e.g. ``accounts.js``) to
+    content-hashed file names (e.g. ``accounts.3f2a9c1b.bundle.js``). See ``webpack.common.js``.
+
+    The manifest is loaded once per process. In ``DEBUG`` mode, it is reloaded when the file
+    changes, e.g. by ``npm run build:watch``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if self._entries is None or settings.DEBUG:
+                self._load()
+            return self._entries.get(key)
+
+    def _load(self):
+        # NOTE: The manifest is found by the staticfiles finders, so that it is read from the source
+        # directories (where webpack writes it), with or without ``collectstatic``.
+        full_path = finders.find(self.path)
+        if full_path is None:
+            if self._entries is None:
+                logger.warning('Frontend manifest %s not found, is the frontend built?', self.path)
+            self._entries = {}
+            return
+        mtime = os.path.getmtime(full_path)
+        if mtime == self._mtime:
+            return
+        with open(full_path, encoding='utf-8') as manifest_file:
+            self._entries = json.load(manifest_file)
+        self._mtime = mtime
+
+
+bundle_manifest = BundleManifest(MANIFEST_PATH)
+
+
+def _get_bundle_url(key, unhashed_name):
+    file_name = bundle_manifest.get(key)
+    if file_name is None:
+        # Builds without manifest (or without this chunk) have unhashed file names.
+        file_name = unhashed_name
+    return static('{}/{}'.format(DIST_DIRECTORY, file_name))
+
+
 @register.simple_tag
 def frontend_js(name):
-    path = 'frontend/dist/{}.bundle.js'.format(name)
-    return static(path)
+    return _get_bundle_url('{}.js'.format(name), '{}.bundle.js'.format(name))
 
 
 @register.simple_tag
 def frontend_css(name):
-    path = 'frontend/dist/{}.css'.format(name)
-    return static(path)
+    return _get_bundle_url('{}.css'.format(name), '{}.css'.format(name))
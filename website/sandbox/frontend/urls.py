@@ -8,5 +8,5 @@ from .views import ReactAppView
 
 urlpatterns = [
     path('styles/', TemplateView.as_view(template_name='frontend/styles/index.html')),
-    re_path(r'^(?P<app_name>[\w\-]+)/.*$', ReactAppView.as_view()),
+    re_path(r'^(?P<app_name>[\w\-]+)/(?P<route>.*)$', ReactAppView.as_view()),
 ]
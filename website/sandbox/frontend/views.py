@@ -1,9 +1,21 @@
 # -*- coding: utf-8 -*-
 
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.views.generic import TemplateView
 
+from .bootstrap import get_bootstrap_data
+
 
 class ReactAppView(TemplateView):
+    """
+    Renders the page of a React app. Unless ``V5_FRONTEND_BOOTSTRAP`` is ``False``, the page embeds
+    the initial data of the app (see ``get_bootstrap_data()``), which saves its first round trips.
+
+    The page of an anonymous user is the same for all anonymous users, so it is cacheable by shared
+    caches for ``V5_FRONTEND_PUBLIC_MAX_AGE`` seconds. The page of an authenticated user is private.
+    """
+
     def get_template_names(self):
         app_name = self.kwargs['app_name']
         return [
@@ -14,4 +26,20 @@ class ReactAppView(TemplateView):
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
         context_data['app_name'] = kwargs['app_name']
+        if getattr(settings, 'V5_FRONTEND_BOOTSTRAP', True):
+            context_data['bootstrap_data'] = get_bootstrap_data(
+                self.request, kwargs['app_name'], kwargs.get('route', '')
+            )
         return context_data
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=getattr(settings, 'V5_FRONTEND_PUBLIC_MAX_AGE', 60)
+            )
+        # NOTE: Whether the user is authenticated depends on the session cookie.
+        patch_vary_headers(response, ['Cookie'])
+        return response
@@ -4,6 +4,7 @@ const path = require('path');
 const webpack = require('webpack');
 
 const CleanWebpackPlugin = require('clean-webpack-plugin');
+const ManifestPlugin = require('webpack-manifest-plugin');
 const MiniCssExtractPlugin = require('mini-css-extract-plugin');
 
 // Resolve directories relative to `__dirname`.
@@ -28,16 +29,25 @@ module.exports = {
       $: 'jquery',
       jQuery: 'jquery',
     }),
+    // Identify modules by hashes of their paths rather than by numbers, so that the content hash
+    // of a chunk (e.g. `vendors`) does not change when unrelated modules are added.
+    new webpack.HashedModuleIdsPlugin(),
     new MiniCssExtractPlugin({
-      filename: '[name].css',
-      chunkFilename: '[name].css', // Use the chunk name instead of its id (`[id].css`).
+      filename: '[name].[contenthash:8].css',
+      chunkFilename: '[name].[contenthash:8].css', // Use the chunk name instead of its id (`[id].css`).
     }),
     new CleanWebpackPlugin([outputDirectory]),
+    // Map the chunk names (e.g. `accounts.js`) to the content-hashed file names. The manifest is
+    // read by the `frontend` template tags.
+    new ManifestPlugin({
+      fileName: 'manifest.json',
+    }),
   ],
 
+  // File names are content-hashed, so that they can be cached forever.
   output: {
     path: outputDirectory,
-    filename: '[name].bundle.js',
+    filename: '[name].[contenthash:8].bundle.js',
   },
 
   // See: https://webpack.js.org/plugins/split-chunks-plugin/
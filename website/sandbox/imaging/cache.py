@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import tempfile
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache(object):
+    """
+    A cache of files in a directory, addressed by keys (e.g. digests of their contents). The total
+    size of the files is bounded by ``max_size`` bytes: when it is exceeded, the least recently used
+    files are evicted, down to ``low_watermark`` of ``max_size``.
+
+    The recency of a file is its modification time, which is refreshed on hits (at most once every
+    ``touch_interval`` seconds, to save writes). Files are written atomically, so the cache can be
+    shared by several worker processes: each process tracks an estimate of the total size, and
+    rescans the directory before evicting.
+    """
+
+    def __init__(self, directory, max_size, low_watermark=0.9, touch_interval=60 * 60):
+        self.directory = directory
+        self.max_size = max_size
+        self.low_watermark = low_watermark
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def get_path(self, key):
+        # Files are spread over 256 sub-directories, by the first 2 characters of their keys.
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Returns the path of the file of the key, or ``None`` if it is not cached.
+        """
+        path = self.get_path(key)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if time.time() - mtime > self.touch_interval:
+            try:
+                os.utime(path)
+            except OSError:
+                # The file has been evicted by another process in the meantime.
+                return None
+        return path
+
+    def put(self, key, data):
+        """
+        Stores the data (bytes) as the file of the key, and returns its path.
+        """
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[0]
+            else:
+                self._size += len(data)
+            if self._size > self.max_size:
+                self._evict(keep_path=path)
+        return path
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': self._size}
+
+    def _scan(self):
+        total_size = 0
+        entries = []
+        for dirpath, __, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.startswith('.tmp-'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                total_size += stat.st_size
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return total_size, entries
+
+    def _evict(self, keep_path):
+        total_size, entries = self._scan()
+        target_size = self.max_size * self.low_watermark
+        num_evicted = 0
+        for __, size, path in sorted(entries):
+            if total_size <= target_size:
+                break
+            if path == keep_path:
+                # The file which has just been written is about to be read.
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            num_evicted += 1
+        self._size = total_size
+        logger.info('Evicted %d files from %s (%d bytes left).', num_evicted, self.directory, total_size)
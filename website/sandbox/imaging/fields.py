@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from rest_framework import serializers
+
+from .variants import declare_spec, get_source_version, get_variant_url
+
+
+logger = logging.getLogger(__name__)
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    A read-only field which represents an image file by the URLs of its variants (see
+    ``image_variant()``), as a dict mapping names to variant specs, e.g.::
+
+        thumbnail_variants = ImageVariantsField(source='thumbnail', variants={
+            'small': '160x90c',
+            'medium': '480x270c',
+        })
+
+    The value is ``None`` if there is no image. Like DRF's ``ImageField``, URLs are absolute if the
+    request is in the serializer context. URLs are versioned by the image file (see
+    ``get_variant_url()``). The specs of the field are allowed by ``image_variant()``.
+    """
+
+    def __init__(self, variants, **kwargs):
+        for spec in variants.values():
+            declare_spec(spec)
+        self.variants = variants
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request', None)
+        version = get_source_version(value.name)
+        urls = {}
+        for name, spec in self.variants.items():
+            url = get_variant_url(value.name, spec, version)
+            urls[name] = request.build_absolute_uri(url) if request is not None else url
+        return urls
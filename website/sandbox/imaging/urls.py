@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+from django.urls import path
+
+from . import views
+
+
+urlpatterns = [
+    path('<str:spec>/<path:path>', views.image_variant, name='imaging-variant'),
+]
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import hashlib
+import io
+import logging
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.http import urlencode
+from PIL import Image, ImageOps
+
+from sandbox.drfutils.caches import MISSING, LRUCache
+
+from .cache import DiskCache
+
+
+logger = logging.getLogger(__name__)
+
+
+# Bump this version to invalidate all cached variants, e.g. when the rendering changes.
+RENDERING_VERSION = 1
+
+SPEC_REGEX = re.compile(r'^(?P<width>[1-9][0-9]*)x(?P<height>[1-9][0-9]*)(?P<crop>c?)$')
+
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+JPEG_QUALITY = 85
+
+# The query parameter of the source version in variant URLs (see ``get_variant_url()``).
+VERSION_QUERY_PARAM = 'v'
+
+
+class InvalidVariant(Exception):
+    pass
+
+
+VariantSpec = collections.namedtuple('VariantSpec', ['width', 'height', 'crop'])
+
+# The specs used by ``ImageVariantsField``s, which are allowed along with
+# ``V5_IMAGING_ALLOWED_SPECS``.
+_declared_specs = set()
+
+
+def declare_spec(spec):
+    """
+    Allows a variant spec, after checking that it is valid (see ``parse_spec()``).
+    """
+    _parse_spec(spec)
+    _declared_specs.add(spec)
+
+
+def is_spec_allowed(spec):
+    return spec in _declared_specs or spec in getattr(settings, 'V5_IMAGING_ALLOWED_SPECS', ())
+
+
+def parse_spec(spec):
+    """
+    Parses a variant spec such as ``320x180`` (fit within 320x180 pixels) or ``320x180c`` (fill
+    320x180 pixels, cropping the image). Raises ``InvalidVariant`` if the spec is malformed, too
+    large, or not allowed: only the specs of ``ImageVariantsField``s (see ``declare_spec()``) and
+    of ``V5_IMAGING_ALLOWED_SPECS`` are, so that clients cannot render arbitrary sizes.
+    """
+    variant_spec = _parse_spec(spec)
+    if not is_spec_allowed(spec):
+        raise InvalidVariant('Spec not allowed: {}'.format(spec))
+    return variant_spec
+
+
+def _parse_spec(spec):
+    match = SPEC_REGEX.match(spec)
+    if match is None:
+        raise InvalidVariant('Invalid spec: {}'.format(spec))
+    width, height = int(match.group('width')), int(match.group('height'))
+    max_dimension = getattr(settings, 'V5_IMAGING_MAX_DIMENSION', 2048)
+    if width > max_dimension or height > max_dimension:
+        raise InvalidVariant('Spec too large: {}'.format(spec))
+    return VariantSpec(width, height, bool(match.group('crop')))
+
+
+def get_variant_url(name, spec, version=None):
+    """
+    Returns the URL of a variant of a media file, given its name (relative to ``MEDIA_ROOT``), and
+    the version of the file (see ``get_source_version()``) if known. Versioned URLs change with the
+    file, so their responses can be cached as immutable.
+    """
+    url = reverse('imaging-variant', kwargs={'spec': spec, 'path': name})
+    if version is not None:
+        url = '{}?{}'.format(url, urlencode({VERSION_QUERY_PARAM: version}))
+    return url
+
+
+def get_source_version(name):
+    """
+    Returns the version of a media file, given its name (relative to ``MEDIA_ROOT``), from its
+    modification time and size, or ``None`` if it does not exist.
+    """
+    try:
+        stat = os.stat(safe_join(settings.MEDIA_ROOT, name))
+    except (SuspiciousFileOperation, OSError):
+        return None
+    return '{:x}-{:x}'.format(stat.st_mtime_ns, stat.st_size)
+
+
+def get_output_format(name):
+    # Images which may have transparency are rendered as PNG, and others as JPEG.
+    return 'PNG' if os.path.splitext(name)[1].lower() in ('.png', '.gif', '.webp') else 'JPEG'
+
+
+# ---------- Rendering ----------------------------------------------------------------------------
+
+
+# Digests of source files, by path and stat signature, so that sources are read once.
+_source_digests = LRUCache(maxsize=4096)
+
+_variant_cache = None
+
+
+def get_variant_cache():
+    global _variant_cache
+    if _variant_cache is None:
+        _variant_cache = DiskCache(
+            getattr(settings, 'V5_IMAGING_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, '.imaging-cache')),
+            max_size=getattr(settings, 'V5_IMAGING_CACHE_MAX_SIZE', 512 * 1024 * 1024),
+        )
+    return _variant_cache
+
+
+def get_source_digest(path):
+    """
+    Returns the SHA-256 digest of the content of a source file. Raises ``OSError`` if it does not
+    exist.
+    """
+    stat = os.stat(path)
+    signature = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _source_digests.get(signature)
+    if digest is MISSING:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as source_file:
+            for chunk in iter(lambda: source_file.read(64 * 1024), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        _source_digests.set(signature, digest)
+    return digest
+
+
+def get_variant_key(source_digest, spec, output_format):
+    """
+    Returns the key of a variant in the cache, which is addressed by the content of its source and
+    its rendering (so identical sources share their variants). It is also the ETag of the variant.
+    """
+    data = '{}:{}:{}:{}'.format(source_digest, spec, output_format, RENDERING_VERSION)
+    extension = '.png' if output_format == 'PNG' else '.jpg'
+    return hashlib.sha256(data.encode('ascii')).hexdigest() + extension
+
+
+def open_variant(path, spec, output_format, key):
+    """
+    Opens the cached variant of a source file, rendering it on the first request.
+    """
+    cache = get_variant_cache()
+    variant_path = cache.get(key)
+    if variant_path is not None:
+        try:
+            return open(variant_path, 'rb')
+        except FileNotFoundError:
+            # The variant has been evicted by another process in the meantime.
+            pass
+    return open(cache.put(key, render_variant(path, parse_spec(spec), output_format)), 'rb')
+
+
+def render_variant(path, variant_spec, output_format):
+    """
+    Renders a variant of an image file, and returns its data. Raises ``InvalidVariant`` if the file
+    is not a valid image.
+    """
+    size = (variant_spec.width, variant_spec.height)
+    try:
+        with Image.open(path) as image:
+            # Decode JPEG images at a reduced scale, which is much faster for large photos.
+            image.draft('RGB', size)
+            image = ImageOps.exif_transpose(image)
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise InvalidVariant('Invalid image {}: {}'.format(path, exc))
+    if output_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif output_format == 'PNG' and image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA')
+    if variant_spec.crop:
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        image.thumbnail(size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    if output_format == 'JPEG':
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
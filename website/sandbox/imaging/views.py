@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+from .variants import (
+    SOURCE_EXTENSIONS, VERSION_QUERY_PARAM, InvalidVariant, get_output_format, get_source_digest,
+    get_source_version, get_variant_key, open_variant, parse_spec,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@require_safe
+def image_variant(request, spec, path):
+    """
+    Serves a variant of an image of ``MEDIA_ROOT`` (see ``parse_spec()``), e.g.
+    ``/media/_r/320x180c/thumbs/foo.jpg`` for ``/media/thumbs/foo.jpg``. Variants are rendered on
+    the first request, and then served from a disk cache.
+
+    The ETag is the digest of the source and the rendering, so it is strong. If the URL has the
+    current version of the source (see ``get_variant_url()``), the response is cached as immutable,
+    since a changed source has a new URL. Otherwise, it must be revalidated.
+
+    NOTE: In production, the web server must pass the ``/media/_r/`` URLs to Django, rather than
+    serving them from ``MEDIA_ROOT``.
+    """
+    try:
+        parse_spec(spec)
+    except InvalidVariant:
+        raise Http404('Invalid image variant.')
+    if os.path.splitext(path)[1].lower() not in SOURCE_EXTENSIONS:
+        raise Http404('Not an image.')
+    try:
+        source_path = safe_join(settings.MEDIA_ROOT, path)
+        source_digest = get_source_digest(source_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Image not found.')
+
+    output_format = get_output_format(path)
+    key = get_variant_key(source_digest, spec, output_format)
+    etag = '"{}"'.format(key)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            variant_file = open_variant(source_path, spec, output_format, key)
+        except InvalidVariant as exc:
+            logger.warning('Fail to render image variant: %s', exc)
+            raise Http404('Invalid image.')
+        content_type = 'image/png' if output_format == 'PNG' else 'image/jpeg'
+        response = FileResponse(variant_file, content_type=content_type)
+    response['ETag'] = etag
+    version = request.GET.get(VERSION_QUERY_PARAM)
+    if version is not None and version == get_source_version(path):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+
+default_app_config = 'sandbox.restified.apps.RestifiedConfig'
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from sandbox.drfutils.caches import MISSING, FallbackCache, LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+
+# The sizes (in pixels) of the square variants of avatars, by name.
+AVATAR_SIZES = getattr(settings, 'V5_AVATAR_SIZES', {
+    'small': 48,
+    'medium': 160,
+    'large': 400,
+})
+
+AVATAR_JPEG_QUALITY = 85
+
+# Sent (by a worker thread) when the variants of an avatar have been saved.
+avatar_variants_ready = Signal(providing_args=['name'])
+
+
+def get_avatar_variant_name(name, size):
+    """
+    Returns the file name of a variant of an avatar, e.g. ``avatars/sizes/foo.png-160.jpg`` for the
+    avatar ``avatars/foo.png`` and the size 160. The whole file name of the avatar is kept, so that
+    ``foo.png`` and ``foo.jpg`` have distinct variants. The storage may save the variant under
+    another name (see ``process_avatar()``).
+    """
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, 'sizes', '{}-{}.jpg'.format(filename, size))
+
+
+# ---------- Processing ---------------------------------------------------------------------------
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Avatars whose processing has been scheduled by this process (successfully or not), so that a
+# missing variant does not schedule its processing again on each request.
+_scheduled_avatars = LRUCache(maxsize=4096)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = getattr(settings, 'V5_AVATAR_WORKERS', 2)
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='avatar')
+        return _executor
+
+
+def schedule_avatar_processing(avatar):
+    """
+    Schedules the processing of an avatar (a ``FieldFile``) in a worker thread, once the current
+    transaction is committed.
+    """
+    name, storage = avatar.name, avatar.storage
+    _scheduled_avatars.set(name, True)
+
+    def submit():
+        future = _get_executor().submit(process_avatar, name, storage)
+        future.add_done_callback(_log_processing_error)
+
+    transaction.on_commit(submit)
+
+
+def _log_processing_error(future):
+    exc = future.exception()
+    if exc is not None:
+        logger.error('Fail to process avatar: %s', exc, exc_info=exc)
+
+
+def process_avatar(name, storage):
+    """
+    Resizes an avatar into square JPEG variants of all ``AVATAR_SIZES``, and saves them next to the
+    avatar (see ``get_avatar_variant_name()``). The names of the saved variants are then recorded
+    for ``get_avatar_url()``.
+    """
+    largest_size = max(AVATAR_SIZES.values())
+    with storage.open(name, 'rb') as avatar_file:
+        image = Image.open(avatar_file)
+        # Decode JPEG images at a reduced scale, which is much faster for large photos.
+        image.draft('RGB', (largest_size, largest_size))
+        image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten the transparency on a white background.
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    variant_names = {}
+    for size in sorted(set(AVATAR_SIZES.values())):
+        variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        variant.save(buffer, 'JPEG', quality=AVATAR_JPEG_QUALITY, optimize=True, progressive=True)
+        variant_name = get_avatar_variant_name(name, size)
+        if storage.exists(variant_name):
+            storage.delete(variant_name)
+        # The storage saves the variant under another name if the name is taken (e.g. by a
+        # concurrent processing of the same avatar).
+        variant_names[size] = storage.save(variant_name, ContentFile(buffer.getvalue()))
+    _set_avatar_variant_names(name, variant_names)
+    # The avatar is processed again if its variant names are evicted, unless it failed.
+    _scheduled_avatars.delete(name)
+    logger.debug('Processed avatar %s into %d sizes.', name, len(AVATAR_SIZES))
+    avatar_variants_ready.send(sender=process_avatar, name=name)
+
+
+# ---------- URLs ---------------------------------------------------------------------------------
+
+
+# The names of the saved variants of avatars, by avatar name, as dicts by size, so that URLs are
+# built without storage access. They are shared by all worker processes, and kept in this process
+# for a minute: an avatar may be replaced by a new one of the same name, whose processing records
+# new names.
+avatar_variants_cache = FallbackCache('avatar-variants', timeout=30 * 24 * 60 * 60, maxsize=4096)
+
+_local_variant_names = LRUCache(maxsize=4096)
+
+LOCAL_VARIANT_NAMES_TIMEOUT = 60
+
+
+def _set_avatar_variant_names(name, variant_names):
+    avatar_variants_cache.set(name, variant_names)
+    _local_variant_names.set(name, variant_names, timeout=LOCAL_VARIANT_NAMES_TIMEOUT)
+
+
+def _get_avatar_variant_names(name):
+    variant_names = _local_variant_names.get(name)
+    if variant_names is MISSING:
+        variant_names = avatar_variants_cache.get(name)
+        if variant_names is not MISSING:
+            _local_variant_names.set(name, variant_names, timeout=LOCAL_VARIANT_NAMES_TIMEOUT)
+    return variant_names
+
+
+def get_avatar_url(profile, size_name=None):
+    """
+    Returns the URL of the avatar of a profile in the size ``size_name`` (a key of
+    ``AVATAR_SIZES``), or in its original size if ``size_name`` is ``None``.
+
+    If the variants have not been processed yet (or their names are no longer cached), returns the
+    URL of the original avatar, and schedules their processing (e.g. for avatars uploaded before
+    variants existed).
+    """
+    if profile is None:
+        return None
+    avatar = profile.avatar
+    if size_name is None or not avatar:
+        return profile.avatar_url
+    variant_names = _get_avatar_variant_names(avatar.name)
+    if variant_names is MISSING or AVATAR_SIZES[size_name] not in variant_names:
+        if _scheduled_avatars.get(avatar.name) is MISSING:
+            schedule_avatar_processing(avatar)
+        return profile.avatar_url
+    return avatar.storage.url(variant_names[AVATAR_SIZES[size_name]])
+
+
+def get_user_profile(user):
+    try:
+        return user.profile
+    except ObjectDoesNotExist:
+        return None
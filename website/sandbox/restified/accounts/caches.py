@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from sandbox.drfutils.caches import GenerationCache
+
+from v5.accounts.models import Profile, UserBadge
+
+from .avatars import avatar_variants_ready
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Profiles -----------------------------------------------------------------------------
+
+
+# Profiles have no modification timestamp, so their representations are validated by a generation
+# number, bumped on each change (see ``ProfileViewSet``). It is kept long enough to outlive the
+# ETags of clients.
+profile_generation_cache = GenerationCache('profile-generation', timeout=30 * 24 * 60 * 60)
+
+# Fields of users included in profile representations (see ``ProfileSerializer``).
+_USER_PROFILE_FIELDS = {'username', 'is_active'}
+
+
+# NOTE: The receivers in this module are connected when it is first imported (i.e. when the
+# restified URLconf is loaded). Changes made by a process which has not loaded it are picked up
+# after the cache timeout.
+
+@receiver(post_save, sender=Profile, dispatch_uid='restified_invalidate_profiles_on_profile_save')
+@receiver(post_delete, sender=Profile, dispatch_uid='restified_invalidate_profiles_on_profile_delete')
+@receiver(post_save, sender=UserBadge, dispatch_uid='restified_invalidate_profiles_on_badge_save')
+@receiver(post_delete, sender=UserBadge, dispatch_uid='restified_invalidate_profiles_on_badge_delete')
+def invalidate_profiles(sender, instance, **kwargs):
+    profile_generation_cache.invalidate_all()
+
+
+@receiver(post_save, sender=User, dispatch_uid='restified_invalidate_profiles_on_user_save')
+def invalidate_user_profiles(sender, instance, update_fields=None, **kwargs):
+    # Skip partial updates which do not affect profiles, e.g. ``last_login`` on each login.
+    if update_fields is not None and not _USER_PROFILE_FIELDS.intersection(update_fields):
+        return
+    profile_generation_cache.invalidate_all()
+
+
+@receiver(avatar_variants_ready, dispatch_uid='restified_invalidate_profiles_on_avatar_variants')
+def invalidate_avatar_profiles(sender, name, **kwargs):
+    # Profiles may refer to the original avatar, until its sizes are ready.
+    profile_generation_cache.invalidate_all()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from sandbox.drfutils.eventstream import format_event
+
+from v5.accounts.models import Profile, Notification
+
+from .serializers import NotificationSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_notification_pubsub():
+    """
+    Returns the hub to which the events of notifications are published, on a channel per
+    receiver. Its class is the ``V5_NOTIFICATION_PUBSUB`` setting (a dotted path), by default
+    ``CachePubSub``, which reaches the streams of all worker processes.
+    """
+    return _get_pubsub(getattr(settings, 'V5_NOTIFICATION_PUBSUB', 'sandbox.drfutils.pubsub.CachePubSub'))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_pubsub(class_path):
+    return import_string(class_path)()
+
+
+def get_notification_channel(user_pk):
+    return 'notifications:{}'.format(user_pk)
+
+
+def format_unread_count_event(user_pk):
+    profile = Profile.objects.filter(user_id=user_pk).first()
+    num_unread_notifications = profile.num_unread_notifications if profile is not None else 0
+    return format_event('unread_count', {'num_unread_notifications': num_unread_notifications})
+
+
+def format_notification_event(notification):
+    return format_event('notification', NotificationSerializer(notification).data, event_id=notification.pk)
+
+
+# NOTE: Events are built once per change (not per subscriber), only if the receiver is subscribed,
+# and after the transaction is committed (so that the unread count is up to date).
+
+@receiver(post_save, sender=Notification, dispatch_uid='restified_publish_notification_on_save')
+def publish_notification(sender, instance, created, **kwargs):
+    notification_pubsub = get_notification_pubsub()
+    channel = get_notification_channel(instance.receiver_id)
+    if not notification_pubsub.has_subscribers(channel):
+        return
+
+    def publish():
+        if created:
+            notification_pubsub.publish(channel, format_notification_event(instance))
+        notification_pubsub.publish(channel, format_unread_count_event(instance.receiver_id))
+
+    transaction.on_commit(publish)
+
+
+@receiver(post_delete, sender=Notification, dispatch_uid='restified_publish_unread_count_on_delete')
+def publish_unread_count(sender, instance, **kwargs):
+    notification_pubsub = get_notification_pubsub()
+    channel = get_notification_channel(instance.receiver_id)
+    if not notification_pubsub.has_subscribers(channel):
+        return
+    transaction.on_commit(
+        lambda: notification_pubsub.publish(channel, format_unread_count_event(instance.receiver_id))
+    )
@@ -5,12 +5,21 @@ import logging
 from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
 
 from rest_framework import serializers
 
+from sandbox.drfutils.authentication import revoke_token
+from sandbox.drfutils.generic import resolve_generic_relations
+from sandbox.drfutils.serializers import DynamicFieldsMixin
+from sandbox.imaging.fields import ImageVariantsField
+
 from v5.accounts.models import Profile, UserBadge, Notification
 from v5.accounts.utils import generate_jwt_token
 
+from .avatars import AVATAR_SIZES, get_avatar_url, get_user_profile, schedule_avatar_processing
+
 
 logger = logging.getLogger(__name__)
 
@@ -19,12 +28,28 @@ logger = logging.getLogger(__name__)
 
 
 class UserSerializer(serializers.ModelSerializer):
+    """
+    A nested user. The ``avatar_size`` kwarg selects the size of the avatar (a key of
+    ``AVATAR_SIZES``), so that each call site gets the size it displays. The original avatar is
+    used by default.
+    """
     display_name = serializers.CharField(source='profile.display_name', read_only=True)
-    avatar_url = serializers.CharField(source='profile.avatar_url', read_only=True)
+    avatar_url = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ['username', 'display_name', 'avatar_url']
+        select_related = ['profile']
+
+    def __init__(self, *args, avatar_size=None, **kwargs):
+        assert avatar_size is None or avatar_size in AVATAR_SIZES, (
+            'Invalid avatar size: {}'.format(avatar_size)
+        )
+        self.avatar_size = avatar_size
+        super().__init__(*args, **kwargs)
+
+    def get_avatar_url(self, obj):
+        return get_avatar_url(get_user_profile(obj), self.avatar_size)
 
 
 class UserBadgeSerializer(serializers.ModelSerializer):
@@ -35,18 +60,21 @@ class UserBadgeSerializer(serializers.ModelSerializer):
     # not know the type of the field by introspecting the model. So We need to declare the field
     # type explicitly.
     image = serializers.ImageField(read_only=True)
+    image_variants = ImageVariantsField(source='image', variants={'small': '48x48c'})
 
     class Meta:
         model = UserBadge
-        fields = ('title', 'image', 'earn_date')
+        fields = ('title', 'image', 'image_variants', 'earn_date')
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     ``Profile`` is a superset of ``User``, including extra fields about the user.
     NOTE: This serializer does not include sensitive data of the user.
     """
-    badge_list = UserBadgeSerializer(source='user.badge_set', many=True)
+    # NOTE: [DRF] ``read_only_fields`` only applies to the generated fields, so declared fields are
+    # marked read-only explicitly. Otherwise, updating a profile would require its badges.
+    badge_list = UserBadgeSerializer(source='user.badge_set', many=True, read_only=True)
 
     class Meta:
         model = Profile
@@ -56,6 +84,12 @@ class ProfileSerializer(serializers.ModelSerializer):
             'num_following', 'num_followers', 'badge_list',
         ]
         read_only_fields = fields
+        # ``Profile.username`` reads the related user, to be eager loaded by ``EagerLoadingMixin``.
+        select_related = ['user']
+        # Badges collapse to their primary keys if requested by ``?collapse=badge_list``.
+        collapsible_fields = {
+            'badge_list': 'pk',
+        }
 
 
 class ProfileWithSensitiveDataSerializer(ProfileSerializer):
@@ -101,6 +135,13 @@ class ProfileAvatarSerializer(serializers.ModelSerializer):
         model = Profile
         fields = ['avatar']
 
+    def update(self, instance, validated_data):
+        instance = super().update(instance, validated_data)
+        # The sizes of the avatar are processed off the request path.
+        if instance.avatar:
+            schedule_avatar_processing(instance.avatar)
+        return instance
+
 
 class CurrentUserSerializer(serializers.Serializer):
     """
@@ -113,15 +154,30 @@ class CurrentUserSerializer(serializers.Serializer):
 # ---------- Notification -------------------------------------------------------------------------
 
 
+class NotificationListSerializer(serializers.ListSerializer):
+    """
+    A list serializer which checks the related objects of all notifications in bulk.
+    """
+
+    def to_representation(self, data):
+        notifications = list(data.all() if isinstance(data, models.Manager) else data)
+        self.child.related_object_keys = resolve_generic_relations(notifications, 'related_object')
+        return super().to_representation(notifications)
+
+
 class NotificationSerializer(serializers.ModelSerializer):
     # NOTE: [DRF] Specify serializers for related fields and calculated fields. As a convention,
     # ``SerializerMethodField`` should only be used with simple JSON-serializable fields.
-    sender = UserSerializer()
-    receiver = UserSerializer()
+    sender = UserSerializer(avatar_size='small')
+    receiver = UserSerializer(avatar_size='small')
     title = serializers.SerializerMethodField()
     related_model = serializers.SerializerMethodField()
     related_object_pk = serializers.SerializerMethodField()
 
+    # The keys of the existing related objects (see ``resolve_generic_relations()``). They are
+    # resolved in bulk by the list serializer, or for each notification otherwise.
+    related_object_keys = None
+
     class Meta:
         model = Notification
         fields = (
@@ -129,20 +185,31 @@ class NotificationSerializer(serializers.ModelSerializer):
             'collapse_key', 'related_model', 'related_object_pk', 'is_unread', 'is_delivered',
             'is_deleted', 'create_date',
         )
+        list_serializer_class = NotificationListSerializer
+
+    def to_representation(self, instance):
+        if not isinstance(self.parent, NotificationListSerializer):
+            self.related_object_keys = resolve_generic_relations([instance], 'related_object')
+        return super().to_representation(instance)
 
     def get_title(self, obj):
         return obj.title_text
 
     def get_related_model(self, obj):
-        if obj.related_object:
-            return obj.related_content_type.model
+        # NOTE: Do not access ``obj.related_object``, which would query the database for each
+        # notification. Content types are cached by ``ContentType.objects``.
+        if self._has_related_object(obj):
+            return ContentType.objects.get_for_id(obj.related_content_type_id).model
         return None
 
     def get_related_object_pk(self, obj):
-        if obj.related_object:
+        if self._has_related_object(obj):
             return obj.related_object_pk
         return None
 
+    def _has_related_object(self, obj):
+        return (obj.related_content_type_id, obj.related_object_pk) in self.related_object_keys
+
 
 # ---------- User authentication ------------------------------------------------------------------
 
@@ -190,6 +257,10 @@ class LogoutSerializer(serializers.Serializer):
     is_success = serializers.BooleanField(read_only=True)
 
     def logout(self, request):
+        if isinstance(request.auth, dict):
+            # Authenticated by a JWT (see ``JWTAuthentication``): there is no session to end, so
+            # the token itself is revoked (or all the tokens of the user, if it has no ``jti``).
+            revoke_token(request.auth)
         logout(request)
         self.instance = {
             'is_success': True
@@ -1,19 +1,33 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import random
+import time
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import connection
+from django.http import StreamingHttpResponse
 
 from rest_framework import permissions, mixins, viewsets
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.status import HTTP_204_NO_CONTENT
 
 from v5.accounts.models import Profile, Notification
 
-from sandbox.drfutils.viewsets import NonModelViewSet
+from sandbox.drfutils.authentication import get_token_expire_time
+from sandbox.drfutils.eventstream import EventStreamRenderer, format_event, stream_events
+from sandbox.drfutils.pagination import KeysetPagination
+from sandbox.drfutils.viewsets import (
+    ConditionalGetMixin, EagerLoadingMixin, MetricsMixin, NonModelViewSet,
+)
 
+from .caches import profile_generation_cache
+from .events import get_notification_pubsub, get_notification_channel, format_unread_count_event
 from .serializers import (
     ProfileSerializer, ProfileAvatarSerializer, ProfileWithSensitiveDataSerializer,
     CurrentUserSerializer, NotificationSerializer, LoginSerializer, LogoutSerializer,
@@ -41,10 +55,23 @@ class IsSelfProfile(permissions.IsAuthenticated):
 # ---------- View sets on models ------------------------------------------------------------------
 
 
-class ProfileViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+class ProfileViewSet(
+    MetricsMixin, EagerLoadingMixin, ConditionalGetMixin,
+    mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
     serializer_class = ProfileSerializer
     lookup_field = 'user__username'
     lookup_url_kwarg = 'username'
+    # The representation embeds the user and the badges (see ``caches.py``).
+    validator_caches = [profile_generation_cache]
+
+    def initialize_request(self, request, *args, **kwargs):
+        # NOTE: Upload handlers must be set before the request body is parsed (e.g. by the CSRF
+        # check of the authentication). Avatars are streamed to a temporary file rather than kept
+        # in memory.
+        if self.action_map.get(request.method.lower()) == 'update_my_avatar':
+            request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
 
     def get_queryset(self):
         queryset = Profile.objects.filter(user__is_active=True)
@@ -75,12 +102,15 @@ class ProfileViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.
         serializer = self.get_serializer(request.user.profile)
         return Response(serializer.data)
 
-    @action(
-        detail=False, methods=['put'], url_path='my',
-        permission_classes=[IsSelfProfile],
-        serializer_class=ProfileWithSensitiveDataSerializer
-    )
+    # NOTE: [DRF] Two actions with the same ``url_path`` are routed by two identical URL patterns, so
+    # the second one is unreachable (``PUT`` would be answered ``405`` by the first one). Instead,
+    # the method is mapped on the same route, which shares the kwargs of the action: the permission
+    # is checked by the method.
+    @retrieve_my_profile.mapping.put
     def update_my_profile(self, request, **kwargs):
+        permission = IsSelfProfile()
+        if not permission.has_permission(request, self):
+            self.permission_denied(request, message=permission.message)
         serializer = self.get_serializer(request.user.profile, data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -98,16 +128,100 @@ class ProfileViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.
         return Response(serializer.data)
 
 
-class NotificationViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class NotificationPagination(KeysetPagination):
+    ordering = ('-create_date', '-pk')
+
+
+class NotificationViewSet(
+    MetricsMixin, EagerLoadingMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
     serializer_class = NotificationSerializer
+    pagination_class = NotificationPagination
+
+    # The maximum number of missed notifications sent when a stream is resumed.
+    stream_catch_up_size = 20
+    stream_heartbeat_interval = 15
+    stream_max_duration = 5 * 60
+    # The delay (in seconds, randomized up to twice as long) after which clients reconnect when the
+    # process serves ``V5_NOTIFICATION_MAX_STREAMS`` streams already.
+    stream_busy_retry_delay = 30
+
+    # Set for the actions which stream their response (see ``is_streaming_view()``).
+    streaming = False
 
     def get_queryset(self):
         if not self.request.user.is_authenticated:
             return Notification.objects.none()
-        return Notification.objects.filter(receiver=self.request.user)
+        return Notification.objects.filter(receiver=self.request.user).order_by('-create_date', '-pk')
 
-
-class AuthViewSet(NonModelViewSet):
+    @action(
+        detail=False, methods=['get'], url_path='stream',
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[EventStreamRenderer, JSONRenderer],
+        streaming=True
+    )
+    def stream(self, request):
+        """
+        A stream of Server-Sent Events: ``notification`` for each new notification (with its ID as
+        event ID), and ``unread_count`` whenever the number of unread notifications may change.
+        When an ``EventSource`` reconnects, the notifications after its ``Last-Event-ID`` are sent
+        first.
+
+        Streams end after ``stream_max_duration`` seconds, or when the JWT of the request expires,
+        and the client reconnects.
+
+        NOTE: Django 2.2 has no asynchronous views, so each open stream holds a worker thread while
+        it is idle. Thousands of streams should be served by cooperative (e.g. gevent) workers, and
+        each process serves at most ``V5_NOTIFICATION_MAX_STREAMS`` streams: further streams end at
+        once, and their clients reconnect later (``EventSource`` does not reconnect after an error
+        status).
+        """
+        # Subscribe before reading the current state, so that no change is missed in between.
+        subscription = get_notification_pubsub().subscribe(
+            get_notification_channel(request.user.pk),
+            max_subscriptions=getattr(settings, 'V5_NOTIFICATION_MAX_STREAMS', 100),
+        )
+        if subscription is None:
+            logger.warning('Too many notification streams, asking the client to reconnect later.')
+            retry_delay = self.stream_busy_retry_delay * random.uniform(1, 2)
+            return self._get_stream_response(['retry: {}\n\n'.format(int(retry_delay * 1000))])
+        max_duration = self.stream_max_duration
+        if isinstance(request.auth, dict) and 'exp' in request.auth:
+            # Do not stream beyond the expiry of the token, which is not checked again.
+            max_duration = max(min(max_duration, get_token_expire_time(request.auth) - time.time()), 0)
+        try:
+            initial_events = [format_unread_count_event(request.user.pk)]
+            last_event_id = request.META.get('HTTP_LAST_EVENT_ID', '')
+            if last_event_id.isdigit():
+                queryset = self.filter_queryset(self.get_queryset()).filter(pk__gt=int(last_event_id))
+                missed = queryset.order_by('pk')[:self.stream_catch_up_size]
+                initial_events.extend(
+                    format_event('notification', data, event_id=data['pk'])
+                    for data in self.get_serializer(missed, many=True).data
+                )
+        except Exception:
+            subscription.close()
+            raise
+        # The stream does not query the database any more, so do not hold the connection while
+        # idle. Django ignores this for in-memory SQLite databases.
+        if not connection.in_atomic_block:
+            connection.close()
+        events = stream_events(
+            subscription, initial_events,
+            heartbeat_interval=self.stream_heartbeat_interval,
+            max_duration=max_duration,
+        )
+        return self._get_stream_response(events)
+
+    def _get_stream_response(self, events):
+        response = StreamingHttpResponse(events, content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        # Disable response buffering by nginx.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class AuthViewSet(MetricsMixin, NonModelViewSet):
     """
     Endpoints related to user authentication.
     """
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from sandbox.drfutils.caches import MISSING, FallbackCache, RepresentationCache
+from sandbox.restified.accounts.avatars import avatar_variants_ready
+
+from v5.accounts.models import Profile
+from v5.activities.models import Group, GroupMember
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Group membership ---------------------------------------------------------------------
+
+
+group_membership_cache = FallbackCache('group-membership', timeout=60 * 60)
+
+
+def _make_membership_key(group_pk, user_pk):
+    return '{}:{}'.format(group_pk, user_pk)
+
+
+def is_approved_group_member(group, user):
+    """
+    Checks whether the user is an approved member of the group. The result is cached until the
+    membership is saved or deleted.
+    """
+    key = _make_membership_key(group.pk, user.pk)
+    is_approved = group_membership_cache.get(key)
+    if is_approved is MISSING:
+        is_approved = GroupMember.objects.filter(group=group, user=user, is_approved=True).exists()
+        group_membership_cache.set(key, is_approved)
+    return is_approved
+
+
+# NOTE: The receivers in this module are connected when it is first imported (i.e. when the
+# restified URLconf is loaded). Changes made by a process which has not loaded it are picked up
+# after the cache timeout.
+
+@receiver(post_save, sender=GroupMember, dispatch_uid='restified_invalidate_group_membership_on_save')
+@receiver(post_delete, sender=GroupMember, dispatch_uid='restified_invalidate_group_membership_on_delete')
+def invalidate_group_membership(sender, instance, **kwargs):
+    group_membership_cache.delete(_make_membership_key(instance.group_id, instance.user_id))
+
+
+# ---------- Representations ----------------------------------------------------------------------
+
+
+# An activity representation is versioned by ``update_date``, and includes its group and creator.
+activity_representation_cache = RepresentationCache('activity-representation', version_field='update_date')
+
+# A group has no modification timestamp, so its representations are invalidated on save.
+group_representation_cache = RepresentationCache('group-representation')
+
+# Fields of users and profiles included in nested representations (see ``UserSerializer``).
+_USER_REPRESENTATION_FIELDS = {'username'}
+_PROFILE_REPRESENTATION_FIELDS = {'display_name', 'avatar'}
+
+
+@receiver(post_save, sender=Group, dispatch_uid='restified_invalidate_group_representations_on_save')
+@receiver(post_delete, sender=Group, dispatch_uid='restified_invalidate_group_representations_on_delete')
+def invalidate_group_representations(sender, instance, **kwargs):
+    group_representation_cache.invalidate_all()
+    activity_representation_cache.invalidate_all()
+
+
+@receiver(post_save, sender=User, dispatch_uid='restified_invalidate_representations_on_user_save')
+@receiver(post_save, sender=Profile, dispatch_uid='restified_invalidate_representations_on_profile_save')
+def invalidate_creator_representations(sender, instance, update_fields=None, **kwargs):
+    # Skip partial updates which do not affect representations, e.g. ``last_login`` on each login.
+    relevant_fields = _USER_REPRESENTATION_FIELDS if sender is User else _PROFILE_REPRESENTATION_FIELDS
+    if update_fields is not None and not relevant_fields.intersection(update_fields):
+        return
+    activity_representation_cache.invalidate_all()
+
+
+@receiver(avatar_variants_ready, dispatch_uid='restified_invalidate_representations_on_avatar_variants')
+def invalidate_avatar_representations(sender, name, **kwargs):
+    # Representations may refer to the original avatar, until its sizes are ready.
+    activity_representation_cache.invalidate_all()
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import logging
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from sandbox.drfutils.caches import FallbackCache
+
+from v5.activities.models import Activity
+
+
+logger = logging.getLogger(__name__)
+
+
+_ActivityEntry = namedtuple('_ActivityEntry', ['group_pk', 'is_published', 'scheduled_date', 'tags'])
+
+
+class TagFacetIndex(object):
+    """
+    An in-process index from tag names to activities, which answers the per-tag counts of the
+    facets without joining and grouping the tagging tables on each request.
+
+    NOTE: The index only serves the counts. Filtering activities by tag (see
+    ``ActivityFilterBackend``) is still done by SQL, with the join on the tagging tables: the list
+    must be exact and is paginated by the database, whereas the counts of the index may lag behind
+    the changes of other processes (see below).
+
+    The index is built lazily with a single query, and then updated incrementally when activities
+    are saved or deleted (which includes tag changes, as updating tags touches the activity):
+
+    - The process which makes a change reloads the activity on its next read.
+    - The change is also recorded for the other processes: it increments a generation number, and
+      records the changed activity under it, in a ``FallbackCache`` shared by all worker
+      processes. A process whose index is behind reloads the changed activities only. It rebuilds
+      the index if it is too far behind (more than ``max_catch_up`` changes) or if a change is
+      missing (e.g. expired).
+
+    The index is also rebuilt after ``max_age`` seconds, to pick up changes made outside of the
+    models (e.g. raw SQL), and the changes of other processes while the shared cache is not
+    available: the generation numbers and the changes recorded in the in-process fallback are not
+    shared, so they are not used.
+    """
+
+    def __init__(self, max_age=10 * 60, max_catch_up=100):
+        self.max_age = max_age
+        self.max_catch_up = max_catch_up
+        self._generation_cache = FallbackCache('tag-facet-index', timeout=24 * 60 * 60)
+        self._lock = threading.RLock()
+        self._entries = None
+        self._activity_pks_by_tag = None
+        self._generation = None
+        self._build_time = None
+        # The activities changed by the current process since the last read.
+        self._changed_pks = set()
+
+    def get_facets(self, group_pk=None, tags=None):
+        """
+        Returns a list of dicts with the number of published activities and the number of
+        upcoming (published and scheduled from today) activities of each tag, by descending
+        number of published activities. Results can be limited to a group and to some tags.
+        """
+        today = datetime.date.today()
+        with self._lock:
+            self._ensure_fresh()
+            facets = []
+            for tag, pks in self._activity_pks_by_tag.items():
+                if tags is not None and tag not in tags:
+                    continue
+                num_published = num_upcoming = 0
+                for pk in pks:
+                    entry = self._entries[pk]
+                    if (group_pk is None or entry.group_pk == group_pk) and entry.is_published:
+                        num_published += 1
+                        if entry.scheduled_date is not None and entry.scheduled_date >= today:
+                            num_upcoming += 1
+                if num_published:
+                    facets.append({'tag': tag, 'num_published': num_published, 'num_upcoming': num_upcoming})
+        facets.sort(key=lambda facet: (-facet['num_published'], facet['tag']))
+        return facets
+
+    def refresh_activity(self, activity_pk):
+        """
+        Records a change of an activity (saved or deleted), for all processes. The index of each
+        process reloads the activity on its next read.
+        """
+        with self._lock:
+            self._changed_pks.add(activity_pk)
+        if self._generation_cache.backend is None:
+            return
+        generation = self._generation_cache.incr('generation')
+        self._generation_cache.set('change:{}'.format(generation), activity_pk)
+
+    def clear(self):
+        """
+        Drops the index of the current process, so that it is rebuilt on the next read.
+        """
+        with self._lock:
+            self._entries = None
+            self._changed_pks.clear()
+
+    def _ensure_fresh(self):
+        # The generation is ``None`` if the shared cache is not available.
+        generation = self._generation_cache.get('generation', 0) if self._generation_cache.backend else None
+        if self._entries is not None and time.monotonic() - self._build_time <= self.max_age:
+            changed_pks = self._get_changed_pks(generation)
+            if changed_pks is not None:
+                if changed_pks:
+                    self._reload(changed_pks)
+                self._changed_pks.clear()
+                if generation is not None:
+                    self._generation = generation
+                return
+        self._changed_pks.clear()
+        self._entries = {}
+        self._activity_pks_by_tag = defaultdict(set)
+        self._add_rows(Activity.objects.values_list(*self._get_row_fields()))
+        self._generation = generation
+        self._build_time = time.monotonic()
+        logger.debug('Built tag facet index of %d activities.', len(self._entries))
+
+    def _get_changed_pks(self, generation):
+        """
+        Returns the activities changed by the current process, and by the other processes since the
+        generation of the index, or ``None`` if the changes of the other processes are not all
+        recorded (e.g. expired, or not recorded yet), in which case the index must be rebuilt.
+        """
+        if generation is None or generation == self._generation:
+            return set(self._changed_pks)
+        if self._generation is None or not self._generation < generation <= self._generation + self.max_catch_up:
+            return None
+        change_keys = ['change:{}'.format(number) for number in range(self._generation + 1, generation + 1)]
+        changes = self._generation_cache.get_many(change_keys)
+        if len(changes) != len(change_keys):
+            return None
+        return self._changed_pks | set(changes.values())
+
+    def _reload(self, activity_pks):
+        for activity_pk in activity_pks:
+            self._remove_entry(activity_pk)
+        self._add_rows(Activity.objects.filter(pk__in=activity_pks).values_list(*self._get_row_fields()))
+
+    def _get_row_fields(self):
+        return 'pk', 'group_id', 'is_published', 'scheduled_date', 'tags__name'
+
+    def _add_rows(self, rows):
+        tags_by_pk = defaultdict(set)
+        for pk, group_pk, is_published, scheduled_date, tag in rows:
+            self._entries[pk] = _ActivityEntry(group_pk, is_published, scheduled_date, tags_by_pk[pk])
+            if tag is not None:
+                tags_by_pk[pk].add(tag)
+                self._activity_pks_by_tag[tag].add(pk)
+
+    def _remove_entry(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            pks = self._activity_pks_by_tag[tag]
+            pks.discard(pk)
+            if not pks:
+                del self._activity_pks_by_tag[tag]
+
+
+tag_facet_index = TagFacetIndex()
+
+
+# NOTE: Like the receivers of ``caches``, these receivers are connected when this module is first
+# imported. The index is refreshed after the transaction is committed, so that it sees the changes.
+
+@receiver(post_save, sender=Activity, dispatch_uid='restified_refresh_tag_facet_index_on_save')
+@receiver(post_delete, sender=Activity, dispatch_uid='restified_refresh_tag_facet_index_on_delete')
+def refresh_tag_facet_index(sender, instance, **kwargs):
+    activity_pk = instance.pk
+    transaction.on_commit(lambda: tag_facet_index.refresh_activity(activity_pk))
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import sqlite3
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.filters import BaseFilterBackend
+
+from v5.activities.models import Activity
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Search index -------------------------------------------------------------------------
+
+
+SEARCH_TABLE = 'restified_activity_search'
+
+# The indexed columns, and their weights in the BM25 ranking.
+SEARCH_COLUMNS = (
+    ('title', 10.0),
+    ('description', 1.0),
+    ('address', 2.0),
+    ('tags', 5.0),
+)
+
+
+def _get_fts5_available():
+    connection = sqlite3.connect(':memory:')
+    try:
+        connection.execute('CREATE VIRTUAL TABLE fts5_test USING fts5(content)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+
+# Whether the SQLite library supports FTS5. This does not vary by connection.
+_fts5_available = _get_fts5_available()
+
+
+# The aliases of the databases whose search index exists, once found. The index is not dropped
+# other than by ``rebuild_search_index()``.
+_existing_index_aliases = set()
+
+
+def is_search_index_supported(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'sqlite' and _fts5_available
+
+
+def is_search_index_available(using=DEFAULT_DB_ALIAS):
+    """
+    Whether the search index is supported by the database and has been created (see
+    ``create_search_index()``).
+    """
+    if not is_search_index_supported(using):
+        return False
+    if using not in _existing_index_aliases:
+        if not _search_index_exists(using):
+            logger.warning('The activity search index of database %s does not exist: run migrate.', using)
+            return False
+        _existing_index_aliases.add(using)
+    return True
+
+
+def create_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Creates and populates the search index (an FTS5 virtual table) if it does not exist yet. The
+    index is not a model, so this is run after migrations (see ``RestifiedConfig``) rather than by
+    them, and never by requests.
+    """
+    if is_search_index_supported(using) and not _search_index_exists(using):
+        rebuild_search_index(using)
+
+
+def _search_index_exists(using):
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+        return cursor.fetchone() is not None
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS, batch_size=500):
+    """
+    Drops and rebuilds the search index from all activities. Returns the number of indexed
+    activities.
+    """
+    column_names = ', '.join(name for name, __ in SEARCH_COLUMNS)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS {}'.format(SEARCH_TABLE))
+        cursor.execute("CREATE VIRTUAL TABLE {} USING fts5({}, tokenize = 'unicode61 remove_diacritics 2')".format(
+            SEARCH_TABLE, column_names
+        ))
+        tags_by_pk = _get_tags_by_pk(Activity.objects.using(using))
+        rows = Activity.objects.using(using).order_by('pk').values_list('pk', 'title', 'description', 'address')
+        count = 0
+        batch = []
+        for pk, title, description, address in rows:
+            batch.append([pk, title, description, address, ' '.join(tags_by_pk.get(pk, ()))])
+            if len(batch) >= batch_size:
+                count += _insert_rows(cursor, batch)
+                batch = []
+        count += _insert_rows(cursor, batch)
+    _existing_index_aliases.add(using)
+    logger.info('Rebuilt activity search index of %d activities.', count)
+    return count
+
+
+def index_activity(activity_pk, using=DEFAULT_DB_ALIAS):
+    """
+    Updates (or removes) the search index entry of an activity, unless the index does not exist.
+    """
+    if not is_search_index_available(using):
+        return
+    queryset = Activity.objects.using(using).filter(pk=activity_pk)
+    tags_by_pk = _get_tags_by_pk(queryset)
+    with connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(SEARCH_TABLE), [activity_pk])
+        _insert_rows(cursor, [
+            [pk, title, description, address, ' '.join(tags_by_pk.get(pk, ()))]
+            for pk, title, description, address in queryset.values_list('pk', 'title', 'description', 'address')
+        ])
+
+
+def _get_tags_by_pk(queryset):
+    tags_by_pk = defaultdict(list)
+    for pk, tag in queryset.filter(tags__isnull=False).values_list('pk', 'tags__name'):
+        tags_by_pk[pk].append(tag)
+    return tags_by_pk
+
+
+def _insert_rows(cursor, rows):
+    if rows:
+        column_names = ', '.join(name for name, __ in SEARCH_COLUMNS)
+        sql = 'INSERT INTO {} (rowid, {}) VALUES (%s, %s, %s, %s, %s)'.format(SEARCH_TABLE, column_names)
+        cursor.executemany(sql, rows)
+    return len(rows)
+
+
+# NOTE: Like the receivers of ``caches``, these receivers are connected when this module is first
+# imported. Tag changes are indexed too, as updating tags touches the activity.
+
+@receiver(post_save, sender=Activity, dispatch_uid='restified_index_activity_on_save')
+@receiver(post_delete, sender=Activity, dispatch_uid='restified_unindex_activity_on_delete')
+def update_search_index(sender, instance, using, **kwargs):
+    if not is_search_index_supported(using):
+        return
+    activity_pk = instance.pk
+    transaction.on_commit(lambda: index_activity(activity_pk, using), using=using)
+
+
+# ---------- Search filter ------------------------------------------------------------------------
+
+
+def build_match_expression(query):
+    """
+    Builds an FTS5 match expression from a user query: each word is a quoted prefix, and all words
+    are required. Returns an empty string if the query has no words.
+    """
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in query.split())
+
+
+class ActivitySearchFilterBackend(BaseFilterBackend):
+    """
+    Filters activities by the words of the ``q`` query parameter, in their title, description,
+    address and tags, for the list action. The results are annotated with ``search_rank`` (the
+    BM25 score: lower is better) and ordered by it.
+
+    Searches read from the primary database. If it is not SQLite (or SQLite lacks FTS5), or the
+    index has not been created yet, falls back to ``icontains`` lookups, without ranking.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if view.action != 'list' or not query:
+            return queryset
+        # NOTE: The index is only maintained in the database which activities are written to (see
+        # ``index_activity()``), so searches read from the primary rather than from a replica.
+        queryset = queryset.using(DEFAULT_DB_ALIAS)
+        if not is_search_index_available(queryset.db):
+            return self._filter_by_icontains(queryset, query)
+        match_expression = build_match_expression(query)
+        if not match_expression:
+            return queryset.none()
+        connection = connections[queryset.db]
+        pk_column = '{}.{}'.format(
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name(queryset.model._meta.pk.column),
+        )
+        weights = ', '.join(str(weight) for __, weight in SEARCH_COLUMNS)
+        rank_sql = 'SELECT bm25({table}, {weights}) FROM {table} WHERE {table} MATCH %s AND {table}.rowid = {pk}'.format(
+            table=SEARCH_TABLE, weights=weights, pk=pk_column
+        )
+        # NOTE: ``pk__in=RawSQL(...)`` would wrap the subquery in extra parentheses, which SQLite
+        # evaluates as a scalar (i.e. only the first row).
+        match_sql = '{pk} IN (SELECT rowid FROM {table} WHERE {table} MATCH %s)'.format(
+            table=SEARCH_TABLE, pk=pk_column
+        )
+        return queryset.extra(
+            where=[match_sql], params=[match_expression]
+        ).annotate(
+            search_rank=RawSQL(rank_sql, [match_expression])
+        ).order_by('search_rank', '-pk')
+
+    def _filter_by_icontains(self, queryset, query):
+        search_filter = Q()
+        for word in query.split():
+            search_filter &= (
+                Q(title__icontains=word) | Q(description__icontains=word) | Q(address__icontains=word)
+                | Q(pk__in=Activity.objects.filter(tags__name__icontains=word).values('pk'))
+            )
+        return queryset.filter(search_filter)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Words to search in the title, description, address and tags.',
+                'schema': {'type': 'string'},
+            },
+        ]
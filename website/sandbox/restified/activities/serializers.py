@@ -2,30 +2,51 @@
 
 import logging
 
+from django.db import transaction
+from django.utils import timezone
+
 from rest_framework import serializers
 
+from sandbox.drfutils.serializers import CachedListSerializer, CachedRepresentationMixin, DynamicFieldsMixin
+from sandbox.imaging.fields import ImageVariantsField
 from sandbox.restified.accounts.serializers import UserSerializer
 
 from v5.activities.models import Group, Activity, Subscriber
 from v5.tagging.models import TaggedItem
 
+from .caches import activity_representation_cache, group_representation_cache
+
 
 logger = logging.getLogger(__name__)
 
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(CachedRepresentationMixin, serializers.ModelSerializer):
+    representation_cache = group_representation_cache
+
+    image_variants = ImageVariantsField(source='image', variants={
+        'small': '160x160c',
+        'medium': '480x270c',
+    })
+
     class Meta:
         model = Group
         fields = [
-            'pk', 'slug', 'name', 'slogan', 'image', 'description', 'is_public', 'create_date',
-            'activeness',
+            'pk', 'slug', 'name', 'slogan', 'image', 'image_variants', 'description', 'is_public',
+            'create_date', 'activeness',
         ]
+        list_serializer_class = CachedListSerializer
 
 
-class ActivitySerializer(serializers.ModelSerializer):
+class ActivitySerializer(DynamicFieldsMixin, CachedRepresentationMixin, serializers.ModelSerializer):
+    representation_cache = activity_representation_cache
+
     group = GroupSerializer(read_only=True)
-    creator = UserSerializer(read_only=True)
+    creator = UserSerializer(read_only=True, avatar_size='medium')
     tag_list = serializers.SerializerMethodField()
+    thumbnail_variants = ImageVariantsField(source='thumbnail', variants={
+        'small': '160x90c',
+        'medium': '480x270c',
+    })
 
     # NOTE: [DRF] Model's property attribute is read-only by default. To make it writable, we need
     # to declare a field for it explicitly. This field is required, so it should not have a default
@@ -46,14 +67,22 @@ class ActivitySerializer(serializers.ModelSerializer):
     class Meta:
         model = Activity
         fields = [
-            'pk', 'group', 'title', 'description', 'thumbnail', 'scheduled_date', 'closing_date',
-            'address', 'headcount', 'max_headcount', 'base_price', 'custom_subscription_fields',
+            'pk', 'group', 'title', 'description', 'thumbnail', 'thumbnail_variants', 'scheduled_date',
+            'closing_date', 'address', 'headcount', 'max_headcount', 'base_price', 'custom_subscription_fields',
             'subscription_notice', 'accept_online_payment', 'is_published',
             'creator', 'create_date', 'update_date', 'tag_list', 'group_slug',
         ]
         read_only_fields = [
             'group', 'thumbnail', 'creator', 'create_date', 'update_date', 'tag_list',
         ]
+        # Relations traversed by ``get_tag_list()``, to be eager loaded by ``EagerLoadingMixin``.
+        prefetch_related = ['tags']
+        list_serializer_class = CachedListSerializer
+        # Nested objects collapse to these attributes if requested by ``?collapse=``.
+        collapsible_fields = {
+            'group': 'slug',
+            'creator': 'username',
+        }
         # NOTE: [DRF] Specify write-only fields. See: https://stackoverflow.com/a/36771366/808898
         extra_kwargs = {
             # 'subscription_notice': {'write_only': True},
@@ -92,41 +121,91 @@ class ActivitySerializer(serializers.ModelSerializer):
 
 class ActivityTagListSerializer(serializers.ModelSerializer):
     """
-    This serializer provides partial update of activity tags.
+    This serializer provides partial update of activity tags. It accepts one of these forms:
+
+    - A single ``action`` (``create`` or ``delete``) on a single ``tag``.
+    - A batch of ``add_tags`` and/or ``remove_tags``.
+    - A full replacement set of ``replace_tags``.
+
+    Tags are added and removed in bulk, in a single transaction.
     """
     ACTION_CREATE = 'create'
     ACTION_DELETE = 'delete'
     ACTION_CHOICES = (ACTION_CREATE, ACTION_DELETE)
 
-    action = serializers.ChoiceField(write_only=True, choices=ACTION_CHOICES)
-    tag = serializers.CharField(write_only=True, allow_blank=False)
+    action = serializers.ChoiceField(write_only=True, required=False, choices=ACTION_CHOICES)
+    tag = serializers.CharField(write_only=True, required=False, allow_blank=False)
+    add_tags = serializers.ListField(
+        write_only=True, required=False, child=serializers.CharField(allow_blank=False)
+    )
+    remove_tags = serializers.ListField(
+        write_only=True, required=False, child=serializers.CharField(allow_blank=False)
+    )
+    replace_tags = serializers.ListField(
+        write_only=True, required=False, child=serializers.CharField(allow_blank=False)
+    )
     tag_list = serializers.SerializerMethodField()
 
     class Meta:
         model = Activity
-        fields = ['action', 'tag', 'tag_list']
+        fields = ['action', 'tag', 'add_tags', 'remove_tags', 'replace_tags', 'tag_list']
+        # The creator is checked by the view before updating tags.
+        select_related = ['creator']
+        prefetch_related = ['tags']
 
     def get_tag_list(self, obj):
         return [tag.name for tag in obj.tags.all()]
 
+    def validate(self, data):
+        is_single = 'action' in data or 'tag' in data
+        is_batch = 'add_tags' in data or 'remove_tags' in data
+        is_replace = 'replace_tags' in data
+        if is_single + is_batch + is_replace != 1:
+            raise serializers.ValidationError(
+                'Provide either action and tag, or add_tags and/or remove_tags, or replace_tags.'
+            )
+        if is_single and not ('action' in data and 'tag' in data):
+            raise serializers.ValidationError('Both action and tag are required.')
+        if set(data.get('add_tags', [])) & set(data.get('remove_tags', [])):
+            raise serializers.ValidationError('A tag cannot be both added and removed.')
+        return data
+
     def create(self, validated_data):
         raise NotImplementedError('This serializer does not support create.')
 
     def update(self, instance, validated_data):
-        action = validated_data['action']
-        tag = validated_data['tag']
-        if action == self.ACTION_CREATE:
-            TaggedItem.objects.create_tags(instance, [tag])
-        elif action == self.ACTION_DELETE:
-            TaggedItem.objects.delete_tags(instance, [tag])
-        else:
-            raise serializers.ValidationError('Unsupported action {}.'.format(action))
+        tags_to_add, tags_to_remove = self._get_tag_changes(instance, validated_data)
+        with transaction.atomic():
+            if tags_to_add:
+                TaggedItem.objects.create_tags(instance, tags_to_add)
+            if tags_to_remove:
+                TaggedItem.objects.delete_tags(instance, tags_to_remove)
+            # Touch the activity, so that its validators (e.g. ETag), cached representations and
+            # tag facets change with its tags.
+            instance.update_date = timezone.now()
+            instance.save(update_fields=['update_date'])
         return instance
 
+    def _get_tag_changes(self, instance, validated_data):
+        """
+        Returns a tuple of the sorted lists of tags to add and to remove.
+        """
+        if 'replace_tags' in validated_data:
+            new_tags = set(validated_data['replace_tags'])
+            current_tags = set(tag.name for tag in instance.tags.all())
+            return sorted(new_tags - current_tags), sorted(current_tags - new_tags)
+        if 'action' in validated_data:
+            if validated_data['action'] == self.ACTION_CREATE:
+                return [validated_data['tag']], []
+            return [], [validated_data['tag']]
+        tags_to_add = set(validated_data.get('add_tags', []))
+        tags_to_remove = set(validated_data.get('remove_tags', []))
+        return sorted(tags_to_add), sorted(tags_to_remove)
+
 
 class SubscriberSerializer(serializers.ModelSerializer):
     activity_pk = serializers.IntegerField(read_only=True, source='activity.pk')
-    user = UserSerializer(read_only=True)
+    user = UserSerializer(read_only=True, avatar_size='medium')
     custom_fields = serializers.JSONField(initial=[])
 
     class Meta:
@@ -13,10 +13,17 @@ from rest_framework.permissions import BasePermission, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.status import HTTP_204_NO_CONTENT
 
+from sandbox.drfutils.pagination import KeysetPagination
 from sandbox.drfutils.permissions import DenyAll
+from sandbox.drfutils.viewsets import (
+    ConditionalGetMixin, EagerLoadingMixin, MetricsMixin, NestedViewSetMixin,
+)
 
-from v5.activities.models import Group, GroupMember, Activity, Subscriber
+from v5.activities.models import Group, Activity, Subscriber
 
+from .caches import activity_representation_cache, group_representation_cache, is_approved_group_member
+from .facets import tag_facet_index
+from .search import ActivitySearchFilterBackend
 from .serializers import (
     GroupSerializer, ActivitySerializer, ActivityTagListSerializer, SubscriberSerializer,
 )
@@ -37,24 +44,21 @@ class IsApprovedGroupMember(BasePermission):
             return False
         if not request.user.is_authenticated:
             return False
-        return (
-            request.user.is_superuser
-            or GroupMember.objects.filter(
-                group=self.group,
-                user=request.user,
-                is_approved=True
-            ).exists()
-        )
+        return request.user.is_superuser or is_approved_group_member(self.group, request.user)
 
 
 # ---------- Group --------------------------------------------------------------------------------
 
 
-class GroupViewSet(viewsets.ReadOnlyModelViewSet):
+class GroupViewSet(
+    MetricsMixin, EagerLoadingMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet
+):
     serializer_class = GroupSerializer
     queryset = Group.objects.filter(is_public=True)
     lookup_field = 'slug'
     lookup_url_kwarg = 'slug'
+    # Groups have no modification timestamp, but their representations are invalidated on save.
+    validator_caches = [group_representation_cache]
 
 
 # ---------- Activity -----------------------------------------------------------------------------
@@ -88,14 +92,33 @@ class ActivityFilterBackend(BaseFilterBackend):
             if tag:
                 filter_kwargs['tags__name'] = tag
 
-            queryset = queryset.filter(**filter_kwargs).order_by('-scheduled_date')
+            queryset = queryset.filter(**filter_kwargs).order_by('-scheduled_date', '-pk')
         return queryset
 
 
-class ActivityViewSet(viewsets.ModelViewSet):
+class ActivityPagination(KeysetPagination):
+    ordering = ('-scheduled_date', '-pk')
+
+    def get_ordering(self, request, queryset, view):
+        # Search results are ordered by relevance (see ``ActivitySearchFilterBackend``).
+        if 'search_rank' in queryset.query.annotations:
+            return ('search_rank', '-pk')
+        return super().get_ordering(request, queryset, view)
+
+
+class ActivityViewSet(
+    MetricsMixin, EagerLoadingMixin, ConditionalGetMixin, viewsets.ModelViewSet
+):
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
-    filter_backends = [ActivityFilterBackend]
+    filter_backends = [ActivityFilterBackend, ActivitySearchFilterBackend]
+    pagination_class = ActivityPagination
+
+    # NOTE: The representation embeds the group and the creator profile, whose changes do not touch
+    # ``update_date`` but invalidate the cached representations (tag changes touch it). So both are
+    # needed to validate it.
+    last_modified_field = 'update_date'
+    validator_caches = [activity_representation_cache]
 
     # NOTE: [DRF] For the sake of readability, we define a coarse-grained permission class in the
     # ViewSet class. Fine-grained permission checks are performed on action methods.
@@ -126,8 +149,26 @@ class ActivityViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance=activity, data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        # NOTE: [DRF] Like ``UpdateModelMixin.update()``, invalidate the prefetched tags, so that
+        # the response reflects the updated tag list.
+        activity._prefetched_objects_cache = {}
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facets(self, request, **kwargs):
+        """
+        Returns the number of published and upcoming activities of each tag, optionally limited to
+        a ``group_slug`` and to a ``tag``. The counts are answered by ``TagFacetIndex``, which may
+        lag behind the changes of other processes (unlike the ``tag`` filter of the list).
+        """
+        group_pk = None
+        group_slug = request.query_params.get('group_slug')
+        if group_slug:
+            group_pk = get_object_or_404(Group, slug=group_slug).pk
+        tag = request.query_params.get('tag')
+        facets = tag_facet_index.get_facets(group_pk=group_pk, tags={tag} if tag else None)
+        return Response(facets)
+
     def _ensure_can_create(self, request):
         can_create = (request.user and request.user.is_staff)
         if not can_create:
@@ -146,9 +187,14 @@ class ActivityViewSet(viewsets.ModelViewSet):
 # ---------- Subscriber ---------------------------------------------------------------------------
 
 
-class SubscriberViewSet(viewsets.ModelViewSet):
+class SubscriberViewSet(
+    MetricsMixin, EagerLoadingMixin, NestedViewSetMixin, viewsets.ModelViewSet
+):
     serializer_class = SubscriberSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    parent_lookups = {
+        'activity': ('activity_pk', Activity.objects.select_related('creator'), 'pk'),
+    }
 
     # NOTE: [DRF] Activity subscribers are NOT paginated.
     pagination_class = None
@@ -182,7 +228,7 @@ class SubscriberViewSet(viewsets.ModelViewSet):
         """
         if request.user and request.user.is_authenticated:
             try:
-                subscriber = self.get_queryset().get(user=request.user)
+                subscriber = self.filter_queryset(self.get_queryset()).get(user=request.user)
                 serializer = self.get_serializer(subscriber)
                 return Response(serializer.data)
             except Subscriber.DoesNotExist:
@@ -191,8 +237,7 @@ class SubscriberViewSet(viewsets.ModelViewSet):
         return Response(status=HTTP_204_NO_CONTENT)
 
     def _lookup_activity(self):
-        activity_pk = self.kwargs.get('activity_pk')
-        return Activity.objects.get(pk=activity_pk)
+        return self.get_parent_object('activity')
 
     def _ensure_can_subscribe(self, request):
         activity = self._lookup_activity()
@@ -205,10 +250,12 @@ class SubscriberViewSet(viewsets.ModelViewSet):
             raise PermissionDenied()
 
     def _ensure_can_update_or_destroy(self, request, subscriber):
+        # The subscriber belongs to the activity of the URL, whose creator is already loaded.
+        activity = self._lookup_activity()
         can_update_or_destroy = (
             request.user and request.user.is_authenticated and (
                 request.user == subscriber.user or
-                request.user == subscriber.activity.creator or
+                request.user == activity.creator or
                 request.user.is_staff
             )
         )
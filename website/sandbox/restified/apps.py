@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+logger = logging.getLogger(__name__)
+
+
+class RestifiedConfig(AppConfig):
+    name = 'sandbox.restified'
+    label = 'restified'
+    verbose_name = 'Restified API'
+
+    def ready(self):
+        from v5.activities.models import Activity
+
+        # NOTE: ``post_migrate`` is only sent for the apps with models, so the search index is
+        # created after the migrations of the activities app.
+        post_migrate.connect(
+            create_search_index_after_migrate, sender=Activity._meta.app_config,
+            dispatch_uid='restified_create_search_index_after_migrate'
+        )
+
+
+def create_search_index_after_migrate(sender, using, **kwargs):
+    from .activities.search import create_search_index
+    create_search_index(using)
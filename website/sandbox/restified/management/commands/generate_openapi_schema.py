@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sandbox.restified.meta.schemas import restified_schema
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates the OpenAPI schema of the restified API, and writes it to V5_OPENAPI_SCHEMA_PATH '
+        'for the current code version, so that it is not generated by the first request after a '
+        'deployment.'
+    )
+
+    def handle(self, *args, **options):
+        if not restified_schema.path:
+            raise CommandError('V5_OPENAPI_SCHEMA_PATH is not set.')
+        restified_schema.write()
+        self.stdout.write(self.style.SUCCESS('Wrote the schema of code version {} to {}.'.format(
+            restified_schema.get_code_version(), restified_schema.path
+        )))
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import json
+import logging
+import random
+import socketserver
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from sandbox.restified.seeding import PASSWORD, seed_data
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- HTTP client --------------------------------------------------------------------------
+
+
+class Recorder(object):
+    """
+    Collects the latency (in seconds) and the status of each request by endpoint name, and the
+    number of sessions by name. Requests made before ``start_time`` (the warm-up) are not recorded.
+    """
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.sessions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency, status):
+        if time.monotonic() < self.start_time:
+            return
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            if status == 0 or status >= 400:
+                self.errors[endpoint] += 1
+
+    def record_session(self, name):
+        with self._lock:
+            self.sessions[name] += 1
+
+
+class Client(object):
+    """
+    A client of the restified API, which authenticates by a JWT once logged in.
+    """
+
+    def __init__(self, base_url, recorder, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.jwt_token = None
+
+    def request(self, endpoint, method, path, query=None, payload=None):
+        """
+        Sends a request, records it under the endpoint name, and returns a tuple of the status code
+        (0 if the request failed) and the parsed JSON (or ``None``).
+        """
+        url = self.base_url + path
+        if query:
+            url += '?' + urllib.parse.urlencode(query)
+        headers = {'Accept': 'application/json'}
+        data = None
+        if payload is not None:
+            data = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.jwt_token:
+            headers['Authorization'] = 'Bearer {}'.format(self.jwt_token)
+        request = urllib.request.Request(url, data=data, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            status, content = exc.code, exc.read()
+        except (urllib.error.URLError, OSError) as exc:
+            logger.debug('%s %s failed: %s', method, url, exc)
+            status, content = 0, b''
+        self.recorder.record(endpoint, time.perf_counter() - start, status)
+        try:
+            return status, json.loads(content.decode('utf-8')) if content else None
+        except ValueError:
+            return status, None
+
+    def get(self, endpoint, path, **query):
+        return self.request(endpoint, 'GET', path, query=query)
+
+    def post(self, endpoint, path, payload=None):
+        return self.request(endpoint, 'POST', path, payload=payload)
+
+    def delete(self, endpoint, path):
+        return self.request(endpoint, 'DELETE', path)
+
+
+# ---------- Sessions -----------------------------------------------------------------------------
+
+
+API_PREFIX = '/v3/'
+
+
+class Sessions(object):
+    """
+    The sessions of simulated users. Each session is a method taking a ``Client`` and a
+    ``random.Random``, and is picked at random by its weight in ``MIX``.
+    """
+    MIX = {
+        'browse_by_tag': 40,
+        'open_detail': 25,
+        'poll_notifications': 20,
+        'subscribe': 10,
+        'login': 5,
+    }
+
+    def __init__(self, usernames, password):
+        self.usernames = usernames
+        self.password = password
+
+    def run(self, name, client, rand):
+        getattr(self, name)(client, rand)
+
+    def _login(self, client, rand):
+        status, data = client.post('auth-login', API_PREFIX + 'accounts/auth/login/', {
+            'username': rand.choice(self.usernames), 'password': self.password, 'use_jwt': True,
+        })
+        client.jwt_token = data['jwt_token'] if status == 200 and data else None
+        return client.jwt_token is not None
+
+    def _list_activities(self, client, **query):
+        status, data = client.get(
+            'activity-list', API_PREFIX + 'activities/activities/',
+            pagination='cursor', **query
+        )
+        return data if status == 200 and data else {'results': [], 'next': None}
+
+    def browse_by_tag(self, client, rand):
+        status, facets = client.get('activity-facets', API_PREFIX + 'activities/activities/facets/')
+        if status != 200 or not facets:
+            return
+        tag = rand.choice(facets)['tag']
+        page = self._list_activities(client, scheduled='upcoming', tag=tag)
+        # Some users scroll to the next page.
+        if page['next'] and rand.random() < 0.3:
+            cursor = urllib.parse.parse_qs(urllib.parse.urlsplit(page['next']).query).get('cursor', [''])[0]
+            self._list_activities(client, scheduled='upcoming', tag=tag, cursor=cursor)
+
+    def open_detail(self, client, rand):
+        page = self._list_activities(client, scheduled=rand.choice(['upcoming', 'past']))
+        if not page['results']:
+            return
+        activity_path = '{}activities/activities/{}/'.format(API_PREFIX, rand.choice(page['results'])['pk'])
+        client.get('activity-detail', activity_path)
+        client.get('subscriber-list', activity_path + 'subscribers/')
+        client.get('subscriber-current-user-subscriber', activity_path + 'subscribers/current-user/')
+
+    def poll_notifications(self, client, rand):
+        if not self._login(client, rand):
+            return
+        client.get('profile-retrieve-my-profile', API_PREFIX + 'accounts/profiles/my/')
+        for __ in range(3):
+            client.get('notification-list', API_PREFIX + 'accounts/notifications/', pagination='cursor')
+
+    def subscribe(self, client, rand):
+        if not self._login(client, rand):
+            return
+        page = self._list_activities(client, scheduled='upcoming')
+        if not page['results']:
+            return
+        subscribers_path = '{}activities/activities/{}/subscribers/'.format(
+            API_PREFIX, rand.choice(page['results'])['pk']
+        )
+        status, __ = client.get('subscriber-current-user-subscriber', subscribers_path + 'current-user/')
+        if status != 204:
+            return
+        status, subscriber = client.post('subscriber-list', subscribers_path, {
+            'real_name': 'Load Test', 'email': 'loadtest@example.com', 'custom_fields': [],
+        })
+        # Unsubscribe, so that the data does not drift between runs.
+        if status == 201 and subscriber:
+            client.delete('subscriber-detail', '{}{}/'.format(subscribers_path, subscriber['pk']))
+
+    def login(self, client, rand):
+        if not self._login(client, rand):
+            return
+        client.get('profile-retrieve-my-profile', API_PREFIX + 'accounts/profiles/my/')
+        client.post('auth-logout', API_PREFIX + 'accounts/auth/logout/')
+
+
+# ---------- Reporting ----------------------------------------------------------------------------
+
+
+def get_percentile(sorted_values, percent):
+    """
+    Returns the percentile of sorted values, by the nearest-rank method.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(percent / 100.0 * len(sorted_values) + 0.5 - 1e-9)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, num_errors, duration):
+    values = sorted(latencies)
+    milliseconds = lambda value: round(value * 1000, 2) if value is not None else None  # noqa: E731
+    return {
+        'requests': len(values),
+        'errors': num_errors,
+        'rps': round(len(values) / duration, 2) if duration else None,
+        'p50_ms': milliseconds(get_percentile(values, 50)),
+        'p95_ms': milliseconds(get_percentile(values, 95)),
+        'p99_ms': milliseconds(get_percentile(values, 99)),
+        'max_ms': milliseconds(values[-1] if values else None),
+    }
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+    def process_request_thread(self, request, client_address):
+        # NOTE: Each request is handled in a new thread, whose database connections would never be
+        # reused (connections are per thread) nor closed, despite ``CONN_MAX_AGE``.
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            connections.close_all()
+
+
+# ---------- Command ------------------------------------------------------------------------------
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays a weighted mix of user sessions against the restified API, and reports the '
+        'latency percentiles and the throughput of each endpoint. By default, the WSGI application '
+        'of website/wsgi.py is served in-process on localhost.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='The base URL of the restified API of a running server, e.g. '
+                 '"http://localhost:8000/restified". Defaults to an in-process server.',
+        )
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run (30 by default).')
+        parser.add_argument('--warmup', type=float, default=3, help='Seconds not recorded at start (3 by default).')
+        parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent users (8 by default).')
+        parser.add_argument('--random-seed', type=int, default=0, help='Seed of the session mix, for repeatable runs.')
+        parser.add_argument(
+            '--seed', action='store_true',
+            help='Seed the default database with the data of the query-budget tests first (unless it '
+                 'is already seeded). Do not use on a production database.',
+        )
+        parser.add_argument('--output', help='The JSON file of the results. Defaults to loadtest-<time>.json.')
+        parser.add_argument('--compare', help='A JSON file of a previous run, to compare the results with.')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            if User.objects.filter(username='user00').exists():
+                self.stdout.write('The database is already seeded.')
+            else:
+                self.stdout.write('Seeding the database...')
+                seed_data()
+        # The users of authenticated sessions, as seeded by ``seed_data()`` (except the staff user).
+        usernames = list(
+            User.objects.filter(username__regex=r'^user[0-9]+$', is_active=True, is_staff=False)
+            .values_list('username', flat=True)
+        )
+        if not usernames:
+            raise CommandError('No user to log in: seed the database with --seed.')
+        sessions = Sessions(usernames, PASSWORD)
+
+        server = None
+        base_url = options['url']
+        if not base_url:
+            from website.wsgi import application
+            server = make_server(
+                '127.0.0.1', 0, application,
+                server_class=ThreadingWSGIServer, handler_class=QuietWSGIRequestHandler
+            )
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            mount_prefix = getattr(settings, 'V5_RESTIFIED_URL_PREFIX', '/restified').rstrip('/')
+            base_url = 'http://127.0.0.1:{}{}'.format(server.server_port, mount_prefix)
+        self.stdout.write('Load testing {} with {} users for {}s...'.format(
+            base_url, options['concurrency'], options['duration'])
+        )
+
+        try:
+            results = self.run_load(base_url, sessions, options)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        self.print_results(results)
+        output = options['output'] or 'loadtest-{}.json'.format(datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+        with open(output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS('Saved the results to {}.'.format(output)))
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as previous_file:
+                self.print_comparison(json.load(previous_file), results)
+
+    def run_load(self, base_url, sessions, options):
+        start_time = time.monotonic() + options['warmup']
+        end_time = start_time + options['duration']
+        recorder = Recorder(start_time)
+        names = sorted(Sessions.MIX)
+        weights = [Sessions.MIX[name] for name in names]
+
+        def run_user(index):
+            rand = random.Random(options['random_seed'] * 1000 + index)
+            while time.monotonic() < end_time:
+                name = rand.choices(names, weights)[0]
+                sessions.run(name, Client(base_url, recorder), rand)
+                recorder.record_session(name)
+
+        threads = [threading.Thread(target=run_user, args=(index,)) for index in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.monotonic() - start_time
+
+        all_latencies = [latency for latencies in recorder.latencies.values() for latency in latencies]
+        return {
+            'date': datetime.datetime.now().isoformat(),
+            'url': base_url,
+            'concurrency': options['concurrency'],
+            'duration': round(duration, 2),
+            'mix': Sessions.MIX,
+            'sessions': dict(recorder.sessions),
+            'endpoints': {
+                endpoint: summarize(latencies, recorder.errors[endpoint], duration)
+                for endpoint, latencies in sorted(recorder.latencies.items())
+            },
+            'total': summarize(all_latencies, sum(recorder.errors.values()), duration),
+        }
+
+    def print_results(self, results):
+        row_format = '{:<40} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}'
+        self.stdout.write(row_format.format('endpoint', 'requests', 'errors', 'rps', 'p50 ms', 'p95 ms', 'p99 ms'))
+        rows = sorted(results['endpoints'].items()) + [('TOTAL', results['total'])]
+        for endpoint, stats in rows:
+            self.stdout.write(row_format.format(
+                endpoint, stats['requests'], stats['errors'], stats['rps'],
+                stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+            ))
+
+    def print_comparison(self, previous, results):
+        self.stdout.write('Compared with the run of {}:'.format(previous.get('date')))
+        row_format = '{:<40} {:>9} {:>9} {:>9}'
+        self.stdout.write(row_format.format('endpoint', 'rps', 'p50', 'p95'))
+        rows = sorted(results['endpoints'].items()) + [('TOTAL', results['total'])]
+        for endpoint, stats in rows:
+            previous_stats = previous['total'] if endpoint == 'TOTAL' else previous['endpoints'].get(endpoint)
+            if not previous_stats:
+                continue
+            changes = []
+            for key in ('rps', 'p50_ms', 'p95_ms'):
+                before, after = previous_stats.get(key), stats[key]
+                changes.append('{:+.1f}%'.format((after - before) * 100.0 / before) if before and after is not None else '-')
+            self.stdout.write(row_format.format(endpoint, *changes))
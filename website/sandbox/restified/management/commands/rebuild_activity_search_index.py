@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from sandbox.restified.activities.search import is_search_index_supported, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of activities from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='The database to rebuild the index on. Defaults to the "default" database.',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not is_search_index_supported(using):
+            raise CommandError('The search index requires an SQLite database with FTS5 support.')
+        count = rebuild_search_index(using)
+        self.stdout.write(self.style.SUCCESS('Indexed {} activities.'.format(count)))
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from django.conf import settings
+
+from sandbox.drfutils.schemas import CachedSchema
+
+
+logger = logging.getLogger(__name__)
+
+
+# The OpenAPI schema of the restified API, regenerated when the source of the ``sandbox`` package
+# or of the models of ``v5`` changes (unless ``V5_CODE_VERSION`` is set).
+restified_schema = CachedSchema(
+    title='V5 API v3',
+    version='3.0.0',
+    path=getattr(settings, 'V5_OPENAPI_SCHEMA_PATH', None),
+    source_packages=('sandbox', 'v5'),
+)
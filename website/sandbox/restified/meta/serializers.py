@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchSerializer(serializers.Serializer):
+    # Sub-requests are dispatched sequentially, so keep batches small.
+    MAX_REQUESTS = 20
+
+    requests = serializers.ListField(
+        write_only=True, min_length=1, max_length=MAX_REQUESTS,
+        child=serializers.CharField(allow_blank=False)
+    )
+    responses = serializers.ListField(read_only=True)
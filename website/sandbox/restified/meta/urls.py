@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+from rest_framework import routers
+
+from . import viewsets
+
+
+def build_urlpatterns():
+    router = routers.SimpleRouter()
+    router.register(
+        r'caches',
+        viewsets.CacheStatsViewSet,
+        basename='cache-stats'
+    )
+    router.register(
+        r'metrics',
+        viewsets.MetricsViewSet,
+        basename='metrics'
+    )
+    router.register(
+        r'profiles',
+        viewsets.RequestProfileViewSet,
+        basename='request-profile'
+    )
+    router.register(
+        r'batch',
+        viewsets.BatchViewSet,
+        basename='batch'
+    )
+    return router.urls
+
+
+urlpatterns = build_urlpatterns()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from django.conf import settings
+from django.http import FileResponse, Http404
+
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.response import Response
+
+from sandbox.drfutils.caches import get_cache_stats
+from sandbox.drfutils.dispatch import dispatch_get
+from sandbox.drfutils.metrics import PrometheusRenderer, get_aggregated_snapshot, render_prometheus
+from sandbox.drfutils.profiling import PROFILE_ID_PATTERN, get_profile_store
+from sandbox.drfutils.viewsets import NonModelViewSet
+
+from .serializers import BatchSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStatsViewSet(NonModelViewSet):
+    """
+    Hit and miss counters of the restified caches in the current worker process.
+    """
+    permission_classes = [IsAdminUser]
+    # NOTE: [DRF] Staff-only endpoints without serializers are excluded from the OpenAPI schema.
+    schema = None
+
+    def list(self, request):
+        return Response(get_cache_stats())
+
+
+class MetricsViewSet(NonModelViewSet):
+    """
+    The metrics of the requests by view and action (see ``MetricsMiddleware``), aggregated over all
+    worker processes, and the stats of the restified caches, in the Prometheus text format.
+
+    NOTE: Prometheus can authenticate as a staff user with a JWT, by the ``authorization`` of its
+    scrape config.
+    """
+    permission_classes = [IsAdminUser]
+    schema = None
+    renderer_classes = [PrometheusRenderer]
+
+    def list(self, request):
+        return Response(render_prometheus(get_aggregated_snapshot()))
+
+
+class RequestProfileViewSet(NonModelViewSet):
+    """
+    The request profiles captured by ``ProfilingMiddleware``, the latest first. The list omits the
+    queries and the summary of each profile, and ``download`` returns its ``pstats`` dump.
+    """
+    permission_classes = [IsAdminUser]
+    schema = None
+    lookup_value_regex = PROFILE_ID_PATTERN
+
+    # The keys of the profile data which are too large for the list.
+    detail_keys = ('queries', 'summary')
+
+    def list(self, request):
+        store = get_profile_store()
+        profiles = []
+        for profile_id in (store.get_profile_ids() if store is not None else []):
+            data = store.get_data(profile_id)
+            if data is not None:
+                profiles.append({key: value for key, value in data.items() if key not in self.detail_keys})
+        return Response(profiles)
+
+    def retrieve(self, request, pk=None):
+        return Response(self._get_profile_data(pk))
+
+    @action(detail=True, methods=['get'], url_path='download')
+    def download(self, request, pk=None):
+        self._get_profile_data(pk)
+        try:
+            stats_file = open(get_profile_store().get_stats_path(pk), 'rb')
+        except FileNotFoundError:
+            raise Http404('No such profile.')
+        return FileResponse(
+            stats_file, as_attachment=True, filename='{}.prof'.format(pk), content_type='application/octet-stream'
+        )
+
+    def _get_profile_data(self, profile_id):
+        store = get_profile_store()
+        data = store.get_data(profile_id) if store is not None else None
+        if data is None:
+            raise Http404('No such profile.')
+        return data
+
+
+class BatchViewSet(NonModelViewSet):
+    """
+    Dispatches a batch of GET sub-requests in-process, and returns their responses in order. Each
+    sub-request is a URL path (with an optional query string) under the restified URLs, such as
+    ``/restified/v3/accounts/profiles/my/``.
+
+    The sub-requests reuse the session, the user and the authentication of the batch request (they
+    are not authenticated nor throttled again), and are subject to their own permissions. Only GET
+    is dispatched, so a batch cannot contain another batch, and streaming URLs (e.g. the
+    notification stream) are answered ``400`` (see ``dispatch_get()``).
+    """
+    permission_classes = [AllowAny]
+    serializer_class = BatchSerializer
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        mount_prefix = getattr(settings, 'V5_RESTIFIED_URL_PREFIX', '/restified').rstrip('/')
+        responses = []
+        for url in serializer.validated_data['requests']:
+            status_code, data = dispatch_get(
+                request._request, url, 'sandbox.restified.urls', mount_prefix, user=request.user, auth=request.auth
+            )
+            responses.append({'url': url, 'status': status_code, 'data': data})
+        return Response({'responses': responses})
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import logging
+import types
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+
+from v5.accounts.models import Profile, UserBadge, Notification
+from v5.activities.models import Group, GroupMember, Activity, Subscriber
+from v5.tagging.models import TaggedItem
+
+
+logger = logging.getLogger(__name__)
+
+
+PASSWORD = 'password'
+
+TAGS = [
+    'hiking', 'cycling', 'running', 'climbing', 'swimming', 'kayaking',
+    'photography', 'cooking', 'board-games', 'volunteering', 'music', 'reading',
+]
+
+
+def seed_data(num_users=40, num_groups=5, num_activities=300, num_notifications=120):
+    """
+    Seeds a realistic volume of data for the restified endpoints, and returns a namespace of the
+    objects which tests refer to:
+
+    - ``staff``: a staff user, who created some activities.
+    - ``member``: an approved member of all groups, who receives the notifications.
+    - ``outsider``: a user who has not subscribed to any activity.
+    - ``groups``, ``activities`` (half of them upcoming), ``users``.
+    - ``busy_activity`` and ``quiet_activity``: activities with many and one subscribers.
+
+    Every user has badges, every activity has tags and subscribers, and notifications are related
+    to activities, groups and subscribers (and some to deleted objects).
+    """
+    password = make_password(PASSWORD)
+    users = []
+    for index in range(num_users):
+        user = User.objects.create(
+            username='user{:02d}'.format(index), password=password, is_staff=(index == 0),
+            email='user{:02d}@example.com'.format(index),
+        )
+        profile, __ = Profile.objects.get_or_create(user=user)
+        profile.display_name = 'User {}'.format(index)
+        profile.save()
+        users.append(user)
+    staff, member, outsider = users[0], users[1], users[-1]
+    UserBadge.objects.bulk_create(
+        UserBadge(user=user, title='Badge {}'.format(badge_index))
+        for user in users for badge_index in range(3)
+    )
+
+    groups = []
+    for index in range(num_groups):
+        group = Group.objects.create(slug='group-{}'.format(index), name='Group {}'.format(index))
+        GroupMember.objects.create(group=group, user=member, is_approved=True)
+        groups.append(group)
+
+    today = datetime.date.today()
+    activities = []
+    for index in range(num_activities):
+        activity = Activity.objects.create(
+            group=groups[index % num_groups],
+            title='Activity {}'.format(index),
+            description='<p>Description of activity {}.</p>'.format(index),
+            address='{} Main Street'.format(index),
+            scheduled_date=today + datetime.timedelta(days=index - num_activities // 2),
+            max_headcount=20,
+            is_published=True,
+            creator=users[index % 10],
+        )
+        TaggedItem.objects.create_tags(activity, [TAGS[(index + offset) % len(TAGS)] for offset in (0, 3, 7)])
+        activities.append(activity)
+
+    # Subscribers: from 1 to 8 users (never the outsider) per activity.
+    subscribers = []
+    for index, activity in enumerate(activities):
+        for offset in range(1 + index % 8):
+            user = users[1 + (index + offset) % (num_users - 2)]
+            subscribers.append(Subscriber(
+                activity=activity, user=user, real_name=user.username, email=user.email,
+            ))
+    Subscriber.objects.bulk_create(subscribers)
+    busy_activity = activities[7]
+    quiet_activity = activities[8]
+
+    # Notifications of the member, related to several models, and to some deleted objects.
+    related_objects = [
+        activities[0], groups[0], Subscriber.objects.filter(activity=busy_activity).first(),
+    ]
+    notifications = []
+    for index in range(num_notifications):
+        related_object = related_objects[index % len(related_objects)]
+        related_object_pk = related_object.pk if index % 10 else 999999
+        notifications.append(Notification(
+            sender=users[2 + index % 5], receiver=member,
+            related_content_type=ContentType.objects.get_for_model(related_object),
+            related_object_pk=str(related_object_pk),
+        ))
+    Notification.objects.bulk_create(notifications)
+
+    logger.debug('Seeded %d users, %d activities and %d subscribers.', num_users, num_activities, len(subscribers))
+    return types.SimpleNamespace(
+        users=users, staff=staff, member=member, outsider=outsider, groups=groups, activities=activities,
+        busy_activity=busy_activity, quiet_activity=quiet_activity,
+    )
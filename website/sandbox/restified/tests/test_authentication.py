@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import time
+from unittest import mock
+
+import jwt
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TransactionTestCase
+
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+
+from v5.accounts.utils import generate_jwt_token
+
+from sandbox.drfutils.authentication import JWTAuthentication, revoke_token
+from sandbox.drfutils.caches import clear_local_caches
+
+
+class JWTAuthenticationTests(TransactionTestCase):
+    """
+    Checks the expiry and the revocation of tokens. ``TransactionTestCase`` commits the changes, so
+    that the cache is updated as in production (see ``revoke_token()``).
+    """
+
+    def setUp(self):
+        self.clear_caches()
+        self.user = User.objects.create_user('member', password='secret')
+
+    def clear_caches(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        clear_local_caches()
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Bearer ' + token)
+        return JWTAuthentication().authenticate(request)
+
+    def assert_rejected(self, token, message):
+        with self.assertRaisesMessage(AuthenticationFailed, message):
+            self.authenticate(token)
+
+    def test_token_is_verified_without_queries(self):
+        token, __ = generate_jwt_token(self.user)
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            user, claims = self.authenticate(token)
+            self.assertEqual((user.pk, user.username, user.is_staff), (self.user.pk, 'member', False))
+        self.assertEqual(claims['user_id'], self.user.pk)
+        # Other attributes load the user.
+        with self.assertNumQueries(1):
+            self.assertEqual(user.date_joined, self.user.date_joined)
+
+    def test_expired_token(self):
+        now = int(time.time())
+        token = jwt.encode(
+            {'user_id': self.user.pk, 'jti': 'expired', 'iat': now - 120, 'exp': now - 60}, settings.SECRET_KEY,
+        ).decode('ascii')
+        self.assert_rejected(token, 'Token has expired.')
+
+    def test_verified_token_expires(self):
+        token, __ = generate_jwt_token(self.user)
+        __, claims = self.authenticate(token)
+        later = claims['exp'] + 1
+        with mock.patch('sandbox.drfutils.authentication.time.time', return_value=later):
+            self.assert_rejected(token, 'Token has expired.')
+
+    def test_revoked_token(self):
+        token, __ = generate_jwt_token(self.user)
+        other_token, __ = generate_jwt_token(self.user)
+        __, claims = self.authenticate(token)
+        revoke_token(claims)
+        self.assert_rejected(token, 'Token has been revoked.')
+        self.authenticate(other_token)
+
+    def test_revocation_is_loaded_from_database(self):
+        token, __ = generate_jwt_token(self.user)
+        __, claims = self.authenticate(token)
+        revoke_token(claims)
+        # As if the cache had evicted the revocation.
+        self.clear_caches()
+        self.assert_rejected(token, 'Token has been revoked.')
+
+    def test_password_change_revokes_tokens(self):
+        token, __ = generate_jwt_token(self.user)
+        self.authenticate(token)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assert_rejected(token, 'Token has been revoked.')
+
+    def test_deactivation_rejects_tokens(self):
+        token, __ = generate_jwt_token(self.user)
+        self.authenticate(token)
+        self.user.is_active = False
+        self.user.save()
+        self.assert_rejected(token, 'User inactive or deleted.')
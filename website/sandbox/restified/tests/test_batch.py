@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+
+from v5.accounts.utils import generate_jwt_token
+
+from sandbox.restified.seeding import seed_data
+
+
+@override_settings(ROOT_URLCONF='sandbox.restified.tests.urls')
+class BatchTests(APITestCase):
+    """
+    Checks that the sub-requests of a batch are not authenticated again: each of them only adds the
+    queries of its own view.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_data(num_users=10, num_groups=2, num_activities=10, num_notifications=0)
+
+    def setUp(self):
+        self.url = reverse('subscriber-list', kwargs={'activity_pk': self.data.busy_activity.pk})
+
+    def count_batch_queries(self, num_requests):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('batch-list'), {'requests': [self.url] * num_requests}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['status'] for item in response.data['responses']], [200] * num_requests)
+        return len(context)
+
+    def test_sub_requests_are_not_authenticated_again(self):
+        self.client.force_authenticate(self.data.member)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        num_view_queries = len(context)
+        self.assertGreater(num_view_queries, 0)
+        # NOTE: [DRF] ``force_authenticate(None)`` also clears the credentials.
+        self.client.force_authenticate(None)
+        token, __ = generate_jwt_token(self.data.member)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+        # The state of the token is loaded by the first request.
+        self.count_batch_queries(1)
+        self.assertEqual(self.count_batch_queries(3) - self.count_batch_queries(1), 2 * num_view_queries)
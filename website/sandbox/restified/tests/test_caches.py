@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+from django.core.cache.backends.base import BaseCache
+from django.test import SimpleTestCase, override_settings
+
+from sandbox.drfutils.caches import MISSING, FallbackCache, RepresentationCache
+
+
+class SilentCache(BaseCache):
+    """
+    A shared cache backend which behaves like ``MemcachedCache`` with the ``python-memcached``
+    client: when the server is down (``reachable`` is false), it returns defaults rather than
+    raising, and ``incr()`` raises ``ValueError`` as for a missing key.
+    """
+    reachable = True
+    data = {}
+
+    def __init__(self, location, params):
+        super().__init__(params)
+
+    def add(self, key, value, timeout=None, version=None):
+        if not self.reachable or key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def get(self, key, default=None, version=None):
+        if not self.reachable:
+            return default
+        return self.data.get(key, default)
+
+    def set(self, key, value, timeout=None, version=None):
+        if self.reachable:
+            self.data[key] = value
+
+    def delete(self, key, version=None):
+        if self.reachable:
+            self.data.pop(key, None)
+
+    def incr(self, key, delta=1, version=None):
+        if not self.reachable or key not in self.data:
+            raise ValueError("Key '{}' not found".format(key))
+        self.data[key] += delta
+        return self.data[key]
+
+    def clear(self):
+        self.data.clear()
+
+
+@override_settings(
+    CACHES={'restified': {'BACKEND': 'sandbox.restified.tests.test_caches.SilentCache'}},
+    V5_RESTIFIED_CACHE_ALIAS='restified',
+    V5_RESTIFIED_CACHE_RETRY_INTERVAL=60,
+)
+class FallbackCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        SilentCache.data.clear()
+        SilentCache.reachable = True
+        self.cache = FallbackCache('test-silent')
+        self.cache._local_cache.clear()
+
+    def test_shared_backend(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.incr('counter'), 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(SilentCache.data['restified:test-silent:counter'], 2)
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(len(self.cache._local_cache), 0)
+
+    def test_counter_is_read_where_incremented_when_backend_is_silent(self):
+        representations = RepresentationCache('test-silent-representations')
+        representations.invalidate_all()
+        SilentCache.reachable = False
+        representations.invalidate_all()
+        representations.invalidate_all()
+        # The backend returns defaults, so the generation must be read from the local counter.
+        self.assertEqual(representations.get_generation(), 2)
+        self.assertEqual(representations.errors, 1)
+
+    def test_values_use_local_cache_while_backend_is_silent(self):
+        SilentCache.reachable = False
+        self.cache.incr('counter')
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get_many(['key', 'other']), {'key': 'value'})
+
+    def test_increments_are_replayed_when_backend_is_back(self):
+        self.cache.incr('counter')
+        SilentCache.reachable = False
+        self.assertEqual(self.cache.incr('counter'), 1)
+        self.assertEqual(SilentCache.data['restified:test-silent:counter'], 1)
+        SilentCache.reachable = True
+        # As if the retry interval had elapsed.
+        self.cache._retry_time = 0
+        # The increment made while the backend was silent reaches the backend.
+        self.assertEqual(self.cache.get('counter'), 2)
+        self.assertIs(self.cache.get('missing'), MISSING)
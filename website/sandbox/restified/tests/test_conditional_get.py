@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+
+from v5.activities.models import Activity
+
+from sandbox.drfutils.caches import clear_local_caches
+from sandbox.restified.seeding import seed_data
+
+
+@override_settings(ROOT_URLCONF='sandbox.restified.tests.urls')
+class ConditionalGetTests(APITestCase):
+    """
+    Checks that the lists validated before serialization answer ``304 Not Modified`` with their
+    aggregate query only, and that changes of embedded objects change their ETags.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_data(num_users=10, num_groups=2, num_activities=20, num_notifications=0)
+
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        clear_local_caches()
+
+    def get_etag(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/'))
+        return response['ETag']
+
+    def assert_not_modified(self, path, etag):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304, path)
+        self.assertEqual(len(context), 1, '\n'.join(query['sql'] for query in context.captured_queries))
+
+    def test_lists_are_validated_before_serialization(self):
+        for path in (
+            reverse('activity-list') + '?scheduled=past',
+            reverse('group-list'),
+            reverse('profile-list'),
+        ):
+            with self.subTest(path):
+                self.assert_not_modified(path, self.get_etag(path))
+
+    def test_activity_etag_changes_with_creator_profile(self):
+        path = reverse('activity-list') + '?scheduled=past'
+        etag = self.get_etag(path)
+        creator = Activity.objects.filter(pk__in=[activity.pk for activity in self.data.activities]).first().creator
+        creator.profile.display_name = 'Renamed'
+        creator.profile.save()
+        self.assertNotEqual(self.get_etag(path), etag)
+
+    def test_activity_etag_changes_with_group(self):
+        path = reverse('activity-list') + '?scheduled=past'
+        etag = self.get_etag(path)
+        group = self.data.groups[0]
+        group.name = 'Renamed'
+        group.save()
+        self.assertNotEqual(self.get_etag(path), etag)
+
+    def test_profile_etag_changes_with_badges(self):
+        path = reverse('profile-list')
+        etag = self.get_etag(path)
+        self.data.member.badge_set.create(title='Newcomer')
+        self.assertNotEqual(self.get_etag(path), etag)
+
+    def test_detail_is_validated_before_serialization(self):
+        path = reverse('group-detail', kwargs={'slug': self.data.groups[0].slug})
+        etag = self.get_etag(path)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Only the lookup of the group.
+        self.assertEqual(len(context), 1)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TransactionTestCase, override_settings
+
+from v5.activities.models import Activity
+from v5.tagging.models import TaggedItem
+
+from sandbox.drfutils.caches import clear_local_caches
+from sandbox.restified.activities.facets import TagFacetIndex, tag_facet_index
+from sandbox.restified.seeding import seed_data
+
+from .test_caches import SilentCache
+
+
+class TagFacetIndexTests(TransactionTestCase):
+    """
+    Checks that the index follows the changes of activities. ``TransactionTestCase`` commits the
+    changes, so that the index is refreshed as in production (see ``refresh_tag_facet_index()``).
+    """
+
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        clear_local_caches()
+        tag_facet_index.clear()
+        self.data = seed_data(num_users=10, num_groups=2, num_activities=10, num_notifications=0)
+
+    def get_counts(self, tag, index=tag_facet_index):
+        facets = index.get_facets(tags={tag})
+        return (facets[0]['num_published'], facets[0]['num_upcoming']) if facets else (0, 0)
+
+    def unpublish(self, activity):
+        activity.is_published = False
+        activity.save()
+
+    def test_changes_of_current_process_are_applied(self):
+        activity = self.data.activities[-1]
+        tag = activity.tags.values_list('name', flat=True)[0]
+        num_published, num_upcoming = self.get_counts(tag)
+        self.unpublish(activity)
+        # Only the changed activity is reloaded.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_counts(tag), (num_published - 1, num_upcoming - 1))
+        TaggedItem.objects.create_tags(activity, ['new-tag'])
+        activity.is_published = True
+        activity.save()
+        self.assertEqual(self.get_counts('new-tag'), (1, 1))
+        with self.assertNumQueries(0):
+            self.get_counts(tag)
+
+    @override_settings(
+        CACHES=dict(settings.CACHES, restified={'BACKEND': 'sandbox.restified.tests.test_caches.SilentCache'}),
+        V5_RESTIFIED_CACHE_ALIAS='restified',
+    )
+    def test_changes_of_other_processes_are_caught_up(self):
+        SilentCache.data.clear()
+        SilentCache.reachable = True
+        activity = self.data.activities[-1]
+        tag = activity.tags.values_list('name', flat=True)[0]
+        index, other_index = TagFacetIndex(), TagFacetIndex()
+        num_published, num_upcoming = self.get_counts(tag, index=index)
+        # As if another process had unpublished the activity.
+        Activity.objects.filter(pk=activity.pk).update(is_published=False)
+        other_index.refresh_activity(activity.pk)
+        # Only the changed activity is reloaded.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_counts(tag, index=index), (num_published - 1, num_upcoming - 1))
+        # A missing change rebuilds the index.
+        Activity.objects.filter(pk=activity.pk).update(is_published=True)
+        other_index.refresh_activity(activity.pk)
+        SilentCache.data.clear()
+        SilentCache.data['restified:tag-facet-index:generation'] = index._generation + 1
+        self.assertEqual(self.get_counts(tag, index=index), (num_published, num_upcoming))
+
+    def test_changes_of_other_processes_are_applied_after_max_age_without_shared_cache(self):
+        activity = self.data.activities[-1]
+        tag = activity.tags.values_list('name', flat=True)[0]
+        index = TagFacetIndex(max_age=60)
+        num_published, num_upcoming = self.get_counts(tag, index=index)
+        # As if another process had unpublished the activity.
+        Activity.objects.filter(pk=activity.pk).update(is_published=False)
+        self.assertEqual(self.get_counts(tag, index=index), (num_published, num_upcoming))
+        index._build_time -= 61
+        self.assertEqual(self.get_counts(tag, index=index), (num_published - 1, num_upcoming - 1))
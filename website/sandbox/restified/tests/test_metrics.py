@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from sandbox.drfutils import metrics
+
+
+def make_snapshot(process_id, count):
+    counts = [0] * (len(metrics.DURATION_BUCKETS) + 1)
+    counts[0] = count
+    return {
+        'histograms': [['request_duration_seconds', 'FakeViewSet', 'list', counts, 0.001 * count, count]],
+        'caches': {'fake-cache': {'hits': count, 'local_size': 7}},
+        'process': process_id,
+    }
+
+
+class MetricsAggregationTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(V5_METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_snapshot(self, pid, snapshot):
+        with open(os.path.join(self.directory, '{}.json'.format(pid)), 'w') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+
+    def get_fake_stats(self):
+        snapshot = metrics.get_aggregated_snapshot()
+        counts = [count for name, view, action, __, __, count in snapshot['histograms'] if view == 'FakeViewSet']
+        return sum(counts), snapshot['caches'].get('fake-cache', {})
+
+    def test_snapshots_of_exited_workers_are_retired(self):
+        # The PID of an exited process.
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        self.write_snapshot(process.pid, make_snapshot('exited', 3))
+        for __ in range(2):
+            count, cache_stats = self.get_fake_stats()
+            self.assertEqual(count, 3)
+            # The gauges of exited workers are not kept.
+            self.assertEqual(cache_stats, {'hits': 3})
+        self.assertEqual(sorted(name for name in os.listdir(self.directory) if name.endswith('.json')), ['retired.json'])
+
+    def test_snapshot_of_previous_process_with_same_pid_is_retired(self):
+        self.write_snapshot(os.getpid(), make_snapshot('previous', 3))
+        metrics.flush_metrics()
+        count, cache_stats = self.get_fake_stats()
+        self.assertEqual(count, 3)
+        self.assertEqual(cache_stats, {'hits': 3})
+        # Flushing again does not retire the snapshot of the current process.
+        metrics.flush_metrics()
+        self.assertEqual(self.get_fake_stats()[0], 3)
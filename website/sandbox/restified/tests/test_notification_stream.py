@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+
+from sandbox.drfutils.caches import clear_local_caches
+from sandbox.drfutils.pubsub import CachePubSub
+from sandbox.restified.accounts.events import get_notification_pubsub
+from sandbox.restified.accounts.viewsets import NotificationViewSet
+from sandbox.restified.seeding import seed_data
+
+from .test_caches import SilentCache
+
+
+@override_settings(
+    CACHES=dict(settings.CACHES, restified={'BACKEND': 'sandbox.restified.tests.test_caches.SilentCache'}),
+    V5_RESTIFIED_CACHE_ALIAS='restified',
+)
+class CachePubSubTests(SimpleTestCase):
+    """
+    Checks that messages reach the subscriptions of other processes, which are simulated by hubs
+    sharing the cache backend.
+    """
+
+    def setUp(self):
+        SilentCache.data.clear()
+        SilentCache.reachable = True
+        self.pubsub = CachePubSub('test-pubsub', poll_interval=0.01)
+        self.other_pubsub = CachePubSub('test-pubsub', poll_interval=0.01)
+
+    def test_messages_reach_other_processes(self):
+        self.assertFalse(self.other_pubsub.has_subscribers('channel'))
+        with self.pubsub.subscribe('channel') as subscription:
+            self.assertTrue(self.other_pubsub.has_subscribers('channel'))
+            self.assertFalse(self.other_pubsub.has_subscribers('other-channel'))
+            self.other_pubsub.publish('channel', 'first')
+            self.other_pubsub.publish('other-channel', 'other')
+            self.pubsub.publish('channel', 'second')
+            self.assertEqual([subscription.get(timeout=1), subscription.get(timeout=1)], ['first', 'second'])
+            self.assertIsNone(subscription.get(timeout=0.05))
+
+    def test_lost_message_is_skipped(self):
+        with self.pubsub.subscribe('channel') as subscription:
+            self.other_pubsub.publish('channel', 'lost')
+            self.other_pubsub.publish('channel', 'next')
+            del SilentCache.data['restified:test-pubsub:message:channel:1']
+            self.assertEqual(subscription.get(timeout=1), 'next')
+            self.assertEqual(subscription.dropped, 1)
+
+    def test_number_of_subscriptions_is_limited(self):
+        subscription = self.pubsub.subscribe('channel', max_subscriptions=1)
+        self.assertIsNone(self.pubsub.subscribe('other-channel', max_subscriptions=1))
+        subscription.close()
+        self.pubsub.subscribe('other-channel', max_subscriptions=1).close()
+        self.assertEqual(self.pubsub.num_subscriptions, 0)
+
+
+@override_settings(ROOT_URLCONF='sandbox.restified.tests.urls', V5_NOTIFICATION_MAX_STREAMS=1)
+class NotificationStreamTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_data(num_users=10, num_groups=1, num_activities=10, num_notifications=3)
+
+    def setUp(self):
+        clear_local_caches()
+        self.client.force_authenticate(self.data.member)
+
+    def open_stream(self):
+        return self.client.get(reverse('notification-stream'), HTTP_ACCEPT='text/event-stream')
+
+    def test_number_of_streams_is_limited(self):
+        with mock.patch.object(NotificationViewSet, 'stream_max_duration', 0):
+            response = self.open_stream()
+            self.assertEqual(get_notification_pubsub().num_subscriptions, 1)
+            busy_response = self.open_stream()
+            self.assertEqual(busy_response.status_code, 200)
+            # The client is asked to reconnect later.
+            self.assertRegex(b''.join(busy_response.streaming_content).decode(), r'^retry: \d+\n\n$')
+            self.assertIn(b'event: unread_count', b''.join(response.streaming_content))
+            response.close()
+            self.assertEqual(get_notification_pubsub().num_subscriptions, 0)
+            response = self.open_stream()
+            self.assertIn(b'event: unread_count', b''.join(response.streaming_content))
+            response.close()
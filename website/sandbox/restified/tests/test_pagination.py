@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from sandbox.drfutils.pagination import KeysetPagination
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Pages through users by ``last_login``, which is nullable, with page boundaries on ``NULL``.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        for index in range(7):
+            # Users 0, 2, 4 and 6 have never logged in, and users 3 and 5 logged in at the same time.
+            last_login = None if index % 2 == 0 else now - datetime.timedelta(days=min(index, 3))
+            User.objects.create(username='user{}'.format(index), last_login=last_login)
+
+    def paginate(self, ordering, page_size=2):
+        pagination_class = type('Pagination', (KeysetPagination,), {'ordering': ordering, 'page_size': page_size})
+        factory = APIRequestFactory()
+        queryset = User.objects.all()
+        pages = []
+        url = '/users/?pagination=cursor'
+        while url:
+            pagination = pagination_class()
+            page = pagination.paginate_queryset(queryset, Request(factory.get(url)))
+            pages.append([user.username for user in page])
+            url = pagination.get_next_link()
+            self.assertLessEqual(len(pages), 10, 'The pagination does not end.')
+        return pages
+
+    def test_descending_nulls_last(self):
+        pages = self.paginate(('-last_login', '-pk'))
+        self.assertEqual(pages, [['user1', 'user5'], ['user3', 'user6'], ['user4', 'user2'], ['user0']])
+
+    def test_ascending_nulls_first(self):
+        pages = self.paginate(('last_login', 'pk'), page_size=3)
+        self.assertEqual(pages, [['user0', 'user2', 'user4'], ['user6', 'user3', 'user5'], ['user1']])
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import contextlib
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APITestCase
+
+from v5.activities.models import Subscriber
+
+from sandbox.drfutils.caches import clear_local_caches
+from sandbox.drfutils.pagination import KeysetPagination
+from sandbox.restified.accounts import urls as accounts_urls
+from sandbox.restified.accounts.viewsets import NotificationViewSet
+from sandbox.restified.activities import urls as activities_urls
+from sandbox.restified.activities.facets import tag_facet_index
+from sandbox.restified.activities.search import is_search_index_available, rebuild_search_index
+from sandbox.restified.seeding import PASSWORD, seed_data
+
+
+# The maximum number of queries of each endpoint request, by ``'<URL name> <METHOD>'`` and an
+# optional variant. Every route of ``accounts/urls.py`` and ``activities/urls.py`` must have at
+# least one budget. Requests are made with cold caches, and include the queries of the session.
+#
+# Lists are requested with each of ``PAGE_SIZES``, and must run the same number of queries with all
+# of them: a query per object (N+1) fails the test, whatever the budget.
+#
+# NOTE: When a change adds or removes queries on purpose, update its budget in the same change.
+#
+# Lists validated before serialization (see ``ConditionalGetMixin``) include the aggregate query of
+# their ETag, which is the only query of a ``304 Not Modified`` response.
+QUERY_BUDGETS = {
+    # accounts
+    'profile-list GET': 4,
+    'profile-detail GET': 2,
+    'profile-retrieve-my-profile GET': 4,
+    'profile-retrieve-my-profile GET anonymous': 0,
+    'profile-retrieve-my-profile PUT': 6,
+    'profile-update-my-avatar POST': 4,
+    'notification-list GET': 7,
+    'notification-list GET cursor': 6,
+    'notification-stream GET': 3,
+    'auth-login POST': 11,
+    'auth-logout GET': 4,
+    'auth-logout POST': 4,
+    # activities
+    'group-list GET': 3,
+    'group-detail GET': 3,
+    'activity-list GET': 4,
+    'activity-list GET cursor': 3,
+    'activity-list GET tag': 3,
+    'activity-list GET search': 4,
+    'activity-list GET collapsed': 6,
+    'activity-list POST': 7,
+    'activity-facets GET': 1,
+    'activity-detail GET': 4,
+    'activity-detail PUT': 8,
+    'activity-detail PATCH': 8,
+    'activity-detail DELETE': 9,
+    'activity-tags POST': 17,
+    'subscriber-list GET': 2,
+    'subscriber-list POST': 6,
+    'subscriber-current-user-subscriber GET': 4,
+    'subscriber-detail GET': 4,
+    'subscriber-detail PUT': 6,
+    'subscriber-detail PATCH': 6,
+    'subscriber-detail DELETE': 6,
+}
+
+PAGE_SIZES = (5, 50)
+
+
+# A request of an endpoint: ``paths`` are requested in turn (e.g. resources of several sizes), and
+# must run the same number of queries. ``data`` may be a callable, called before the request.
+EndpointRequest = collections.namedtuple('EndpointRequest', ['method', 'paths', 'user', 'data', 'paginated'])
+
+
+def endpoint(method, *paths, user=None, data=None, paginated=False):
+    return EndpointRequest(method, paths, user, data, paginated)
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    clear_local_caches()
+    tag_facet_index.clear()
+
+
+@contextlib.contextmanager
+def override_page_size(page_size):
+    with mock.patch.object(PageNumberPagination, 'page_size', page_size):
+        with mock.patch.object(KeysetPagination, 'page_size', page_size):
+            yield
+
+
+@override_settings(ROOT_URLCONF='sandbox.restified.tests.urls')
+class QueryBudgetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_data()
+        cls.subscriber = Subscriber.objects.filter(activity=cls.data.busy_activity).select_related('user').first()
+        # NOTE: The search index is created by ``migrate``, but the seeded activities are indexed
+        # after commit, which never happens in a test case.
+        if is_search_index_available():
+            rebuild_search_index()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def get_endpoint_requests(self):
+        data = self.data
+        activity = data.activities[-1]
+        busy, quiet = data.busy_activity, data.quiet_activity
+        subscriber_path = reverse('subscriber-detail', kwargs={'activity_pk': busy.pk, 'pk': self.subscriber.pk})
+        return {
+            # accounts
+            'profile-list GET': endpoint(
+                'GET', reverse('profile-list'), paginated=True,
+            ),
+            'profile-detail GET': endpoint(
+                'GET', reverse('profile-detail', kwargs={'username': data.staff.username}),
+            ),
+            'profile-retrieve-my-profile GET': endpoint(
+                'GET', reverse('profile-retrieve-my-profile'), user=data.member,
+            ),
+            'profile-retrieve-my-profile GET anonymous': endpoint(
+                'GET', reverse('profile-retrieve-my-profile'),
+            ),
+            'profile-retrieve-my-profile PUT': endpoint(
+                'PUT', reverse('profile-retrieve-my-profile'), user=data.member,
+                data=lambda: self.get_writable_profile(data.member),
+            ),
+            'profile-update-my-avatar POST': endpoint(
+                'POST', reverse('profile-update-my-avatar'), user=data.member,
+                data=lambda: {'avatar': self.make_image_file()},
+            ),
+            'notification-list GET': endpoint(
+                'GET', reverse('notification-list'), user=data.member, paginated=True,
+            ),
+            'notification-list GET cursor': endpoint(
+                'GET', reverse('notification-list') + '?pagination=cursor', user=data.member, paginated=True,
+            ),
+            'notification-stream GET': endpoint(
+                'GET', reverse('notification-stream'), user=data.member,
+            ),
+            'auth-login POST': endpoint(
+                'POST', reverse('auth-login'), data={'username': data.member.username, 'password': PASSWORD},
+            ),
+            'auth-logout GET': endpoint(
+                'GET', reverse('auth-logout'), user=data.member,
+            ),
+            'auth-logout POST': endpoint(
+                'POST', reverse('auth-logout'), user=data.member,
+            ),
+            # activities
+            'group-list GET': endpoint(
+                'GET', reverse('group-list'), paginated=True,
+            ),
+            'group-detail GET': endpoint(
+                'GET', reverse('group-detail', kwargs={'slug': data.groups[0].slug}), user=data.member,
+            ),
+            'activity-list GET': endpoint(
+                'GET', reverse('activity-list') + '?scheduled=upcoming', paginated=True,
+            ),
+            'activity-list GET cursor': endpoint(
+                'GET', reverse('activity-list') + '?scheduled=upcoming&pagination=cursor', paginated=True,
+            ),
+            'activity-list GET tag': endpoint(
+                'GET', reverse('activity-list') + '?scheduled=past&tag=hiking&pagination=cursor', paginated=True,
+            ),
+            'activity-list GET search': endpoint(
+                'GET', reverse('activity-list') + '?scheduled=upcoming&q=activity+hiking', paginated=True,
+            ),
+            'activity-list GET collapsed': endpoint(
+                'GET', reverse('activity-list') + '?scheduled=upcoming&collapse=creator,group', user=data.member,
+                paginated=True,
+            ),
+            'activity-list POST': endpoint(
+                'POST', reverse('activity-list'), user=data.staff,
+                data=lambda: self.get_writable_activity(activity, group_slug=activity.group.slug),
+            ),
+            'activity-facets GET': endpoint(
+                'GET', reverse('activity-facets'),
+            ),
+            'activity-detail GET': endpoint(
+                'GET', reverse('activity-detail', kwargs={'pk': activity.pk}), user=data.member,
+            ),
+            'activity-detail PUT': endpoint(
+                'PUT', reverse('activity-detail', kwargs={'pk': activity.pk}), user=data.staff,
+                data=lambda: self.get_writable_activity(activity),
+            ),
+            'activity-detail PATCH': endpoint(
+                'PATCH', reverse('activity-detail', kwargs={'pk': activity.pk}), user=data.staff,
+                data={'title': 'Updated'},
+            ),
+            'activity-detail DELETE': endpoint(
+                'DELETE', reverse('activity-detail', kwargs={'pk': activity.pk}), user=data.staff,
+            ),
+            'activity-tags POST': endpoint(
+                'POST', reverse('activity-tags', kwargs={'pk': activity.pk}), user=data.staff,
+                data={'add_tags': ['new-tag'], 'remove_tags': ['hiking']},
+            ),
+            'subscriber-list GET': endpoint(
+                'GET',
+                reverse('subscriber-list', kwargs={'activity_pk': busy.pk}),
+                reverse('subscriber-list', kwargs={'activity_pk': quiet.pk}),
+            ),
+            'subscriber-list POST': endpoint(
+                'POST', reverse('subscriber-list', kwargs={'activity_pk': busy.pk}), user=data.outsider,
+                data={'real_name': 'Outsider', 'email': 'outsider@example.com', 'custom_fields': []},
+            ),
+            'subscriber-current-user-subscriber GET': endpoint(
+                'GET', reverse('subscriber-current-user-subscriber', kwargs={'activity_pk': busy.pk}),
+                user=self.subscriber.user,
+            ),
+            'subscriber-detail GET': endpoint(
+                'GET', subscriber_path, user=self.subscriber.user,
+            ),
+            'subscriber-detail PUT': endpoint(
+                'PUT', subscriber_path, user=self.subscriber.user,
+                data=lambda: self.get_representation(subscriber_path, self.subscriber.user),
+            ),
+            'subscriber-detail PATCH': endpoint(
+                'PATCH', subscriber_path, user=self.subscriber.user, data={'message': 'Updated'},
+            ),
+            'subscriber-detail DELETE': endpoint(
+                'DELETE', subscriber_path, user=self.subscriber.user,
+            ),
+        }
+
+    def test_every_route_has_a_budget(self):
+        budgeted = set(tuple(key.split()[:2]) for key in QUERY_BUDGETS)
+        self.assertEqual(set(QUERY_BUDGETS), set(self.get_endpoint_requests()))
+        for urlconf in (accounts_urls, activities_urls):
+            for pattern in urlconf.urlpatterns:
+                # The API root of the router does not query the database.
+                if pattern.name == 'api-root':
+                    continue
+                for method in pattern.callback.actions:
+                    self.assertIn((pattern.name, method.upper()), budgeted)
+
+    def test_query_budgets(self):
+        endpoint_requests = self.get_endpoint_requests()
+        for key, budget in QUERY_BUDGETS.items():
+            with self.subTest(key):
+                if key.endswith(' search') and not is_search_index_available():
+                    self.skipTest('The search index is not available.')
+                self.check_endpoint(key, endpoint_requests[key], budget)
+
+    def test_search_filters_results(self):
+        # The budget of the search is only meaningful if it searches.
+        path = self.get_endpoint_requests()['activity-list GET search'].paths[0]
+        all_results = self.client.get(reverse('activity-list') + '?scheduled=upcoming').json()
+        search_results = self.client.get(path).json()
+        self.assertGreater(search_results['count'], 0)
+        self.assertLess(search_results['count'], all_results['count'])
+        for activity in search_results['results']:
+            self.assertIn('hiking', activity['tag_list'])
+
+    def check_endpoint(self, key, endpoint_request, budget):
+        page_sizes = PAGE_SIZES if endpoint_request.paginated else (None,)
+        num_queries = {}
+        for path in endpoint_request.paths:
+            for page_size in page_sizes:
+                with override_page_size(page_size) if page_size else contextlib.suppress():
+                    num_queries[(path, page_size)] = self.measure(key, endpoint_request, path, budget)
+        self.assertEqual(
+            len(set(num_queries.values())), 1,
+            '{}: the number of queries grows with the number of objects: {}'.format(key, num_queries)
+        )
+
+    def measure(self, key, endpoint_request, path, budget):
+        """
+        Requests the path with cold caches, and returns the number of queries. Changes are rolled
+        back.
+        """
+        with transaction.atomic(), override_settings(MEDIA_ROOT=self.media_root):
+            data = endpoint_request.data() if callable(endpoint_request.data) else endpoint_request.data
+            if endpoint_request.user is not None:
+                self.client.force_login(endpoint_request.user)
+            else:
+                self.client.logout()
+            clear_caches()
+            request_format = 'multipart' if endpoint_request.method == 'POST' and 'avatar' in (data or {}) else 'json'
+            request = getattr(self.client, endpoint_request.method.lower())
+            with mock.patch.object(NotificationViewSet, 'stream_max_duration', 0):
+                with CaptureQueriesContext(connection) as context:
+                    if data is None:
+                        response = request(path)
+                    else:
+                        response = request(path, data, format=request_format)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            response.close()
+            transaction.set_rollback(True)
+
+        self.assertLess(response.status_code, 400, '{}: {} {}'.format(key, response.status_code, path))
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context), budget,
+            '{}: {} queries over a budget of {}:\n{}'.format(key, len(context), budget, queries)
+        )
+        return len(context)
+
+    # ---------- Helpers ----------
+
+    def get_representation(self, path, user):
+        self.client.force_login(user)
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        return response.json()
+
+    def get_writable_profile(self, user):
+        representation = self.get_representation(reverse('profile-retrieve-my-profile'), user)
+        editable_fields = ('display_name', 'real_name', 'phone_number', 'biography', 'preferred_language')
+        return {name: value for name, value in representation.items() if name in editable_fields}
+
+    def get_writable_activity(self, activity, **extra):
+        path = reverse('activity-detail', kwargs={'pk': activity.pk})
+        representation = self.get_representation(path, self.data.staff)
+        read_only_fields = ('pk', 'group', 'thumbnail', 'thumbnail_variants', 'creator', 'create_date',
+                            'update_date', 'tag_list')
+        data = {name: value for name, value in representation.items() if name not in read_only_fields}
+        data.update(extra)
+        return data
+
+    def make_image_file(self):
+        image_file = io.BytesIO()
+        Image.new('RGB', (64, 64), 'orange').save(image_file, 'PNG')
+        image_file.name = 'avatar.png'
+        image_file.seek(0)
+        return image_file
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+from django.urls import include, path
+
+
+# The restified URLs, mounted as in production (see ``V5_RESTIFIED_URL_PREFIX``).
+urlpatterns = [
+    path('restified/', include('sandbox.restified.urls')),
+]
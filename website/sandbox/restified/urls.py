@@ -3,7 +3,9 @@
 from django.urls import include, path
 from django.views.generic import TemplateView
 
-from rest_framework.schemas import get_schema_view
+from sandbox.drfutils.schemas import CachedSchemaView
+
+from .meta.schemas import restified_schema
 
 
 urlpatterns = [
@@ -11,11 +13,12 @@ urlpatterns = [
     path('v3/activities/', include('sandbox.restified.activities.urls')),
 
     path('v3/_meta/auth/', include('rest_framework.urls')),
+    path('v3/_meta/', include('sandbox.restified.meta.urls')),
 
-    # OpenAPI and Swagger.
+    # OpenAPI and Swagger. The schema is generated once per code version (see ``CachedSchema``).
     path(
         'v3/_meta/openapi/',
-        get_schema_view(title='V5 API v3', version='3.0.0'),
+        CachedSchemaView.as_view(schema=restified_schema),
         name='openapi-schema'
     ),
     path(
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+A SQLite database backend for concurrent web workers. It extends Django's SQLite backend with:
+
+- Pragmas set on each new connection: WAL journal (readers do not block the writer, and the writer
+  does not block readers), ``synchronous = NORMAL`` (safe in WAL mode), a memory-mapped I/O and a
+  larger page cache. Use it with ``CONN_MAX_AGE``, so that connections (and their page caches) are
+  reused across requests.
+- Serialized writes: SQLite allows a single writer at a time, and a writer that cannot get the lock
+  fails with ``database is locked``. Write statements and transactions of a process take a
+  process-wide lock first, so that the threads of a process queue up instead of competing for the
+  SQLite lock. Transactions (``atomic`` blocks) are started by ``BEGIN IMMEDIATE``, which takes the
+  SQLite write lock upfront: a deferred transaction which reads and then writes may fail when
+  another process is writing, without any retry by SQLite.
+- Bounded retries: a write which still finds the database locked (by another process) is retried
+  with an exponential backoff.
+
+The time spent waiting for the locks is recorded by connection, and reported by
+``DatabaseLockWaitMiddleware``.
+
+Options (all optional, in the ``OPTIONS`` of the database settings):
+
+- ``pragmas``: a dict of pragmas to set on connection, which overrides ``DEFAULT_PRAGMAS``.
+- ``write_lock_timeout``: the maximum time in seconds to wait for the process-wide write lock
+  (defaults to ``timeout``, the SQLite busy timeout, which defaults to 5 seconds).
+- ``write_retries``: the maximum number of retries of a locked write (5 by default).
+- ``write_retry_delay``: the delay in seconds before the first retry, doubled at each retry (0.05
+  by default).
+"""
+
+import logging
+import re
+import threading
+import time
+
+from django.db.backends.sqlite3 import base as sqlite3_base
+
+
+logger = logging.getLogger(__name__)
+
+
+Database = sqlite3_base.Database
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # 256 MB of memory-mapped I/O.
+    'mmap_size': 256 * 1024 * 1024,
+    # 64 MB of page cache (a negative size is in KB).
+    'cache_size': -64 * 1024,
+}
+
+# The backend options, which are not passed to ``sqlite3.connect()``.
+BACKEND_OPTIONS = ('pragmas', 'write_lock_timeout', 'write_retries', 'write_retry_delay')
+
+WRITE_QUERY_REGEX = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b', re.IGNORECASE)
+
+
+# ---------- Write locks --------------------------------------------------------------------------
+
+
+# The process-wide write locks by database file. The locks are reentrant, so that a thread using
+# two connections to the same database does not deadlock itself.
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def _get_write_lock(name):
+    with _write_locks_guard:
+        return _write_locks.setdefault(name, threading.RLock())
+
+
+def _is_locked_error(exc):
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+# ---------- Database wrapper ---------------------------------------------------------------------
+
+
+class DatabaseWrapper(sqlite3_base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = dict(DEFAULT_PRAGMAS, **options.get('pragmas', {}))
+        self.write_lock_timeout = options.get('write_lock_timeout', options.get('timeout', 5))
+        self.write_retries = options.get('write_retries', 5)
+        self.write_retry_delay = options.get('write_retry_delay', 0.05)
+        self._write_lock = _get_write_lock(self.settings_dict['NAME'])
+        self._holds_write_lock = False
+        self.reset_lock_wait()
+
+    def reset_lock_wait(self):
+        """
+        Resets the time spent waiting for write locks, and the number of retries of locked writes.
+        """
+        self.lock_wait_time = 0.0
+        self.lock_wait_retries = 0
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for option in BACKEND_OPTIONS:
+            kwargs.pop(option, None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, value in self.pragmas.items():
+            conn.execute('PRAGMA {} = {}'.format(pragma, value))
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SerializedWriteCursorWrapper)
+        cursor.db = self
+        return cursor
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            # Closing the connection rolls back any pending transaction.
+            if self.connection is None:
+                self._release_write_lock()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _start_transaction_under_autocommit(self):
+        # NOTE: ``BEGIN IMMEDIATE`` instead of ``BEGIN``: see the module docstring.
+        cursor = self.connection.cursor()
+        self.execute_write(lambda: cursor.execute('BEGIN IMMEDIATE'), keep_lock=True)
+
+    def execute_write(self, execute, keep_lock=False):
+        """
+        Calls ``execute()`` (which runs a write statement) with the process-wide write lock, and
+        retries it if the database is locked. The lock is kept until the end of the transaction if
+        ``keep_lock`` is true or if a transaction is in progress.
+        """
+        acquired = False
+        if not self._holds_write_lock:
+            self._acquire_write_lock()
+            acquired = True
+        try:
+            result = self._execute_with_retries(execute)
+        except BaseException:
+            if acquired:
+                self._release_write_lock()
+            raise
+        if acquired and not keep_lock and not self.connection.in_transaction:
+            self._release_write_lock()
+        return result
+
+    def _acquire_write_lock(self):
+        start = time.monotonic()
+        acquired = self._write_lock.acquire(timeout=self.write_lock_timeout)
+        self.lock_wait_time += time.monotonic() - start
+        if not acquired:
+            raise Database.OperationalError('database is locked (process write lock timed out)')
+        self._holds_write_lock = True
+
+    def _release_write_lock(self):
+        if self._holds_write_lock:
+            self._holds_write_lock = False
+            self._write_lock.release()
+
+    def _execute_with_retries(self, execute):
+        # Retrying is safe only if the statement does not belong to a transaction started before
+        # (SQLite requires to roll back such a transaction instead).
+        can_retry = not self.connection.in_transaction
+        for retry in range(self.write_retries + 1):
+            start = time.monotonic()
+            try:
+                return execute()
+            except Database.OperationalError as exc:
+                if not can_retry or retry >= self.write_retries or not _is_locked_error(exc):
+                    raise
+                # The failed attempt has waited for the SQLite busy timeout.
+                delay = self.write_retry_delay * 2 ** retry
+                logger.info(
+                    'Database is locked, retrying write in %.2fs (%d/%d).', delay, retry + 1, self.write_retries
+                )
+                time.sleep(delay)
+                self.lock_wait_time += time.monotonic() - start
+                self.lock_wait_retries += 1
+
+
+class SerializedWriteCursorWrapper(sqlite3_base.SQLiteCursorWrapper):
+    """
+    A cursor which runs write statements by ``DatabaseWrapper.execute_write()``. The ``db``
+    attribute is set by ``DatabaseWrapper.create_cursor()``.
+    """
+
+    def execute(self, query, params=None):
+        if WRITE_QUERY_REGEX.match(query):
+            return self.db.execute_write(lambda: sqlite3_base.SQLiteCursorWrapper.execute(self, query, params))
+        return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        if WRITE_QUERY_REGEX.match(query):
+            # The parameters may be an iterator, which cannot be consumed twice by retries.
+            param_list = list(param_list)
+            return self.db.execute_write(
+                lambda: sqlite3_base.SQLiteCursorWrapper.executemany(self, query, param_list)
+            )
+        return super().executemany(query, param_list)
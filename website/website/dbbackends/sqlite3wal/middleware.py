@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseLockWaitMiddleware(object):
+    """
+    Reports the time a request has spent waiting for database write locks (see the ``sqlite3wal``
+    backend), as a ``Server-Timing`` metric (``db-lock``, in milliseconds) of the response. Requests
+    which have waited for more than ``V5_DB_LOCK_WAIT_WARNING`` seconds (1 second by default) are
+    logged as warnings.
+
+    Connections of other backends are ignored.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.warning_threshold = getattr(settings, 'V5_DB_LOCK_WAIT_WARNING', 1.0)
+
+    def __call__(self, request):
+        for connection in self._get_connections():
+            connection.reset_lock_wait()
+        response = self.get_response(request)
+        lock_wait_time = 0.0
+        lock_wait_retries = 0
+        for connection in self._get_connections():
+            lock_wait_time += connection.lock_wait_time
+            lock_wait_retries += connection.lock_wait_retries
+        if lock_wait_time > 0:
+            metric = 'db-lock;dur={:.1f}'.format(lock_wait_time * 1000)
+            if response.has_header('Server-Timing'):
+                metric = '{}, {}'.format(response['Server-Timing'], metric)
+            response['Server-Timing'] = metric
+        if lock_wait_time >= self.warning_threshold:
+            logger.warning(
+                'Request %s %s waited %.2fs for database write locks (%d retries).',
+                request.method, request.path, lock_wait_time, lock_wait_retries
+            )
+        return response
+
+    def _get_connections(self):
+        # NOTE: ``connections.all()`` does not connect to the databases.
+        return [connection for connection in connections.all() if hasattr(connection, 'reset_lock_wait')]
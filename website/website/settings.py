@@ -47,18 +47,26 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     'frontend',
+    # JWT revocations (see ``sandbox.drfutils.authentication``).
+    'sandbox.drfutils',
 
     # 'rest_framework',
 ]
 
 MIDDLEWARE = [
+    # First, so that the metrics cover the other middleware.
+    'sandbox.drfutils.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # After the authentication, so that only staff users can profile their requests.
+    'sandbox.drfutils.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'website.dbbackends.sqlite3wal.middleware.DatabaseLockWaitMiddleware',
+    'sandbox.drfutils.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'website.urls'
@@ -87,13 +95,85 @@ WSGI_APPLICATION = 'website.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
 
+# The ``sqlite3wal`` backend enables WAL and serializes the writes of each process, see its module
+# docstring for the available options. Connections are persistent to keep their page caches.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'website.dbbackends.sqlite3wal',
         'NAME': os.path.join(BASE_DIR, 'website.sqlite3.db'),
+        'CONN_MAX_AGE': 10 * 60,
+        'OPTIONS': {
+            'timeout': 10,
+        },
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# The caches of the restified API (see ``sandbox.drfutils.caches.FallbackCache``) must be shared by
+# the worker processes, so that invalidations reach all of them. If the ``restified`` cache is not
+# shared (e.g. ``LocMemCache``) or fails, each process caches values for a few seconds only, and
+# retries the shared cache after ``V5_RESTIFIED_CACHE_RETRY_INTERVAL`` seconds.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'restified': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+        'KEY_PREFIX': 'v5',
+    },
+}
+
+V5_RESTIFIED_CACHE_ALIAS = 'restified'
+
+V5_RESTIFIED_LOCAL_CACHE_TIMEOUT = 5
+
+V5_RESTIFIED_CACHE_RETRY_INTERVAL = 5
+
+# Safe-method requests to the REST API read from the replicas (aliases of ``DATABASES``) if any,
+# e.g. ``['replica']``. Clients read from the primary for some seconds after a write.
+DATABASE_ROUTERS = ['sandbox.drfutils.dbrouters.ReplicaRouter']
+
+V5_DATABASE_REPLICAS = []
+
+V5_REPLICA_STICKY_SECONDS = 10
+
+# Per-view request metrics (see ``sandbox.drfutils.metrics``), exposed at
+# ``/restified/v3/_meta/metrics/``. Each worker process flushes its metrics to the directory.
+V5_METRICS_ENABLED = False
+
+V5_METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+
+V5_METRICS_FLUSH_INTERVAL = 15
+
+# The events of notifications are published to the event streams of all worker processes through
+# the restified cache (see ``sandbox.drfutils.pubsub.CachePubSub``). ``LocalPubSub`` only reaches the
+# streams of the same process. Each stream holds a worker thread, so a process serves at most
+# ``V5_NOTIFICATION_MAX_STREAMS`` streams.
+V5_NOTIFICATION_PUBSUB = 'sandbox.drfutils.pubsub.CachePubSub'
+
+V5_NOTIFICATION_MAX_STREAMS = 100
+
+# Staff users can profile a request by an ``X-Profile`` header or a ``_profile`` query parameter
+# (see ``ProfilingMiddleware``). The last profiles are kept in the directory, and listed at
+# ``/restified/v3/_meta/profiles/``.
+V5_PROFILING_ENABLED = False
+
+V5_PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+
+V5_PROFILING_MAX_PROFILES = 50
+
+V5_PROFILING_MAX_QUERIES = 1000
+
+# The OpenAPI schema of the restified API is generated once per code version, and kept in this file
+# (see ``generate_openapi_schema``). The code version is a digest of the source unless it is set,
+# e.g. to the commit hash by the deployment.
+V5_OPENAPI_SCHEMA_PATH = os.path.join(BASE_DIR, 'openapi-schema.json')
+
+V5_CODE_VERSION = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -147,6 +227,21 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Examples: "http://media.lawrence.com/media/", "http://example.com/media/"
 MEDIA_URL = '/media/'
 
+# The disk cache of image variants (see ``sandbox.imaging``), and its maximum size in bytes.
+V5_IMAGING_CACHE_DIR = os.path.join(BASE_DIR, 'imaging-cache')
+
+V5_IMAGING_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+# The variant specs (e.g. ``'320x180c'``) which clients may request, besides those used by the
+# serializers.
+V5_IMAGING_ALLOWED_SPECS = []
+
+# Whether React app pages embed their initial data (see ``sandbox.frontend.bootstrap``), and how
+# long shared caches may keep the pages of anonymous users, in seconds.
+V5_FRONTEND_BOOTSTRAP = True
+
+V5_FRONTEND_PUBLIC_MAX_AGE = 60
+
 # URL prefix for admin static files -- CSS, JavaScript and images.
 # Make sure to use a trailing slash.
 # Examples: "http://foo.com/static/admin/", "/static/admin/".
@@ -220,6 +315,13 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly',
     ],
+    # JWTs (as issued by the login endpoint) are verified without queries, against the revocations
+    # and the user states of the shared restified cache.
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'sandbox.drfutils.authentication.JWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -10,5 +10,8 @@ urlpatterns = [
     path('', TemplateView.as_view(template_name='home.html')),
     path('frontend/', include('frontend.urls')),
 
+    # Variants of media images, rendered on demand. It must match ``MEDIA_URL``.
+    path('media/_r/', include('sandbox.imaging.urls')),
+
     path('_admin/', admin.site.urls),
 ]